@@ -12,22 +12,15 @@ import datetime
 sys.path.append("../../WRemnants/")
 
 import rabbit.io_tools
-from wums import ioutils
 from wums import boostHistHelpers as hh  # isort: skip
 from wums import output_tools, plot_tools  # isort: skip
 
 from hist_selection import apply_selections, collect_selections
+from narf_io import load_hist, load_index, load_results_h5py, process_output
 
 hep.style.use("CMS")
 
 
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 def main():
 
     parser = argparse.ArgumentParser(
@@ -176,22 +169,26 @@ def main():
 
         if args.narf:
 
-            proc = None
+            index = load_index(infile)
             with h5py.File(infile, "r") as h5file:
                 results = load_results_h5py(h5file)
-                try:
-                    if args.proc is None:
-                        h = results[hist_name]
-                    else:
-                        if args.proc is not None and len(args.proc) == 1:
-                            proc = args.proc[0]
-                        else:
-                            proc = args.proc[ifile]
-                        h = results[proc]["output"][hist_name].get()
-                except KeyError:
+                # histograms stored at the top level are looked up by their own name
+                if args.proc is None:
+                    proc = hist_name
+                elif len(args.proc) == 1:
+                    proc = args.proc[0]
+                else:
+                    proc = args.proc[ifile]
+                if proc not in (index["processes"] if index else results):
+                    raise KeyError(
+                        f"'{proc}' not found in file '{infile}'. Available keys: {list(results.keys())}"
+                    )
+                output, available_hists = process_output(results, proc, index=index)
+                if hist_name not in available_hists:
                     raise KeyError(
-                        f"Histogram '{hist_name}' not found in file '{infile}'. Available histograms: {list(results[proc]['output'].keys())}"
+                        f"Histogram '{hist_name}' not found in file '{infile}'. Available histograms: {available_hists}"
                     )
+                h = load_hist(output[hist_name])
         else:
 
             # Load fit result and metadata
@@ -16,6 +16,12 @@ attach to it via their --externalPostfit path), and tabulates per chain:
 Runs outside the container: only rabbit + wums + the import-light
 wremnants...scetlib_np.params are needed (no TF).
 
+Files are read in parallel (-j) and each file's record is cached on disk
+(--cache), keyed by path + inode + size + mtime, so a re-run only re-reads
+fitresults that are new or have changed. Files that can't be read yet (still
+locked / truncated by a running fit) are never cached. Concurrent runs
+merge their new records into the cache under a lock.
+
 Usage::
 
     # opaque dir-basename labels:
@@ -29,6 +35,7 @@ Usage::
 
 import argparse
 import datetime
+import fcntl
 import hashlib
 import json
 import math
@@ -37,6 +44,7 @@ import re
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 _HERE = os.path.dirname(os.path.abspath(__file__))
 _WREM = os.environ.get(
@@ -58,7 +66,7 @@ except ImportError:
 import numpy as np
 from scipy import stats
 
-from rabbit import io_tools
+import fitresult_io
 from wremnants.postprocessing.scetlib_np.params import ALL_PARAMS
 
 ALPHAS = "pdfAlphaS"
@@ -76,13 +84,16 @@ def frozen_matcher(freeze_exprs):
 
 def read_file(path):
     """One fitresults file -> flat record of everything the table needs."""
-    fitresult, meta = io_tools.get_fitresult(path, meta=True)
-    args = (meta.get("meta_info", {}) or {}).get("args", {}) or {}
-
-    parms = fitresult["parms"].get()
-    names = [n.decode() if isinstance(n, bytes) else str(n) for n in parms.axes[0]]
-    values = parms.values()
-    variances = parms.variances()
+    info = fitresult_io.read_fitresult_info(path)
+    if info["group"] is None:
+        raise KeyError(f"results group not in h5file (only {info['groups']})")
+    args = info["args"]
+    scalars = info["scalars"]
+
+    parms = fitresult_io.parms_arrays(info)
+    if parms is None:
+        raise KeyError("parms not in results")
+    names, values, variances = parms
     idx = {n: i for i, n in enumerate(names)}
 
     def val_sig(name):
@@ -96,7 +107,7 @@ def read_file(path):
         return v, s
 
     sat = None
-    mappings = fitresult.get("mappings") or {}
+    mappings = info["mappings"]
     if SAT_MAPPING in mappings and "chi2_saturated" in mappings[SAT_MAPPING]:
         m = mappings[SAT_MAPPING]
         sat = (float(m["chi2_saturated"]), int(m["ndf_saturated"]))
@@ -110,13 +121,13 @@ def read_file(path):
 
     return {
         "parms_hash": hashlib.sha1(np.ascontiguousarray(values).tobytes()).hexdigest(),
-        "nllvalreduced": fitresult.get("nllvalreduced"),
-        "nllvalfull": fitresult.get("nllvalfull"),
-        "ndfsat": fitresult.get("ndfsat"),
+        "nllvalreduced": scalars.get("nllvalreduced"),
+        "nllvalfull": scalars.get("nllvalfull"),
+        "ndfsat": scalars.get("ndfsat"),
         "wall": wall,
         "wall_strength": args.get("regularizationStrength") if wall else None,
         "path": path,
-        "edm": fitresult.get("edmval"),
+        "edm": scalars.get("edmval"),
         # A "fit pass" (chain root) RAN the minimizer; cov/saturated/merged passes
         # reuse a postfit via --externalPostfit --noFit and attach to it. Key on
         # noFit, NOT on ext being None: a SEEDED fit (--externalPostfit + a real
@@ -142,24 +153,162 @@ def discover(run_dir):
     return sorted(out)
 
 
-def build_chains(run_dir):
-    """Group the run's files into (root fit pass, attached passes) chains."""
-    records = {}
-    for path in discover(run_dir):
+CACHE_VERSION = 1
+DEFAULT_CACHE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "fit_summary_table_records.json",
+)
+
+
+def file_key(path):
+    """Identity of a file's current contents: inode + size + mtime."""
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def load_cache(cache_path):
+    """{abspath: {"key": file_key, "record": record}}; empty if missing/unreadable."""
+    if not cache_path or not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: ignoring unreadable cache {cache_path}: {e}", file=sys.stderr)
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("records", {})
+
+
+def _jsonable(o):
+    """o as plain JSON types, so a cached record reads back equal to the one
+    stored: bytes are decoded, numpy values become Python numbers/lists and
+    tuples become lists. Anything else raises TypeError (record not cached)."""
+    if o is None or isinstance(o, (bool, int, float, str)):
+        return o
+    if isinstance(o, bytes):
+        return o.decode()
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, (list, tuple)):
+        return [_jsonable(v) for v in o]
+    if isinstance(o, dict) and all(isinstance(k, str) for k in o):
+        return {k: _jsonable(v) for k, v in o.items()}
+    raise TypeError(f"{type(o).__name__} is not cacheable")
+
+
+def save_cache(cache_path, entries):
+    """Merge entries into the on-disk cache under an exclusive lock on
+    <cache>.lock, so concurrent runs add to each other's entries rather than
+    overwriting them, and write it atomically (tmp file + rename)."""
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    with open(f"{cache_path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
         try:
-            records[os.path.normpath(path)] = read_file(path)
-        except Exception as e:
-            msg = str(e).lower()
-            if any(
-                s in msg
-                for s in ("lock", "bad object header", "not in h5file", "truncated")
-            ):
-                print(
-                    f"NOTE: {path}: in progress / no results yet — skipped",
-                    file=sys.stderr,
-                )
-            else:
-                print(f"WARNING: could not read {path}: {e}", file=sys.stderr)
+            merged = load_cache(cache_path)
+            merged.update(entries)
+            tmp = f"{cache_path}.tmp{os.getpid()}"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump({"version": CACHE_VERSION, "records": merged}, f)
+                os.replace(tmp, cache_path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def report_read_error(path, e):
+    msg = str(e).lower()
+    if any(
+        s in msg for s in ("lock", "bad object header", "not in h5file", "truncated")
+    ):
+        print(
+            f"NOTE: {path}: in progress / no results yet — skipped",
+            file=sys.stderr,
+        )
+    else:
+        print(f"WARNING: could not read {path}: {e}", file=sys.stderr)
+
+
+def read_records(paths, jobs=1, cache_path=None):
+    """read_file over paths -> {normpath: record}, reusing cached records of
+    unchanged files and fanning the rest out over a process pool."""
+    cache = load_cache(cache_path)
+    records, todo, keys = {}, [], {}
+    for path in paths:
+        norm = os.path.normpath(path)
+        try:
+            keys[norm] = file_key(path)
+        except OSError as e:
+            report_read_error(path, e)
+            continue
+        hit = cache.get(os.path.abspath(norm))
+        if hit is not None and hit["key"] == keys[norm]:
+            # the cached path is as given to the run that wrote it, which may
+            # be relative to another cwd: use this run's, as read_file would
+            records[norm] = {**hit["record"], "path": path}
+        else:
+            todo.append(path)
+    if cache_path:
+        print(
+            f"{len(records)} cached, {len(todo)} to read ({len(paths)} files)",
+            file=sys.stderr,
+        )
+
+    new = {}
+
+    def store(path, record):
+        norm = os.path.normpath(path)
+        try:
+            record = _jsonable(record)
+        except (TypeError, UnicodeDecodeError) as e:
+            print(f"NOTE: {path}: not cached ({e})", file=sys.stderr)
+        else:
+            # only successfully read files are cached: an in-progress fit
+            # raises and is picked up again next time
+            new[os.path.abspath(norm)] = {"key": keys[norm], "record": record}
+        # the converted record either way, so fresh and cached reads agree
+        records[norm] = record
+
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            futures = {path: pool.submit(read_file, path) for path in todo}
+            for path, fut in futures.items():
+                try:
+                    store(path, fut.result())
+                except Exception as e:
+                    report_read_error(path, e)
+    else:
+        for path in todo:
+            try:
+                store(path, read_file(path))
+            except Exception as e:
+                report_read_error(path, e)
+
+    if cache_path and new:
+        try:
+            save_cache(cache_path, new)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: could not write cache {cache_path}: {e}", file=sys.stderr)
+    return records
+
+
+def build_chains(run_dir, records=None):
+    """Group the run's files into (root fit pass, attached passes) chains.
+
+    records: {normpath: record} from read_records (may cover several runs);
+    read serially here if not given."""
+    paths = discover(run_dir)
+    if records is None:
+        records = read_records(paths)
+    wanted = {os.path.normpath(p) for p in paths}
+    records = {p: r for p, r in records.items() if p in wanted}
 
     roots = {p: r for p, r in records.items() if r["is_fit_pass"]}
     chains = {p: [r] for p, r in roots.items()}
@@ -462,6 +611,21 @@ def main():
         help="drop chains whose root fitresults path contains any of these substrings",
     )
     ap.add_argument("--compile", action="store_true", help="run pdflatex on the output")
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="number of worker processes reading fitresults files",
+    )
+    ap.add_argument(
+        "--cache",
+        default=DEFAULT_CACHE,
+        help="per-file record cache (JSON), keyed by path + inode + size + mtime",
+    )
+    ap.add_argument(
+        "--noCache", action="store_true", help="don't read or write --cache"
+    )
     args = ap.parse_args()
 
     # (descriptive_name | None, dir): --spec gives names, positional dirs don't
@@ -472,10 +636,16 @@ def main():
     else:
         ap.error("give one or more run_dirs, or --spec")
 
+    # read every run's files in one pool, then chain them per run
+    paths = sorted({p for _, d in named for p in discover(os.path.normpath(d))})
+    records = read_records(
+        paths, jobs=args.jobs, cache_path=None if args.noCache else args.cache
+    )
+
     rows = []
     for name, d in named:
         d = os.path.normpath(d)
-        chains = build_chains(d)
+        chains = build_chains(d, records)
         if not chains:
             print(f"WARNING: no fit passes found in {d}", file=sys.stderr)
         keep = [rp for rp in sorted(chains) if not any(s in rp for s in args.exclude)]
@@ -0,0 +1,157 @@
+"""Lightweight, memoized reading of rabbit fitresults for provenance and scalars.
+
+A fitresults file holds a wums-pickled 'meta' group and one pickled results*
+group per dataset (results, results_asimov, ...). Unpickling a results group is
+cheap as long as its H5PickleProxy entries (postfit hists, covariance, ...) are
+left alone: they are only read from disk on .get(). rabbit's
+io_tools.get_fitresult hands back that dict, and callers then typically reach
+for far more than they need.
+
+read_fitresult_info returns only
+  * meta_info's command and args (the full argparse namespace of the fit),
+  * the numeric scalars of the results group (edmval, nllvalreduced,
+    nllvalfull, ndfsat, ...),
+  * the numeric scalars of every mapping (chi2_saturated, ndf_saturated, ...),
+  * the hists named in `hists` (default: just 'parms'), materialized,
+and memoizes it per (path, size, mtime), so repeated provenance scans over the
+same files in one process cost a stat each.
+
+Used by workflows/fitterSCETlibNP.py, fit_summary_table.py,
+merge_fitresults_saturated.py and the freeze-group launcher of
+studies/fitAlphaSRapidityDecorr_freeze_partial_LRT.
+"""
+
+import functools
+import numbers
+import os
+
+import h5py
+import numpy as np
+from wums import ioutils
+
+
+def result_groups(path):
+    """Names of the results* groups of a fitresults file (empty for the
+    meta-only stub an aborted fit leaves behind)."""
+    with h5py.File(path, "r") as f:
+        return [k for k in f.keys() if k.startswith("results")]
+
+
+def has_results(path):
+    """meta is written at startup, results* only at the very end, so an
+    aborted fit leaves a meta-only stub (see
+    knowledge/20_frameworks/nominal_workflow.md)."""
+    return bool(result_groups(path))
+
+
+def resolve_group(keys, result=None):
+    """rabbit io_tools.get_fitresult's choice of results group: 'results'
+    (else 'results_asimov') by default, 'results_<result>' for a dataset name.
+    An exact group name is accepted too."""
+    if result is None:
+        return "results" if "results" in keys else "results_asimov"
+    if result in keys and result.startswith("results"):
+        return result
+    return f"results_{result}"
+
+
+def _scalar(v):
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, numbers.Integral):
+        return int(v)
+    if isinstance(v, numbers.Real):
+        return float(v)
+    if isinstance(v, np.ndarray) and v.ndim == 0 and v.dtype.kind in "biuf":
+        return v.item()
+    return None
+
+
+def _scalars(d):
+    out = {}
+    for k, v in d.items():
+        s = _scalar(v)
+        if s is not None:
+            out[k] = s
+    return out
+
+
+def _decode(x):
+    return x.decode() if isinstance(x, bytes) else x
+
+
+@functools.lru_cache(maxsize=4096)
+def _read(path, size, mtime_ns, result, hists):
+    # (size, mtime_ns) only key the cache
+    with h5py.File(path, "r") as f:
+        meta = ioutils.pickle_load_h5py(f["meta"])
+        keys = list(f.keys())
+        group = resolve_group(keys, result)
+        res = ioutils.pickle_load_h5py(f[group]) if group in keys else None
+
+        loaded = {}
+        if res is not None:
+            for name in hists:
+                if name in res:
+                    h = res[name]
+                    loaded[name] = (
+                        h.get() if isinstance(h, ioutils.H5PickleProxy) else h
+                    )
+
+    meta_info = (meta.get("meta_info", {}) or {}) if isinstance(meta, dict) else {}
+    args = meta_info.get("args", {}) or {}
+    if not isinstance(args, dict):
+        args = vars(args)
+    return {
+        "path": path,
+        "command": _decode(meta_info.get("command", "")),
+        "args": args,
+        "groups": [k for k in keys if k.startswith("results")],
+        "group": group if res is not None else None,
+        "scalars": _scalars(res) if res is not None else {},
+        "mappings": (
+            {
+                _decode(m): _scalars(v)
+                for m, v in (res.get("mappings") or {}).items()
+                if isinstance(v, dict)
+            }
+            if res is not None
+            else {}
+        ),
+        "hists": loaded,
+    }
+
+
+def read_fitresult_info(path, result=None, hists=("parms",)):
+    """Provenance + scalars of one fitresults file, memoized per
+    (path, size, mtime). The returned dict is shared between calls: don't
+    modify it.
+
+    Keys: path, command, args (meta_info), groups (all results* groups), group
+    (the one read, None for an aborted-fit stub), scalars, mappings
+    ({mapping: {name: scalar}}), hists ({name: materialized object}).
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return _read(path, st.st_size, st.st_mtime_ns, result, tuple(hists))
+
+
+def read_meta_args(path):
+    """(command, args) recorded in the fit's meta_info."""
+    info = read_fitresult_info(path, hists=())
+    return info["command"], info["args"]
+
+
+def parms_arrays(info):
+    """(names, values, variances) of the 'parms' hist read by
+    read_fitresult_info, or None if it has none."""
+    h = info["hists"].get("parms")
+    if h is None:
+        return None
+    names = [str(_decode(n)) for n in h.axes[0]]
+    variances = h.variances()
+    return (
+        names,
+        np.asarray(h.values()),
+        None if variances is None else np.asarray(variances),
+    )
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Resumable, parallel executor for matrices of workflow jobs.
+
+The bias-test studies (studies/pdf_bias_test, studies/theory_preds_bias_test,
+studies/alternate_pdfs, studies/higher_orders) launch one workflows/histmaker.sh
+or workflows/fitter.sh call per cell of a central x pseudodata matrix. Each
+cell is a dict
+
+    {"id": <name>, "cmd": <shell command>, "output": <expected file or glob>}
+
+and its state is kept on disk in <state_dir>/<id>.json:
+
+    pending -> running -> done | failed
+
+A cell counts as done only if its command exited with 0 *and* its expected
+output (e.g. the fitresults.hdf5 of the fit) exists afterwards; fitter.sh
+returns 0 even when the fit inside it fails. On re-launch, cells whose output
+already exists are skipped, failed cells are retried, and cells left
+'running' by a launcher that died are reset. Within one launch, a failing cell
+is resubmitted up to --retries more times. Output of each cell goes to
+<state_dir>/logs/<id>.log.
+
+With more than one cell in parallel, each cell's OMP/TF thread pools are
+limited to --threads (default: cores / jobs), so that -j N fits (rabbit uses
+every core otherwise) share the node instead of oversubscribing it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any
+
+Cell = dict[str, Any]
+
+# Default --fitvar of workflows/fitter.sh; setupRabbit.py names its output
+# directory ZMassDilepton_<fitvar with '-' -> '_'>_<postfix>.
+DEFAULT_FITVAR = "ptll-yll-cosThetaStarll_quantile-phiStarll_quantile"
+
+
+def fitter_output(input_file: str, postfix: str, fitvar: str = DEFAULT_FITVAR) -> str:
+    """Expected fitresults.hdf5 of a fitter.sh call without -o."""
+    fitvar = fitvar.replace("-", "_")
+    return os.path.join(
+        os.path.dirname(input_file),
+        f"ZMassDilepton_{fitvar}_{postfix}",
+        "fitresults.hdf5",
+    )
+
+
+def histmaker_output(postfix: str) -> str:
+    """Glob for the output of a histmaker.sh call, in any dated directory."""
+    return os.path.join(
+        os.environ["MY_OUT_DIR"], "*_histmaker_dilepton", f"mz_dilepton_{postfix}.hdf5"
+    )
+
+
+def output_exists(cell: Cell) -> bool:
+    return bool(glob.glob(cell["output"]))
+
+
+def state_path(state_dir: Path, cell: Cell) -> Path:
+    return state_dir / f"{cell['id']}.json"
+
+
+def read_state(state_dir: Path, cell: Cell) -> dict[str, Any]:
+    try:
+        state = json.loads(state_path(state_dir, cell).read_text())
+    except (OSError, ValueError):
+        return {"status": "pending", "attempts": 0}
+    if state.get("output") != cell["output"]:
+        # the cell now targets a different file: start over
+        return {"status": "pending", "attempts": 0}
+    return state
+
+
+def write_state(state_dir: Path, cell: Cell, **fields: Any) -> None:
+    state = read_state(state_dir, cell)
+    state.update(fields, output=cell["output"], cmd=cell["cmd"], updated=time.time())
+    path = state_path(state_dir, cell)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps(state, indent=1))
+    os.replace(tmp, path)
+
+
+def is_alive(state: dict[str, Any]) -> bool:
+    """Whether a 'running' entry belongs to a launcher that is still up."""
+    if state.get("host") != socket.gethostname():
+        # can't check another machine; assume it's still running there
+        return True
+    try:
+        os.kill(int(state.get("pid", -1)), 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def initial_status(cell: Cell, state_dir: Path, force: bool) -> str:
+    """Status of a cell at launch: done, running (elsewhere) or pending."""
+    state = read_state(state_dir, cell)
+    if force:
+        return "pending"
+    if output_exists(cell):
+        if state["status"] != "done":
+            write_state(state_dir, cell, status="done")
+        return "done"
+    if state["status"] == "running" and is_alive(state):
+        return "running"
+    return "pending"
+
+
+def thread_env(threads: int | None) -> dict[str, str] | None:
+    """os.environ with the OMP/TF thread pools set to `threads` (None: leave
+    the environment as it is)."""
+    if not threads:
+        return None
+    env = dict(os.environ)
+    env["OMP_NUM_THREADS"] = str(threads)
+    env["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    env["TF_NUM_INTEROP_THREADS"] = "2"
+    return env
+
+
+def default_threads(jobs: int) -> int | None:
+    """Threads per cell sharing the node's cores between `jobs` cells."""
+    if jobs <= 1:
+        return None
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+
+def run_cell(
+    cell: Cell, state_dir: Path, log_dir: Path, env: dict[str, str] | None = None
+) -> str:
+    """Run one cell (in `env`, default: this process's); returns done or
+    failed."""
+    attempts = read_state(state_dir, cell).get("attempts", 0) + 1
+    log_file = log_dir / f"{cell['id']}.log"
+    write_state(
+        state_dir,
+        cell,
+        status="running",
+        attempts=attempts,
+        pid=os.getpid(),
+        host=socket.gethostname(),
+        log=str(log_file),
+    )
+    print(f"[run ] {cell['id']} (attempt {attempts}, log: {log_file})")
+    started = time.time()
+    with open(log_file, "a") as log:
+        log.write(f"\n### attempt {attempts}: {cell['cmd']}\n")
+        log.flush()
+        returncode = subprocess.run(
+            cell["cmd"], shell=True, stdout=log, stderr=subprocess.STDOUT, env=env
+        ).returncode
+    elapsed = time.time() - started
+
+    if returncode == 0 and output_exists(cell):
+        write_state(state_dir, cell, status="done", returncode=0, elapsed=elapsed)
+        print(f"[done] {cell['id']} ({elapsed:.0f}s)")
+        return "done"
+    reason = (
+        f"exited with code {returncode}"
+        if returncode != 0
+        else f"produced no {cell['output']}"
+    )
+    write_state(
+        state_dir, cell, status="failed", returncode=returncode, elapsed=elapsed
+    )
+    print(f"[fail] {cell['id']} {reason}, log: {log_file}", file=sys.stderr)
+    return "failed"
+
+
+def run_matrix(
+    cells: list[Cell],
+    *,
+    state_dir: Path,
+    jobs: int = 1,
+    retries: int = 1,
+    force: bool = False,
+    dry_run: bool = False,
+    threads: int | None = None,
+) -> dict[str, str]:
+    """Run the pending cells with up to `jobs` in parallel, each limited to
+    `threads` OMP/TF threads (default: default_threads(jobs)).
+
+    Returns cell id -> final status (done, failed or running).
+    """
+    ids = [c["id"] for c in cells]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate cell ids in {ids}")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    log_dir = state_dir / "logs"
+    log_dir.mkdir(exist_ok=True)
+
+    status = {c["id"]: initial_status(c, state_dir, force) for c in cells}
+    for c in cells:
+        if status[c["id"]] == "done":
+            print(f"[ ok ] {c['id']} already has {c['output']}")
+        elif status[c["id"]] == "running":
+            print(f"[skip] {c['id']} is running in another launcher")
+    pending = [c for c in cells if status[c["id"]] == "pending"]
+
+    if dry_run:
+        for c in pending:
+            print(f"[run ] {c['id']}\n       {c['cmd']}")
+        return status
+
+    tries = {c["id"]: 0 for c in pending}
+    threads = threads or default_threads(jobs)
+    if threads:
+        print(f"Running up to {jobs} cells with {threads} threads each")
+    env = thread_env(threads)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        running: dict[Any, Cell] = {}
+        while pending or running:
+            while pending and len(running) < max(1, jobs):
+                c = pending.pop(0)
+                tries[c["id"]] += 1
+                running[executor.submit(run_cell, c, state_dir, log_dir, env)] = c
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                c = running.pop(future)
+                try:
+                    status[c["id"]] = future.result()
+                except OSError as err:
+                    print(f"[fail] {c['id']}: {err}", file=sys.stderr)
+                    write_state(state_dir, c, status="failed")
+                    status[c["id"]] = "failed"
+                if status[c["id"]] == "failed" and tries[c["id"]] <= retries:
+                    print(f"[retry] {c['id']}")
+                    pending.append(c)
+
+    return status
+
+
+def print_summary(cells: list[Cell], status: dict[str, str]) -> None:
+    counts: dict[str, int] = {}
+    for c in cells:
+        counts[status[c["id"]]] = counts.get(status[c["id"]], 0) + 1
+    print(
+        "Summary: "
+        + ", ".join(f"{counts.get(k, 0)} {k}" for k in ("done", "failed", "running"))
+    )
+    failed = [c["id"] for c in cells if status[c["id"]] == "failed"]
+    if failed:
+        print(f"  failed: {', '.join(failed)}")
+
+
+def add_matrix_args(parser: argparse.ArgumentParser, default_jobs: int = 1) -> None:
+    group = parser.add_argument_group("job matrix")
+    group.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=default_jobs,
+        help="Number of cells to run in parallel. (default: %(default)s)",
+    )
+    group.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="OMP/TF threads per cell. (default: cores / jobs when running "
+        "more than one cell, else unlimited)",
+    )
+    group.add_argument(
+        "--retries",
+        type=int,
+        default=1,
+        help="Resubmit a failing cell up to this many times per launch. "
+        "(default: %(default)s)",
+    )
+    group.add_argument(
+        "--state-dir",
+        default=None,
+        help="Directory holding the per-cell state and logs. "
+        "(default: next to the outputs)",
+    )
+    group.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun every cell, even those whose output already exists.",
+    )
+    group.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only print the cells that would run.",
+    )
+
+
+def run_from_args(
+    cells: list[Cell], args: argparse.Namespace, default_state_dir: str
+) -> int:
+    """run_matrix + summary, configured by add_matrix_args; returns exit code."""
+    status = run_matrix(
+        cells,
+        state_dir=Path(args.state_dir or default_state_dir),
+        jobs=args.jobs,
+        retries=args.retries,
+        force=args.force,
+        dry_run=args.dry_run,
+        threads=args.threads,
+    )
+    if not args.dry_run:
+        print_summary(cells, status)
+    return 1 if "failed" in status.values() else 0
@@ -39,6 +39,8 @@ import numpy as np
 
 from wums import ioutils
 
+import fitresult_io
+
 SATURATED_SUFFIX = "_saturated"
 
 
@@ -80,19 +82,25 @@ def main():
         sys.exit(f"{args.output} exists; refusing to overwrite.")
     os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
 
-    with h5py.File(args.dest, "r") as fdest, h5py.File(args.src, "r") as fsrc:
+    # the src only contributes scalars, its parms and its command: read just
+    # those, without unpickling its hists
+    src_groups = fitresult_io.result_groups(args.src)
+    if not src_groups:
+        sys.exit(f"{args.src}: no results* group (aborted-fit stub?)")
+    src_info = {
+        g: fitresult_io.read_fitresult_info(args.src, result=g) for g in src_groups
+    }
+
+    with h5py.File(args.dest, "r") as fdest:
         dest_results = load_results_groups(fdest)
-        src_results = load_results_groups(fsrc)
         if not dest_results:
             sys.exit(f"{args.dest}: no results* group (aborted-fit stub?)")
-        if not src_results:
-            sys.exit(f"{args.src}: no results* group (aborted-fit stub?)")
 
         # same-postfit guard: both steps ran --externalPostfit on the same fit.
         # --externalPostfit outputs have no top-level 'x', so compare the parms
         # hist stored in the results.
-        def parms_values(groups):
-            for res in groups.values():
+        def dest_parms_values():
+            for res in dest_results.values():
                 if "parms" in res:
                     p = res["parms"]
                     return np.asarray(
@@ -102,7 +110,14 @@ def main():
                     )
             return None
 
-        pd_, ps_ = parms_values(dest_results), parms_values(src_results)
+        def src_parms_values():
+            for info in src_info.values():
+                parms = fitresult_io.parms_arrays(info)
+                if parms is not None:
+                    return parms[1]
+            return None
+
+        pd_, ps_ = dest_parms_values(), src_parms_values()
         if pd_ is not None and ps_ is not None:
             if pd_.shape != ps_.shape or not np.array_equal(pd_, ps_):
                 sys.exit(
@@ -116,22 +131,21 @@ def main():
             )
 
         meta = ioutils.pickle_load_h5py(fdest["meta"])
-        src_meta = ioutils.pickle_load_h5py(fsrc["meta"])
 
         # graft: for each dest results group, take the matching src group
         # (same name, else the sole one) and copy the *_saturated scalars of
         # every common mapping
         n_copied = 0
         for gname, dres in dest_results.items():
-            if gname in src_results:
-                sres = src_results[gname]
-            elif len(src_results) == 1:
-                (sres,) = src_results.values()
+            if gname in src_info:
+                sinfo = src_info[gname]
+            elif len(src_info) == 1:
+                (sinfo,) = src_info.values()
             else:
                 print(f"WARNING: no matching '{gname}' in src; skipping")
                 continue
             dmaps = dres.get("mappings", {})
-            for mkey, smap in sres.get("mappings", {}).items():
+            for mkey, smap in sinfo["mappings"].items():
                 sat_items = {
                     k: v for k, v in smap.items() if k.endswith(SATURATED_SUFFIX)
                 }
@@ -158,7 +172,7 @@ def main():
 
         meta["merged_saturated_from"] = {
             "file": os.path.abspath(args.src),
-            "command": (src_meta.get("meta_info", {}) or {}).get("command", ""),
+            "command": fitresult_io.read_meta_args(args.src)[0],
         }
 
         # lazy hist proxies must hold their objects before the re-dump
@@ -0,0 +1,324 @@
+"""Lazy, selective loading of narf histmaker outputs.
+
+A histmaker file holds one wums-pickled group per process (or, for older
+outputs, a single 'results' group). Unpickling a process group is what costs
+time on a multi-GB file, and the histograms inside are H5PickleProxy objects
+that are only read from disk on .get(). The helpers here resolve process and
+histogram names against the HDF5 keys first, so only the requested processes
+are unpickled and only the requested histograms are materialized.
+
+A JSON sidecar index (<file>.index.json, see build_index) records every
+process's histogram names, axes, storage, shape and the HDF5 group each one is
+pickled in. When it is present and matches the file's size and mtime, listing
+and filtering need no unpickling at all, and histograms are read straight from
+their group without unpickling the process dict.
+
+Used by plot_narf_hists.py, compare_file_hists.py, open_narf_h5py.py,
+validate_helicity_smoothing.py and the studies reading narf outputs.
+"""
+
+import json
+import os
+import re
+from collections.abc import Mapping
+
+import h5py
+from hist import Hist
+from wums import ioutils
+
+
+class LazyResults(Mapping):
+    """Read-only mapping of process name -> unpickled process dict.
+
+    Keys come straight from the HDF5 layout; a process group is unpickled the
+    first time it is indexed and then cached. Files written with a single
+    'results' group cannot be split, so that group is unpickled as a whole on
+    first access.
+    """
+
+    def __init__(self, h5file):
+        self.h5file = h5file
+        self._single_group = "results" in h5file.keys()
+        self._results = None
+        self._cache = {}
+
+    def _load_single_group(self):
+        if self._results is None:
+            self._results = ioutils.pickle_load_h5py(self.h5file["results"])
+        return self._results
+
+    def __getitem__(self, key):
+        if self._single_group:
+            return self._load_single_group()[key]
+        if key not in self._cache:
+            if key not in self.h5file:
+                raise KeyError(key)
+            self._cache[key] = ioutils.pickle_load_h5py(self.h5file[key])
+        return self._cache[key]
+
+    def __iter__(self):
+        if self._single_group:
+            return iter(self._load_single_group())
+        return iter(self.h5file.keys())
+
+    def __len__(self):
+        if self._single_group:
+            return len(self._load_single_group())
+        return len(self.h5file.keys())
+
+    def keys(self):
+        if self._single_group:
+            return self._load_single_group().keys()
+        return self.h5file.keys()
+
+    def __contains__(self, key):
+        if self._single_group:
+            return key in self._load_single_group()
+        return key in self.h5file
+
+    def loaded(self):
+        """Names of the processes that have been unpickled so far."""
+        if self._single_group:
+            return list(self._results.keys()) if self._results is not None else []
+        return list(self._cache.keys())
+
+
+def load_results_h5py(h5file):
+    """Return a LazyResults view of an open histmaker h5py.File.
+
+    Drop-in replacement for the eager loader that used to be copied into each
+    script: the result behaves like the {process: output dict} mapping, but
+    nothing is unpickled until a process is indexed.
+    """
+    return LazyResults(h5file)
+
+
+def load_hist(entry):
+    """Return a Hist, calling .get() on H5PickleProxy entries."""
+    if isinstance(entry, Hist):
+        return entry
+    return entry.get()
+
+
+def is_regex(pattern):
+    """Heuristic used by --hists: treat the pattern as a regex only if it
+    contains '*' or '/' and compiles."""
+    if any([x in pattern for x in ["*", "/"]]):
+        try:
+            re.compile(pattern)
+            return True
+        except re.error:
+            return False
+    else:
+        return False
+
+
+def match_regex(pattern, list):
+    """
+    Return elements from list that match the regex pattern.
+    """
+    return [item for item in list if re.match(pattern, item)]
+
+
+def filter_procs(procs, names=None, regexes=None, exclude=None):
+    """Filter process names by exact name, regex (re.search) and exclusion.
+
+    Operates on key names only, so it can run before any process is unpickled.
+    """
+    selected = []
+    for proc in procs:
+        if names and proc not in names:
+            continue
+        if regexes and not any(re.search(p, proc) for p in regexes):
+            continue
+        if exclude and proc in exclude:
+            continue
+        selected.append(proc)
+    return selected
+
+
+def resolve_hist_names(available_hists, patterns, proc=None, verbose=True):
+    """Resolve --hists style patterns (exact names or regexes) against
+    available_hists, preserving the order of the patterns.
+
+    An empty pattern list selects everything. Patterns that match nothing are
+    reported and skipped.
+    """
+    if not patterns:
+        return list(available_hists)
+    where = f" in process '{proc}'" if proc is not None else ""
+    resolved = []
+    for hist_name in patterns:
+        if is_regex(hist_name):
+            matched_hists = match_regex(hist_name, available_hists)
+            if matched_hists:
+                resolved.extend(matched_hists)
+            elif verbose:
+                print(f"No histograms matched the regex '{hist_name}'{where}.")
+        else:
+            if hist_name in available_hists:
+                resolved.append(hist_name)
+            elif verbose:
+                print(
+                    f"Histogram '{hist_name}' not found{where}. Available histograms: {list(available_hists)}"
+                )
+    return resolved
+
+
+def process_output(results, proc, index=None):
+    """Return (output mapping, available histogram names) for a process.
+
+    Bare Hist entries at the top level are treated as a process holding a
+    single histogram of the same name, as plot_narf_hists.py always did.
+    With a fresh index the process is not unpickled: the returned mapping
+    holds H5PickleProxy objects pointing at the indexed groups.
+    """
+    if index is not None and proc in index["processes"]:
+        hists = index["processes"][proc]["hists"]
+        if all(info["path"] is not None for info in hists.values()):
+            h5file = results.h5file
+            output = {
+                name: ioutils.H5PickleProxy(None, h5file[info["path"]])
+                for name, info in hists.items()
+            }
+            return output, list(hists.keys())
+    entry = results[proc]
+    if isinstance(entry, dict):
+        output = entry.get("output", {})
+        return output, list(output.keys())
+    if isinstance(entry, Hist):
+        return results, [proc]
+    return {}, []
+
+
+def load_hists(h5file, procs=None, hists=None, index=None, verbose=True):
+    """Materialize only the requested histograms of an open histmaker file.
+
+    Returns {process: {hist name: Hist}}. `procs` is a list of exact process
+    names (all processes if empty), `hists` a list of --hists style patterns.
+    """
+    results = load_results_h5py(h5file)
+    all_procs = list(index["processes"]) if index else list(results.keys())
+    selected = filter_procs(all_procs, names=procs)
+    loaded = {}
+    for proc in selected:
+        output, available_hists = process_output(results, proc, index=index)
+        names = resolve_hist_names(available_hists, hists, proc=proc, verbose=verbose)
+        if names:
+            loaded[proc] = {name: load_hist(output[name]) for name in names}
+    return loaded
+
+
+INDEX_VERSION = 1
+
+
+def index_path(infile):
+    """Location of the sidecar index for a histmaker file."""
+    return f"{infile}.index.json"
+
+
+def _file_stamp(infile):
+    st = os.stat(infile)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def describe_axis(ax):
+    """JSON-serializable description of a hist axis."""
+    info = {"name": ax.name, "label": ax.label, "type": type(ax).__name__}
+    if ax.traits.continuous or type(ax).__name__ in ("Integer", "Boolean"):
+        info["edges"] = [float(e) for e in ax.edges]
+    else:
+        info["categories"] = [c if isinstance(c, str) else int(c) for c in ax]
+    return info
+
+
+def describe_hist(h, path=None):
+    """JSON-serializable description of a histogram and where it is stored."""
+    return {
+        "axes": [describe_axis(ax) for ax in h.axes],
+        "storage": h.storage_type.__name__,
+        "shape": [int(n) for n in h.axes.size],
+        "path": path,
+    }
+
+
+def build_index(infile, write=True):
+    """Read every histogram of a histmaker file once and record its metadata.
+
+    Histograms are released right after being described, so memory stays at
+    one histogram at a time. The index is written next to the file unless
+    write is False or the directory is not writable.
+    """
+    stamp = _file_stamp(infile)
+    processes = {}
+    with h5py.File(infile, "r") as h5file:
+        results = load_results_h5py(h5file)
+        for proc in results.keys():
+            entry = results[proc]
+            if isinstance(entry, dict) and "output" in entry:
+                hists = {}
+                for name, obj in entry["output"].items():
+                    if isinstance(obj, ioutils.H5PickleProxy):
+                        hists[name] = describe_hist(obj.get(), path=obj.h5group.name)
+                        obj.release()
+                    elif isinstance(obj, Hist):
+                        hists[name] = describe_hist(obj)
+                processes[proc] = {
+                    "kind": "output",
+                    "keys": list(entry.keys()),
+                    "hists": hists,
+                }
+            elif isinstance(entry, Hist):
+                path = None if "results" in h5file.keys() else h5file[proc].name
+                processes[proc] = {
+                    "kind": "hist",
+                    "keys": [],
+                    "hists": {proc: describe_hist(entry, path=path)},
+                }
+            else:
+                keys = list(entry.keys()) if isinstance(entry, dict) else []
+                processes[proc] = {"kind": "other", "keys": keys, "hists": {}}
+
+    index = {"version": INDEX_VERSION, "file": stamp, "processes": processes}
+    if write:
+        opath = index_path(infile)
+        tmp = f"{opath}.tmp{os.getpid()}"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, opath)
+            print(f"Wrote index {opath}")
+        except OSError as e:
+            print(f"Could not write index {opath}: {e}")
+    return index
+
+
+def load_index(infile):
+    """Return the sidecar index if it exists and matches the file, else None."""
+    ipath = index_path(infile)
+    if not os.path.isfile(ipath):
+        return None
+    try:
+        with open(ipath) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    if index.get("file") != _file_stamp(infile):
+        print(f"Index {ipath} is stale, ignoring it.")
+        return None
+    return index
+
+
+def indexed_axes(index, proc, hist_name):
+    """Axis names of an indexed histogram."""
+    info = index["processes"][proc]["hists"][hist_name]
+    return [ax["name"] for ax in info["axes"]]
+
+
+def missing_axes(index, proc, hist_name, axes=(), selections=()):
+    """Axes requested via --axes or --select that the histogram does not have."""
+    available = indexed_axes(index, proc, hist_name)
+    requested = list(axes) + [sel.split()[0] for sel in selections if sel.split()]
+    return [ax for ax in requested if ax not in available]
@@ -3,14 +3,22 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import os
 import shlex
 import subprocess
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import warm_worker
+
 SUBTITLE = "Preliminary"
 VALID_SECTIONS = {"4", "5", "6", "7"}
 SECTIONS_HELP = """
@@ -32,7 +40,26 @@ def require_env(name: str) -> str:
     return value
 
 
-def resolve_paths(output_mode: str) -> dict[str, str]:
+STATE_DIR = ".figures_state"
+
+
+def www_output_root(my_plot_dir: str, new_root: bool = False) -> str:
+    """Today's <yymmdd>_AN_Figures dir under my_plot_dir or, unless new_root,
+    the newest existing one that already holds runner state, so incremental
+    runs keep their stamps across days."""
+    today = Path(my_plot_dir) / f"{datetime.now():%y%m%d}_AN_Figures"
+    if not new_root:
+        previous = sorted(
+            d.parent
+            for d in Path(my_plot_dir).glob(f"[0-9]*_AN_Figures/{STATE_DIR}")
+            if d.is_dir()
+        )
+        if previous:
+            return str(previous[-1])
+    return str(today)
+
+
+def resolve_paths(output_mode: str, new_www_root: bool = False) -> dict[str, str]:
     my_out_dir = require_env("MY_OUT_DIR")
     my_work_dir = require_env("MY_WORK_DIR")
     wrem_base = require_env("WREM_BASE")
@@ -42,7 +69,7 @@ def resolve_paths(output_mode: str) -> dict[str, str]:
         output_root = require_env("MY_AN_DIR")
     elif output_mode == "www":
         my_plot_dir = require_env("MY_PLOT_DIR")
-        output_root = str(Path(my_plot_dir) / f"{datetime.now():%y%m%d}_AN_Figures")
+        output_root = www_output_root(my_plot_dir, new_root=new_www_root)
     else:
         raise RuntimeError(f"Invalid --output '{output_mode}', expected 'an' or 'www'.")
 
@@ -138,16 +165,44 @@ def py(script: str, *args: str) -> list[str]:
 
 
 def task(
-    task_id: str, section: str, command: list[str], *, inputs: list[str] | None = None
+    task_id: str,
+    section: str,
+    command: list[str],
+    *,
+    inputs: list[str] | None = None,
+    outputs: list[str] | None = None,
+    after: list[str] | None = None,
 ) -> Task:
+    """A figure task.
+
+    inputs: files that must exist, and whose modification makes the task stale
+    (files passed on the command line, the script included, are added to these
+    automatically). outputs: files or directories the task produces (default:
+    its -o/--output-dir targets); a task reading another task's output runs
+    after it. after: ids of tasks to run first.
+    """
     return {
         "id": task_id,
         "section": section,
         "cmd": command,
         "inputs": inputs or [],
+        "outputs": outputs or output_targets(command),
+        "after": after or [],
     }
 
 
+OUTPUT_FLAGS = ("-o", "--output-dir")
+
+
+def output_targets(command: list[str]) -> list[str]:
+    """The values of the output flags on a command line."""
+    return [
+        command[i + 1]
+        for i, arg in enumerate(command[:-1])
+        if arg in OUTPUT_FLAGS and command[i + 1] not in command[:i]
+    ]
+
+
 def build_tasks(paths: dict[str, str]) -> list[Task]:
     t: list[Task] = []  # task train choo-choo
 
@@ -1537,20 +1592,260 @@ def select_tasks(
     return selected
 
 
-def run_task(task_def: Task, *, dry_run: bool, skip_missing: bool) -> bool:
+def command_hash(task_def: Task) -> str:
+    return hashlib.sha1(json.dumps(task_def["cmd"]).encode()).hexdigest()
+
+
+def dependency_files(task_def: Task) -> list[str]:
+    """Declared inputs plus every existing file named on the command line."""
+    files = list(task_def.get("inputs", []))
+    for arg in task_def["cmd"][1:]:
+        if arg not in files and os.path.isfile(arg):
+            files.append(arg)
+    return files
+
+
+def stamp_path(state_dir: Path, task_def: Task) -> Path:
+    return state_dir / f"{task_def['id']}.json"
+
+
+MTIME_SLACK = 2.0
+
+
+def written_files(outputs: list[str], since: float) -> list[str]:
+    """Files among (or under, for directories) `outputs` modified at or after
+    `since`, i.e. what a task that started then wrote there."""
+    found = []
+    for output in outputs:
+        if os.path.isfile(output):
+            candidates = [output]
+        else:
+            candidates = [
+                os.path.join(root, f)
+                for root, _, files in os.walk(output)
+                for f in files
+            ]
+        for f in candidates:
+            try:
+                if os.stat(f).st_mtime >= since:
+                    found.append(f)
+            except OSError:
+                pass
+    return sorted(found)
+
+
+def is_up_to_date(task_def: Task, state_dir: Path) -> bool:
+    """Make-style check: the task last succeeded with the same command, after
+    every dependency file was last modified, and every file it wrote into its
+    outputs then still exists and is newer than those files. A task with no
+    outputs, or that wrote nothing, is never up to date."""
+    if not task_def.get("outputs"):
+        return False
+    try:
+        stamp = json.loads(stamp_path(state_dir, task_def).read_text())
+    except (OSError, ValueError):
+        return False
+    if stamp.get("cmd_hash") != command_hash(task_def):
+        return False
+    newest_input = max(
+        (os.stat(f).st_mtime for f in dependency_files(task_def)), default=0.0
+    )
+    if newest_input > stamp.get("started", 0.0):
+        return False
+    products = stamp.get("products") or []
+    if not products:
+        return False
+    if not all(os.path.exists(output) for output in task_def["outputs"]):
+        return False
+    for product in products:
+        if not os.path.exists(product) or os.stat(product).st_mtime < newest_input:
+            return False
+    return True
+
+
+def write_stamp(task_def: Task, state_dir: Path, started: float) -> None:
+    path = stamp_path(state_dir, task_def)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    tmp.write_text(
+        json.dumps(
+            {
+                "cmd_hash": command_hash(task_def),
+                "cmd": task_def["cmd"],
+                "started": started,
+                # slack for file systems whose mtimes lag time.time()
+                "products": written_files(
+                    task_def.get("outputs", []), started - MTIME_SLACK
+                ),
+            }
+        )
+    )
+    os.replace(tmp, path)
+
+
+def task_dependencies(tasks: list[Task]) -> dict[str, set[str]]:
+    """Task id -> ids of the given tasks it must wait for (explicit `after`,
+    or producing one of its inputs)."""
+    producers = {out: x["id"] for x in tasks for out in x.get("outputs", [])}
+    ids = {x["id"] for x in tasks}
+    deps: dict[str, set[str]] = {}
+    for x in tasks:
+        d = {a for a in x.get("after", []) if a in ids}
+        d |= {producers[f] for f in x.get("inputs", []) if f in producers}
+        d.discard(x["id"])
+        deps[x["id"]] = d
+    return deps
+
+
+def run_task(
+    task_def: Task,
+    *,
+    dry_run: bool,
+    skip_missing: bool,
+    state_dir: Path,
+    force: bool = False,
+    log_dir: Path | None = None,
+    warm: bool = False,
+) -> str:
+    """Run one task; returns its status: ran, up-to-date, skipped or failed.
+
+    With warm=True, Python tasks are run by the warm worker server
+    (scripts/warm_worker.py) if it is up, and as subprocesses otherwise.
+    """
     missing = missing_inputs(task_def)
     if missing:
         print(f"[skip] {task_def['id']} missing inputs: {', '.join(missing)}")
-        return skip_missing
+        return "skipped" if skip_missing else "failed"
+
+    if not force and is_up_to_date(task_def, state_dir):
+        print(f"[ ok ] {task_def['id']} is up to date")
+        return "up-to-date"
 
     cmd = task_def["cmd"]
     print(f"[run ] {task_def['id']}")
     print("       " + shlex.join(cmd))
     if dry_run:
-        return True
+        return "ran"
 
-    subprocess.run(cmd, check=True)
-    return True
+    started = time.time()
+    if log_dir is None:
+        returncode = warm_worker.run_remote(cmd) if warm else None
+        if returncode is None:
+            returncode = subprocess.run(cmd).returncode
+    else:
+        log_file = log_dir / f"{task_def['id']}.log"
+        with open(log_file, "w") as log:
+            returncode = (
+                warm_worker.run_remote(cmd, stdout=log.fileno(), stderr=log.fileno())
+                if warm
+                else None
+            )
+            if returncode is None:
+                returncode = subprocess.run(
+                    cmd, stdout=log, stderr=subprocess.STDOUT
+                ).returncode
+    if returncode != 0:
+        where = f", log: {log_dir / (task_def['id'] + '.log')}" if log_dir else ""
+        print(
+            f"[fail] {task_def['id']} exited with code {returncode}{where}",
+            file=sys.stderr,
+        )
+        return "failed"
+
+    write_stamp(task_def, state_dir, started)
+    print(f"[done] {task_def['id']} ({time.time() - started:.0f}s)")
+    return "ran"
+
+
+def run_tasks(
+    tasks: list[Task],
+    *,
+    jobs: int,
+    dry_run: bool,
+    skip_missing: bool,
+    state_dir: Path,
+    force: bool,
+    fail_fast: bool,
+    warm: bool = False,
+) -> dict[str, str]:
+    """Run tasks in dependency order with up to `jobs` in parallel.
+
+    Dependents of a task that failed or was skipped are not run ("blocked").
+    Returns task id -> status.
+    """
+    deps = task_dependencies(tasks)
+    by_id = {x["id"]: x for x in tasks}
+    pending = [x["id"] for x in tasks]
+    status: dict[str, str] = {}
+    # parallel output would interleave, so it goes to per-task logs
+    log_dir = state_dir / "logs" if jobs > 1 and not dry_run else None
+    if log_dir is not None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        running: dict[Any, str] = {}
+        while pending or running:
+            stop = fail_fast and "failed" in status.values()
+            for tid in list(pending):
+                bad = [
+                    d
+                    for d in deps[tid]
+                    if status.get(d) in ("failed", "skipped", "blocked")
+                ]
+                if bad or stop:
+                    pending.remove(tid)
+                    status[tid] = "blocked"
+                    if bad:
+                        print(f"[skip] {tid} blocked by {', '.join(sorted(bad))}")
+                    continue
+                if len(running) >= max(1, jobs):
+                    break
+                if all(status.get(d) in ("ran", "up-to-date") for d in deps[tid]):
+                    pending.remove(tid)
+                    future = executor.submit(
+                        run_task,
+                        by_id[tid],
+                        dry_run=dry_run,
+                        skip_missing=skip_missing,
+                        state_dir=state_dir,
+                        force=force,
+                        log_dir=log_dir,
+                        warm=warm,
+                    )
+                    running[future] = tid
+            if not running:
+                if pending:
+                    raise RuntimeError(
+                        f"Dependency cycle among tasks: {', '.join(pending)}"
+                    )
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                tid = running.pop(future)
+                try:
+                    status[tid] = future.result()
+                except OSError as err:
+                    print(f"[fail] {tid}: {err}", file=sys.stderr)
+                    status[tid] = "failed"
+
+    return status
+
+
+def print_summary(tasks: list[Task], status: dict[str, str]) -> None:
+    counts: dict[str, int] = {}
+    for x in tasks:
+        k = status.get(x["id"], "blocked")
+        counts[k] = counts.get(k, 0) + 1
+    print(
+        "Summary: "
+        + ", ".join(
+            f"{counts.get(k, 0)} {k}"
+            for k in ("ran", "up-to-date", "skipped", "failed", "blocked")
+        )
+    )
+    for k in ("failed", "blocked"):
+        ids = [x["id"] for x in tasks if status.get(x["id"]) == k]
+        if ids:
+            print(f"  {k}: {', '.join(ids)}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -1558,6 +1853,12 @@ def parse_args() -> argparse.Namespace:
         description="Generate AN note figures with explicit task selection."
     )
     parser.add_argument("--output", choices=["an", "www"], default="an")
+    parser.add_argument(
+        "--new-www-root",
+        action="store_true",
+        help="With --output www, start a new dated output directory instead of "
+        "continuing in the newest existing one",
+    )
     parser.add_argument(
         "--sections",
         nargs="+",
@@ -1580,6 +1881,29 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip tasks with missing declared input files",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of tasks to run in parallel (output goes to per-task logs when > 1)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun tasks even if they are up to date",
+    )
+    parser.add_argument(
+        "--no-warm",
+        action="store_true",
+        help="Always run tasks as subprocesses, even if a warm worker "
+        "(scripts/warm_worker.py serve) is running",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop scheduling new tasks after the first failure",
+    )
     return parser.parse_args()
 
 
@@ -1590,7 +1914,7 @@ def main() -> int:
         print("Nothing selected. Use --all, --sections, or --only.", file=sys.stderr)
         return 2
 
-    paths = resolve_paths(args.output)
+    paths = resolve_paths(args.output, new_www_root=args.new_www_root)
     ensure_output_dirs(paths)
     tasks = build_tasks(paths)
 
@@ -1617,24 +1941,26 @@ def main() -> int:
         list_tasks(selected)
         return 0
 
-    failures = 0
-    for x in selected:
-        try:
-            ok = run_task(
-                x,
-                dry_run=args.dry_run,
-                skip_missing=args.skip_missing_inputs,
-            )
-            if not ok:
-                failures += 1
-        except subprocess.CalledProcessError as err:
-            failures += 1
-            print(
-                f"[fail] {x['id']} exited with code {err.returncode}", file=sys.stderr
-            )
-            break
+    state_dir = Path(paths["output_root"]) / STATE_DIR
+    state_dir.mkdir(parents=True, exist_ok=True)
+    warm = not args.no_warm and warm_worker.available()
+    if warm:
+        print(
+            f"Dispatching Python tasks to the warm worker at {warm_worker.socket_path()}"
+        )
+    status = run_tasks(
+        selected,
+        jobs=args.jobs,
+        dry_run=args.dry_run,
+        skip_missing=args.skip_missing_inputs,
+        state_dir=state_dir,
+        force=args.force,
+        fail_fast=args.fail_fast,
+        warm=warm,
+    )
+    print_summary(selected, status)
 
-    if failures:
+    if any(v in ("failed", "blocked") for v in status.values()):
         return 1
 
     print("All selected tasks completed.")
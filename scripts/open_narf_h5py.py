@@ -3,18 +3,11 @@ import os, sys, re
 sys.path.append("../../WRemnants/")
 import argparse
 import h5py
-from wums import ioutils
 from hist import Hist
 import wums
 import copy
 
-
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
+from narf_io import build_index, filter_procs, load_index, load_results_h5py
 
 parser = argparse.ArgumentParser(description="Read in a hdf5 file.")
 parser.add_argument(
@@ -81,11 +74,49 @@ parser.add_argument(
     default=None,
     help="Navigate to the --path inside the HDF5 file.",
 )
+parser.add_argument(
+    "--buildIndex",
+    action="store_true",
+    help="(Re)build the sidecar histogram index (<infile>.index.json) before listing. Later listings, and plot_narf_hists.py / compare_file_hists.py, use it while the file is unchanged.",
+)
+parser.add_argument(
+    "--noIndex",
+    action="store_true",
+    help="Ignore the sidecar histogram index even if it is present and fresh.",
+)
 args = parser.parse_args()
 
+
+def select_hists(hists):
+    if args.filterHists:
+        hists = [h for h in hists for filter in args.filterHists if filter in h]
+    if args.excludeHists:
+        hists = [h for h in hists for exclude in args.excludeHists if exclude not in h]
+    if args.filterHistsRegex:
+        filtered_hists = []
+        for h in hists:
+            for pattern in args.filterHistsRegex:
+                if re.search(pattern, h):
+                    filtered_hists.append(h)
+                    break
+        hists = filtered_hists
+    return hists
+
+
+index = None
+if args.buildIndex:
+    index = build_index(args.infile)
+elif not args.noIndex:
+    index = load_index(args.infile)
+# printing, navigating or copying needs the pickled objects themselves
+use_index = index is not None and not (args.printHists or args.outfile or args.path)
+
 with h5py.File(args.infile, "r") as h5file:
     results = load_results_h5py(h5file)
-    print(f"Samples in file: {results.keys()}\n")
+    if use_index:
+        print(f"Samples in file (from index): {list(index['processes'])}\n")
+    else:
+        print(f"Samples in file: {results.keys()}\n")
 
     if args.path:
         cwp = results
@@ -105,44 +136,27 @@ with h5py.File(args.infile, "r") as h5file:
             wums.ioutils.pickle_dump_h5py("meta_info", output, h5out)
 
     if not args.noListHists:
-        for sample in results.keys():
-            if args.filterProcs and sample not in args.filterProcs:
-                continue
-            if args.filterProcsRegex:
-                matched = False
-                for pattern in args.filterProcsRegex:
-                    if re.search(pattern, sample):
-                        matched = True
-                        break
-                if not matched:
-                    continue
-            if args.excludeProcs and sample in args.excludeProcs:
-                continue
+        samples = filter_procs(
+            list(index["processes"]) if use_index else list(results.keys()),
+            names=args.filterProcs,
+            regexes=args.filterProcsRegex,
+            exclude=args.excludeProcs,
+        )
+        for sample in samples:
             print(f"Sample: {sample}")
 
+            if use_index:
+                info = index["processes"][sample]
+                if info["kind"] == "output":
+                    print(sample, info["keys"])
+                    hists = select_hists(list(info["hists"].keys()))
+                    print(f"Histograms: {hists}\n")
+                print()
+                continue
+
             if type(results[sample]) == dict:
                 print(sample, results[sample].keys())
-                hists = results[sample]["output"].keys()
-
-                if args.filterHists:
-                    hists = [
-                        h for h in hists for filter in args.filterHists if filter in h
-                    ]
-                if args.excludeHists:
-                    hists = [
-                        h
-                        for h in hists
-                        for exclude in args.excludeHists
-                        if exclude not in h
-                    ]
-                if args.filterHistsRegex:
-                    filtered_hists = []
-                    for h in hists:
-                        for pattern in args.filterHistsRegex:
-                            if re.search(pattern, h):
-                                filtered_hists.append(h)
-                                break
-                    hists = filtered_hists
+                hists = select_hists(results[sample]["output"].keys())
 
                 print(f"Histograms: {hists}\n")
                 if args.printHists:
@@ -3,12 +3,9 @@ import sys
 
 sys.path.append("../../WRemnants/")
 import os
-import re
-from wums import ioutils
 import argparse
 import h5py
 import pprint
-from wums import ioutils
 from wums import boostHistHelpers as hh
 import numpy as np
 import mplhep as hep
@@ -16,7 +13,6 @@ import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 from wums import logging, output_tools, plot_tools  # isort: skip
 import hist
-from hist import Hist
 import datetime
 
 from hist_selection import (
@@ -24,37 +20,20 @@ from hist_selection import (
     collect_selections,
     format_selection_label,
 )
+from narf_io import (
+    filter_procs,
+    indexed_axes,
+    load_hist,
+    load_index,
+    load_results_h5py,
+    missing_axes,
+    process_output,
+    resolve_hist_names,
+)
 
 hep.style.use("CMS")
 
 
-def load_results_h5py(h5file):
-
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
-def is_regex(pattern):
-
-    if any([x in pattern for x in ["*", "/"]]):
-        try:
-            re.compile(pattern)
-            return True
-        except re.error:
-            return False
-    else:
-        return False
-
-
-def match_regex(pattern, list):
-    """
-    Return elements from list that match the regex pattern.
-    """
-    return [item for item in list if re.match(pattern, item)]
-
-
 def main():
 
     parser = argparse.ArgumentParser(description="Read in a hdf5 file.")
@@ -196,13 +175,17 @@ def main():
         os.makedirs(args.outdir)
         print(f"Output directory '{args.outdir}' created.")
 
+    index = load_index(args.infile)
+    if index is not None:
+        print("Using histogram index", args.infile + ".index.json")
+
     with h5py.File(args.infile, "r") as h5file:
         results = load_results_h5py(h5file)
         print("Keys in h5 file:", h5file.keys())
 
-        procs = list(results.keys())
+        procs = list(index["processes"]) if index else list(results.keys())
         if args.filterProcs:
-            procs = [proc for proc in procs if proc in args.filterProcs]
+            procs = filter_procs(procs, names=args.filterProcs)
             print(f"Filtered results to processes: {procs}")
         else:
             print("No filtering applied, all processes loaded.")
@@ -210,39 +193,33 @@ def main():
         for proc in procs:
             print(f"Process: {proc}")
 
-            if type(results[proc]) is dict:
-                output = results[proc].get("output", {})
-                if not output:
-                    print(f"No output found for process {proc}.")
-                    continue
-                available_hists = list(output.keys())
-            elif type(results[proc]) is Hist:
-                available_hists = [proc]
-                output = results
-
-            hists_to_plot = []
-            if args.hists:
-
-                for hist_name in args.hists:
-
-                    if is_regex(hist_name):
-                        matched_hists = match_regex(hist_name, available_hists)
-                        if matched_hists:
-                            hists_to_plot.extend(matched_hists)
-                        else:
-                            print(
-                                f"No histograms matched the regex '{hist_name}' in process '{proc}'."
-                            )
-                    else:
-                        if hist_name in available_hists:
-                            hists_to_plot.append(hist_name)
-                        else:
-                            print(
-                                f"Histogram '{hist_name}' not found in process '{proc}'. Available histograms: {available_hists}"
-                            )
-
-            else:
-                hists_to_plot = available_hists
+            output, available_hists = process_output(results, proc, index=index)
+            if not available_hists:
+                print(f"No output found for process {proc}.")
+                continue
+
+            hists_to_plot = resolve_hist_names(available_hists, args.hists, proc=proc)
+            if not hists_to_plot:
+                continue
+
+            if index is not None:
+                # check the requested axes before reading any histogram
+                for ihist, hist_name in enumerate(hists_to_plot):
+                    missing = missing_axes(index, proc, hist_name, axes=args.axes)
+                    if missing:
+                        raise ValueError(
+                            f"Axes {missing} not found in histogram '{hist_name}' of process '{proc}'. Available axes: {indexed_axes(index, proc, hist_name)}"
+                        )
+                    selections = collect_selections(
+                        args.selection, args.selectByHist, ihist
+                    )
+                    missing = missing_axes(
+                        index, proc, hist_name, selections=selections
+                    )
+                    if missing:
+                        print(
+                            f"Selection axes {missing} not found in histogram '{hist_name}', these selections will be skipped."
+                        )
 
             if len(args.labels):
                 if len(args.labels) != len(hists_to_plot):
@@ -253,9 +230,7 @@ def main():
             else:
                 labels_to_plot = hists_to_plot
 
-            h_ref = output[hists_to_plot[0]]
-            if not (type(h_ref) is Hist):
-                h_ref = h_ref.get()
+            h_ref = load_hist(output[hists_to_plot[0]])
             ref_selection = collect_selections(args.selection, args.selectByHist, 0)
             h_ref = apply_selections(h_ref, ref_selection)
             if args.axes:
@@ -294,9 +269,7 @@ def main():
                 if ihist == 0:
                     continue  # already plotted
 
-                h = output[hist_to_plot]
-                if not (type(h) is Hist):
-                    h = h.get()
+                h = load_hist(output[hist_to_plot])
                 h_selection = collect_selections(
                     args.selection, args.selectByHist, ihist
                 )
@@ -0,0 +1,217 @@
+"""Remap the "vars" axis of scetlib pkl outputs to a target label order.
+
+General replacement for the per-production extend_vars_axis*.py one-offs. The
+target axis is declared rather than coded, either as
+
+  * --target <json>: {"target": [labels in order], "rename": {old: new}}
+    ("rename" is optional), or
+  * --targetFrom <pkl>: the label order of a pkl that already carries the
+    canonical axis (e.g. one of the originally-49-var pkls of a production).
+
+Each source slot moves to the target slot with the same label (after
+renaming); target labels absent from the source are zero-filled. A pkl whose
+axis already matches the target is left alone, so re-running is a no-op. A pkl
+carrying labels that are not in the target is reported as unexpected and not
+modified.
+
+The new histogram is filled slot by slot along the vars axis (flow bins of the
+other axes included), so no gathered full-size temporary is made, and the old
+histogram is dropped before the new one is pickled. Files are processed by a
+worker pool (-j) and written atomically (tmp file in the destination dir +
+rename), either in place or into --outdir, where unchanged pkls are copied.
+
+Examples::
+
+    # CT18Z lambda6, 43 -> 49 vars into a sidecar dir (was extend_vars_axis_sidecar_v2.py)
+    python3 scripts/remap_vars_axis.py <src_dir> --outdir <dst_dir> \
+        --targetFrom <src_dir>/<a_49_var_pkl>.pkl -j 32
+
+    # MSHT, 36 -> 42 vars in place (was extend_vars_axis.py)
+    python3 scripts/remap_vars_axis.py <dir> --target msht_42vars.json -j 32
+"""
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import hist
+
+
+def load_target(args):
+    """-> (target labels, rename map) from --target or --targetFrom."""
+    if args.targetFrom:
+        with open(args.targetFrom, "rb") as f:
+            h = pickle.load(f)["hist"]
+        return list(h.axes["vars"]), {}
+    with open(args.target) as f:
+        spec = json.load(f)
+    target = [str(l) for l in spec["target"]]
+    if len(set(target)) != len(target):
+        raise ValueError("Duplicate labels in the target vars axis.")
+    return target, {str(k): str(v) for k, v in spec.get("rename", {}).items()}
+
+
+def remap_plan(cur_labels, target, rename):
+    """[(source slot, target slot)] for every source label, or None if the
+    axis already is the target. Raises ValueError on unmapped labels."""
+    if list(cur_labels) == list(target) and not rename:
+        return None
+    pos = {l: i for i, l in enumerate(target)}
+    renamed = [rename.get(l, l) for l in cur_labels]
+    missing = [l for l in renamed if l not in pos]
+    if missing:
+        raise ValueError(f"labels not in target: {missing}")
+    if renamed == list(target):
+        return (
+            None
+            if renamed == list(cur_labels)
+            else [(i, i) for i in range(len(target))]
+        )
+    return [(i, pos[l]) for i, l in enumerate(renamed)]
+
+
+def remap_hist(h, target, plan):
+    """New Hist with the target vars axis, filled slot by slot from h."""
+    ivar = h.axes.name.index("vars")
+    axes = list(h.axes)
+    axes[ivar] = hist.axis.StrCategory(target, name="vars", growth=True)
+    new_h = hist.Hist(*axes, storage=h.storage_type())
+    # category axes have no underflow, so slot i is flow-view index i
+    cur_view = h.view(flow=True)
+    new_view = new_h.view(flow=True)
+    lead = (slice(None),) * ivar
+    for src, dst in plan:
+        new_view[lead + (dst,)] = cur_view[lead + (src,)]
+    return new_h
+
+
+def atomic_write(dst, write):
+    """Call write(fileobj) on a tmp file next to dst, then rename it over dst."""
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(dst)), prefix=".tmp_remap_"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def copy_atomic(src, dst):
+    def write(f):
+        with open(src, "rb") as fsrc:
+            shutil.copyfileobj(fsrc, f)
+
+    atomic_write(dst, write)
+    shutil.copystat(src, dst)
+
+
+def process_file(pkl, target, rename, outdir=None):
+    """-> (status, message) for one pkl; never raises."""
+    fname = os.path.basename(pkl)
+    dst = os.path.join(outdir, fname) if outdir else pkl
+    try:
+        if outdir and os.path.exists(dst):
+            if os.stat(dst).st_mtime_ns >= os.stat(pkl).st_mtime_ns:
+                return "skipped", fname
+        with open(pkl, "rb") as f:
+            d = pickle.load(f)
+        h = d["hist"]
+        if "vars" not in h.axes.name:
+            status, plan = "skipped", None
+        else:
+            try:
+                plan = remap_plan(list(h.axes["vars"]), target, rename)
+                status = "skipped" if plan is None else "remapped"
+            except ValueError as e:
+                status, plan = "unexpected", None
+                print(f"unexpected vars axis in {fname}: {e}", flush=True)
+        if plan is None:
+            del d, h
+            if outdir and not os.path.exists(dst):
+                copy_atomic(pkl, dst)
+                return ("copied" if status == "skipped" else status), fname
+            return status, fname
+        d["hist"] = remap_hist(h, target, plan)
+        del h  # only the new histogram stays alive while pickling
+        atomic_write(dst, lambda f: pickle.dump(d, f))
+        return "remapped", fname
+    except Exception as e:
+        print(f"ERROR {fname}: {e}", flush=True)
+        return "error", fname
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    ap.add_argument("src_dir", help="directory with the scetlib pkls")
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--target", help='JSON with {"target": [labels], "rename": {old: new}}'
+    )
+    group.add_argument(
+        "--targetFrom", help="pkl whose vars axis defines the target label order"
+    )
+    ap.add_argument(
+        "--outdir",
+        default=None,
+        help="write into this sidecar dir instead of modifying src_dir in place",
+    )
+    ap.add_argument("--pattern", default="*.pkl", help="glob inside src_dir")
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=min(16, os.cpu_count() or 1),
+        help="number of worker processes",
+    )
+    args = ap.parse_args()
+
+    target, rename = load_target(args)
+    print(f"target vars axis ({len(target)}): {target}", flush=True)
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+    pkls = sorted(glob.glob(os.path.join(args.src_dir, args.pattern)))
+    print(f"Found {len(pkls)} pkls in {args.src_dir}", flush=True)
+
+    work = partial(process_file, target=target, rename=rename, outdir=args.outdir)
+    counts = {}
+    if args.jobs > 1 and len(pkls) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = pool.map(work, pkls, chunksize=8)
+            for i, (status, _) in enumerate(results):
+                counts[status] = counts.get(status, 0) + 1
+                if i % 500 == 0:
+                    print(f"  ... {i}/{len(pkls)}", flush=True)
+    else:
+        for pkl in pkls:
+            status, _ = work(pkl)
+            counts[status] = counts.get(status, 0) + 1
+
+    print(f"src={args.src_dir}", flush=True)
+    if args.outdir:
+        print(f"dst={args.outdir}", flush=True)
+    print(
+        "; ".join(
+            f"{k} {counts.get(k, 0)}"
+            for k in ("remapped", "skipped", "copied", "unexpected", "error")
+        ),
+        flush=True,
+    )
+    if counts.get("error"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,20 @@ if `--fix-alignment-shift` is passed, alignment-var pkls (filename matches
 one position back (NNN → NNN-1) on the fly during read. Position NNN is
 zeroed. The shift is idempotent — pkls that are already shifted are left
 alone (detected by checking which position has data).
+
+With `-j N` the pkl list is split into N contiguous shards that are combined
+in parallel worker processes (alignment fix-up included); the partial sums are
+then merged pairwise, in shard order, so the result is the same as the serial
+combine. Every shard after the first starts from an empty copy of the
+histogram the serial combine starts from (the first pkl), so all partials
+have the same vars axis. The parent drops each partial once it is merged and
+keeps O(log N) merged ones, plus any shards that finished ahead of their
+turn. Configs are compared through a canonical hash computed once per pkl.
 """
 
-import pickle, glob, os, sys, copy, re
+import pickle, glob, os, sys, re, hashlib, json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import hist
 import numpy as np
 
@@ -21,6 +32,7 @@ runcard_stem = sys.argv[2]  # e.g. "inclusive_Z_COM13_CT18Z_N3+0LL_newvals_lambd
 out_pkl = sys.argv[3]
 
 pdfs = None
+jobs = 1
 skip_missing = "--skip-missing" in sys.argv
 ignore_config_diff = "--ignore-config-diff" in sys.argv
 fix_alignment_shift = "--fix-alignment-shift" in sys.argv
@@ -30,6 +42,8 @@ for i, a in enumerate(sys.argv):
     if a == "--pdfs" and i + 1 < len(sys.argv):
         pdfs = sys.argv[i + 1].split(",")
         pdfs = [int(p) if p.isdigit() else p for p in pdfs]
+    if a in ("-j", "--jobs") and i + 1 < len(sys.argv):
+        jobs = int(sys.argv[i + 1])
     if a == "--shift-vars" and i + 1 < len(sys.argv):
         for token in sys.argv[i + 1].split(","):
             if "-" in token:
@@ -80,25 +94,58 @@ def maybe_shift_alignment_var(d, filename):
 
 
 pkl_files = sorted(glob.glob(os.path.join(src_dir, f"{runcard_stem}*pkl")))
-print(f"Found {len(pkl_files)} pkl files in {src_dir}", flush=True)
-if fix_alignment_shift:
-    print(
-        f"  alignment-shift fix enabled for var_NNN with NNN in {sorted(shift_vars)}",
-        flush=True,
-    )
 
-comb_res = {
-    "bins": None,
-    "hist": None,
-    "hist_err": None,
-    "config": None,
-    "meta_data": None,
-}
+
+def empty_comb():
+    return {
+        "bins": None,
+        "hist": None,
+        "hist_err": None,
+        "config": None,
+        "meta_data": None,
+    }
+
+
+# per-file keys that legitimately differ between the pkls of one production
+_VOLATILE_QCD_KEYS = ("pdf_member", "alphas_mu0") + (
+    ("pdf_set",) if pdfs is not None else ()
+)
+
+
+def config_hash(config):
+    """Canonical hash of a scetlib config, ignoring the per-file QCD keys."""
+    canon = {
+        k: (
+            {kk: vv for kk, vv in v.items() if kk not in _VOLATILE_QCD_KEYS}
+            if k == "QCD"
+            else v
+        )
+        for k, v in config.items()
+    }
+    blob = json.dumps(canon, sort_keys=True, default=repr)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+def check_config(ref_hash, ref_config, other_config, what):
+    """Compare other_config against the reference by hash; returns its hash."""
+    other_hash = config_hash(other_config)
+    if ignore_config_diff or ref_hash is None or other_hash == ref_hash:
+        return other_hash
+    # Surface what differs for debugging
+    for k in ref_config:
+        if ref_config.get(k) != other_config.get(k):
+            print(
+                f"DIFF in section [{k}]: {ref_config.get(k)} vs {other_config.get(k)}",
+                flush=True,
+            )
+    raise ValueError(f"Found different config files ({what})! Cannot combine.")
 
 
 def combine_pkl_files(comb, other, pdfs):
     if comb["hist"] is None:
-        info = copy.deepcopy(other)
+        # shallow copy is enough: `other` is a freshly loaded pkl that is not
+        # reused, and its hist must stay intact for the pdfs branch below
+        info = dict(other)
         if pdfs is not None:
             pdf_list = range(pdfs[0]) if len(pdfs) == 1 else pdfs
             axes = info["hist"].axes
@@ -123,62 +170,151 @@ def combine_pkl_files(comb, other, pdfs):
         except KeyError:
             pdf_set = other["config"]["QCD"]["pdf_set"]
             var_idx = pdfs.index(pdf_set)
-        combh[..., var_idx] = otherh[..., var_name].view(flow=True) + combh[
-            ..., var_idx
-        ].view(flow=True)
+        # accumulate in place into the vars slot of the full view
+        combh.view(flow=True)[..., var_idx] += otherh[..., var_name].view(flow=True)
     else:
         raise ValueError(
             f"Cannot combine incompatible hists of shape {comb['hist'].shape} and {other['hist'].shape}"
         )
-    pdf = None
-    pdfas = None
-    if "pdf_member" in comb["config"]["QCD"]:
-        pdf = comb["config"]["QCD"].pop("pdf_member")
-    if "alphas_mu0" in comb["config"]["QCD"]:
-        pdfas = comb["config"]["QCD"].pop("alphas_mu0")
-    other["config"]["QCD"].pop("pdf_member", None)
-    other["config"]["QCD"].pop("alphas_mu0", None)
     if pdf_set:
         comb["config"]["QCD"]["pdf_set"] = pdf_set
-    if not ignore_config_diff and comb["config"] != other["config"]:
-        # Surface what differs for debugging
-        for k in comb["config"]:
-            if comb["config"].get(k) != other["config"].get(k):
-                print(
-                    f"DIFF in section [{k}]: {comb['config'].get(k)} vs {other['config'].get(k)}",
-                    flush=True,
-                )
-        raise ValueError("Found different config files! Cannot combine.")
-    if pdf is not None:
-        comb["config"]["QCD"]["pdf_member"] = pdf
-    if pdfas is not None:
-        comb["config"]["QCD"]["alphas_mu0"] = pdfas
     return comb
 
 
-n_shifted = 0
-for i, fn in enumerate(pkl_files):
-    if i % 100 == 0:
-        print(f"  ... {i}/{len(pkl_files)}", flush=True)
-    if not os.path.isfile(fn):
-        if skip_missing:
-            continue
-        raise ValueError(f"Missing {fn}")
+def load_pkl(fn):
     with open(fn, "rb") as f:
         loaded = pickle.load(f)
-    if maybe_shift_alignment_var(loaded, fn):
-        n_shifted += 1
-    comb_res = combine_pkl_files(comb_res, loaded, pdfs)
-
-if fix_alignment_shift:
-    print(f"Applied alignment-shift on-the-fly to {n_shifted} pkls", flush=True)
-
-print(f"Writing combined → {out_pkl}", flush=True)
-with open(out_pkl, "wb") as f:
-    pickle.dump(comb_res, f)
-print("done", flush=True)
-print(
-    f"Combined hist axes: {[a.name for a in comb_res['hist'].axes]}, shape={comb_res['hist'].shape}",
-    flush=True,
-)
-print(f"vars axis labels: {list(comb_res['hist'].axes['vars'])}", flush=True)
+    shifted = maybe_shift_alignment_var(loaded, fn)
+    return loaded, shifted
+
+
+def combine_shard(files, label="", seed=None):
+    """Serially combine a list of pkls -> (comb, config hash, n shifted).
+
+    seed, if given, is the comb to start from instead of the first pkl of
+    `files` (see empty_seed)."""
+    comb, ref_hash, n_shifted = empty_comb(), None, 0
+    if seed is not None:
+        comb, ref_hash = seed, config_hash(seed["config"])
+    for i, fn in enumerate(files):
+        if i % 100 == 0:
+            print(f"  ...{label} {i}/{len(files)}", flush=True)
+        if not os.path.isfile(fn):
+            if skip_missing:
+                continue
+            raise ValueError(f"Missing {fn}")
+        loaded, shifted = load_pkl(fn)
+        n_shifted += shifted
+        other_hash = check_config(
+            ref_hash, comb["config"], loaded["config"], os.path.basename(fn)
+        )
+        if ref_hash is None:
+            ref_hash = other_hash
+        comb = combine_pkl_files(comb, loaded, pdfs)
+    return comb, ref_hash, n_shifted
+
+
+def empty_seed(files):
+    """The comb the serial combine starts from (the first existing pkl, or
+    its pdf-vars expansion) with the histogram zeroed, or None if there is
+    no pkl."""
+    for fn in files:
+        if os.path.isfile(fn):
+            break
+        if not skip_missing:
+            raise ValueError(f"Missing {fn}")
+    else:
+        return None
+    comb = combine_pkl_files(empty_comb(), load_pkl(fn)[0], pdfs)
+    comb["hist"] = comb["hist"].copy()
+    comb["hist"].reset()
+    return comb
+
+
+def merge_partials(a, b, seed_pdf_set=None):
+    """Merge two shard results (a precedes b in file order) into a."""
+    comb_a, hash_a, n_a = a
+    comb_b, hash_b, n_b = b
+    if comb_a["hist"] is None:
+        return b
+    if comb_b["hist"] is None:
+        return a
+    check_config(hash_a, comb_a["config"], comb_b["config"], "between shards")
+    if comb_a["hist"].shape != comb_b["hist"].shape:
+        raise ValueError(
+            f"Cannot merge partial sums of shape {comb_a['hist'].shape} and {comb_b['hist'].shape}"
+        )
+    comb_a["hist"] += comb_b["hist"]
+    if pdfs is not None:
+        # serial combine leaves the pdf_set of the last pkl that set it; a
+        # seeded shard that set none still carries the seed's
+        pdf_set_b = comb_b["config"]["QCD"].get("pdf_set")
+        if pdf_set_b is not None and pdf_set_b != seed_pdf_set:
+            comb_a["config"]["QCD"]["pdf_set"] = pdf_set_b
+    return comb_a, hash_a, n_a + n_b
+
+
+def combine_parallel(files, njobs):
+    """Combine contiguous shards in worker processes, then merge the partial
+    sums pairwise as a tree, preserving file order."""
+    shards = [list(x) for x in np.array_split(np.array(files, dtype=object), njobs)]
+    shards = [sh for sh in shards if sh]
+    seed = empty_seed(files)
+    seed_pdf_set = None
+    if seed is not None and pdfs is not None:
+        seed_pdf_set = seed["config"]["QCD"].get("pdf_set")
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = deque(
+            pool.submit(combine_shard, sh, f" [shard {i}]", None if i == 0 else seed)
+            for i, sh in enumerate(shards)
+        )
+        del seed
+        # pairwise tree: pending holds (level, partial) with at most one partial
+        # per level, like a binary counter, so only O(log n) partials are alive
+        pending = []
+        while futures:
+            fut = futures.popleft()
+            part, level = fut.result(), 0
+            # a finished future keeps its result alive until dropped
+            del fut
+            while pending and pending[-1][0] == level:
+                _, prev = pending.pop()
+                part, level = merge_partials(prev, part, seed_pdf_set), level + 1
+            pending.append((level, part))
+            del part
+    result = pending.pop()[1]
+    while pending:
+        result = merge_partials(pending.pop()[1], result, seed_pdf_set)
+    return result
+
+
+def main():
+    print(f"Found {len(pkl_files)} pkl files in {src_dir}", flush=True)
+    if fix_alignment_shift:
+        print(
+            f"  alignment-shift fix enabled for var_NNN with NNN in {sorted(shift_vars)}",
+            flush=True,
+        )
+
+    if jobs > 1 and len(pkl_files) > 1:
+        print(f"Combining in {jobs} parallel shards", flush=True)
+        comb_res, _, n_shifted = combine_parallel(pkl_files, jobs)
+    else:
+        comb_res, _, n_shifted = combine_shard(pkl_files)
+
+    if fix_alignment_shift:
+        print(f"Applied alignment-shift on-the-fly to {n_shifted} pkls", flush=True)
+
+    print(f"Writing combined → {out_pkl}", flush=True)
+    with open(out_pkl, "wb") as f:
+        pickle.dump(comb_res, f)
+    print("done", flush=True)
+    print(
+        f"Combined hist axes: {[a.name for a in comb_res['hist'].axes]}, shape={comb_res['hist'].shape}",
+        flush=True,
+    )
+    print(f"vars axis labels: {list(comb_res['hist'].axes['vars'])}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
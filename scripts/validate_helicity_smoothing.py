@@ -10,11 +10,10 @@ import matplotlib.ticker as mticker
 import matplotlib.pyplot as plt
 import mplhep as hep
 import numpy as np
-from hist import Hist
 
+from narf_io import load_hist, load_results_h5py
 from utilities import parsing
 from wums import boostHistHelpers as hh
-from wums import ioutils
 from wums import output_tools
 from wums import plot_tools
 
@@ -27,18 +26,6 @@ warnings.filterwarnings(
 )
 
 
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
-def load_hist(entry):
-    if isinstance(entry, Hist):
-        return entry
-    return entry.get()
-
-
 def apply_selection(h, selections):
     if not selections:
         return h
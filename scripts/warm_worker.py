@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Warm worker: run Python plotting scripts without paying their import cost.
+
+A server process imports the heavy stacks once (numpy, hist, h5py, wums,
+matplotlib, mplhep and, when available, rabbit/TensorFlow/ROOT) and listens
+on a Unix socket. Each request is run in a child forked from that warm process.
+The child gets the client's argv, cwd, environment and stdin/stdout/stderr
+(passed over the socket), and runs the script as __main__ via runpy. Every
+task therefore starts with its own copy of the preloaded modules and a fresh
+matplotlib state, and nothing leaks between tasks. The client exits with the
+script's exit code.
+
+If no server is running, `run` simply execs the command, so callers can
+always go through it. scripts/note/figures.py dispatches its Python tasks
+here automatically when the server is up.
+
+Usage::
+
+    python3 scripts/warm_worker.py serve &        # once per session
+    python3 scripts/warm_worker.py run -- scripts/plot_narf_hists.py in.hdf5 ...
+    python3 scripts/warm_worker.py run -- rabbit_plot_hists.py fitresults.hdf5 ...
+    python3 scripts/warm_worker.py status | stop
+"""
+
+import argparse
+import importlib
+import json
+import os
+import runpy
+import shutil
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+DEFAULT_PRELOAD = [
+    "numpy",
+    "scipy",
+    "h5py",
+    "hdf5plugin",
+    "boost_histogram",
+    "hist",
+    "matplotlib",
+    "matplotlib.pyplot",
+    "mplhep",
+    "wums.ioutils",
+    "wums.boostHistHelpers",
+    "wums.plot_tools",
+    "wums.output_tools",
+    "rabbit",
+    "tensorflow",
+    "ROOT",
+]
+
+_LEN = struct.Struct("!Q")
+_CODE = struct.Struct("!i")
+
+
+def socket_path():
+    """Per-user socket location, overridable with $WARM_WORKER_SOCKET."""
+    if os.environ.get("WARM_WORKER_SOCKET"):
+        return os.environ["WARM_WORKER_SOCKET"]
+    base = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(base, f"warm_worker_{os.getuid()}.sock")
+
+
+def _connect(path=None, timeout=1.0):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path or socket_path())
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def available(path=None):
+    """True if a warm worker server is listening."""
+    sock = _connect(path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def resolve_script(argv):
+    """Return the Python script argv (script path first) for a command, or
+    None if it cannot run in the worker.
+
+    Accepts `python script.py args` (no interpreter options) and direct
+    invocations of scripts whose name ends in .py or whose shebang mentions
+    python, looked up on $PATH like the shell would.
+    """
+    if not argv:
+        return None
+    first = argv[0]
+    if os.path.basename(first).startswith("python"):
+        if len(argv) < 2 or argv[1].startswith("-"):
+            return None
+        argv = argv[1:]
+        first = argv[0]
+    path = first if os.sep in first else shutil.which(first) or first
+    if not os.path.isfile(path):
+        return None
+    if not path.endswith(".py"):
+        try:
+            with open(path, "rb") as f:
+                if b"python" not in f.readline():
+                    return None
+        except OSError:
+            return None
+    return [os.path.abspath(path)] + list(argv[1:])
+
+
+def run_remote(argv, stdin=None, stdout=None, stderr=None, path=None):
+    """Run a command in the warm worker; returns its exit code, or None if
+    the command cannot be dispatched or no server is listening.
+
+    stdin/stdout/stderr are file descriptors (default: this process's).
+    """
+    script_argv = resolve_script(argv)
+    if script_argv is None:
+        return None
+    sock = _connect(path)
+    if sock is None:
+        return None
+    fds = [
+        sys.stdin.fileno() if stdin is None else stdin,
+        sys.stdout.fileno() if stdout is None else stdout,
+        sys.stderr.fileno() if stderr is None else stderr,
+    ]
+    payload = json.dumps(
+        {"argv": script_argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+    ).encode()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with sock:
+        socket.send_fds(sock, [_LEN.pack(len(payload))], fds)
+        sock.sendall(payload)
+        try:
+            (code,) = _CODE.unpack(_recv_exact(sock, _CODE.size))
+        except EOFError:
+            # the task died without reporting (os._exit, signal)
+            code = 1
+    return code
+
+
+def _run_child(conn, request, fds):
+    """Body of the forked child: become the requested script and report its
+    exit code. Never returns."""
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        script = request["argv"][0]
+        sys.argv = list(request["argv"])
+        sys.path[0] = os.path.dirname(script)
+        try:
+            runpy.run_path(script, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        try:
+            conn.sendall(_CODE.pack(code))
+        finally:
+            os._exit(code)
+
+
+def serve(path, preload):
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    t0 = time.time()
+    loaded = []
+    for name in preload:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception as e:
+            print(f"Not preloading {name}: {type(e).__name__}: {e}")
+    print(f"Preloaded {', '.join(loaded)} in {time.time() - t0:.1f}s")
+
+    if os.path.exists(path):
+        if available(path):
+            raise RuntimeError(f"A warm worker is already listening on {path}")
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(64)
+    # children are not waited for, the client gets their exit code directly
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f"Warm worker listening on {path}", flush=True)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                header, fds, _, _ = socket.recv_fds(conn, _LEN.size, 3)
+                if not header:  # availability probe
+                    conn.close()
+                    continue
+                if len(header) < _LEN.size:
+                    header += _recv_exact(conn, _LEN.size - len(header))
+                (n,) = _LEN.unpack(header)
+                request = json.loads(_recv_exact(conn, n))
+            except (OSError, EOFError, ValueError) as e:
+                print(f"Bad request: {e}", flush=True)
+                conn.close()
+                continue
+            if request.get("stop"):
+                conn.close()
+                break
+            if len(fds) != 3:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+                continue
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                server.close()
+                _run_child(conn, request, fds)
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        print("Warm worker stopped", flush=True)
+
+
+def stop(path):
+    sock = _connect(path)
+    if sock is None:
+        return False
+    payload = json.dumps({"stop": True}).encode()
+    with sock:
+        socket.send_fds(sock, [_LEN.pack(len(payload))], [])
+        sock.sendall(payload)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--socket", default=None, help="socket path")
+    sub = parser.add_subparsers(dest="action", required=True)
+    p_serve = sub.add_parser("serve", help="start the server (foreground)")
+    p_serve.add_argument(
+        "--preload",
+        nargs="*",
+        default=DEFAULT_PRELOAD,
+        help="modules to import up front (missing ones are skipped)",
+    )
+    p_run = sub.add_parser(
+        "run", help="run a command in the worker, or exec it if none is running"
+    )
+    p_run.add_argument("command", nargs=argparse.REMAINDER)
+    sub.add_parser("status", help="exit 0 if a server is listening")
+    sub.add_parser("stop", help="stop the server")
+    args = parser.parse_args()
+    path = args.socket or socket_path()
+
+    if args.action == "serve":
+        serve(path, args.preload)
+    elif args.action == "run":
+        command = args.command[1:] if args.command[:1] == ["--"] else args.command
+        if not command:
+            parser.error("run needs a command")
+        code = run_remote(command, path=path)
+        if code is None:
+            os.execvp(command[0], command)
+        sys.exit(code)
+    elif args.action == "status":
+        ok = available(path)
+        print(f"warm worker {'up' if ok else 'not running'} ({path})")
+        sys.exit(0 if ok else 1)
+    elif args.action == "stop":
+        sys.exit(0 if stop(path) else 1)
+
+
+if __name__ == "__main__":
+    main()
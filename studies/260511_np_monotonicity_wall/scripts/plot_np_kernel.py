@@ -69,24 +69,40 @@ NP_PHYS_KEY = [
 ]
 
 
-def _theta_to_physical(theta, nuis, kfactor):
-    """Piecewise linearization (matches np_monotonicity.py and build_compare_table.py)."""
-    pmap_path = "/home/submit/lavezzo/alphaS/WRemnantsHelpers/scripts/np_param_map.json"
-    with open(pmap_path) as f:
-        pmap = json.load(f)["nuisances"][nuis]
-    nom = pmap["nominal"]
-    d_up = (pmap["Up_template_value"] - nom) * kfactor
-    d_dn = (nom - pmap["Down_template_value"]) * kfactor
+PMAP_PATH = "/home/submit/lavezzo/alphaS/WRemnantsHelpers/scripts/np_param_map.json"
+
+
+def _param_maps(kfactors):
+    """(nominal, d_up, d_dn) arrays over NP_NUIS for the piecewise
+    linearization (matches np_monotonicity.py and build_compare_table.py)."""
+    with open(PMAP_PATH) as f:
+        pmaps = json.load(f)["nuisances"]
+    nom, d_up, d_dn = (np.zeros(len(NP_NUIS)) for _ in range(3))
+    for k, nuis in enumerate(NP_NUIS):
+        # Accept kfactor keyed by either the rabbit nuisance name or the
+        # physical-parameter name (whichever the user passed).
+        kf = kfactors.get(nuis, kfactors.get(NP_PHYS_KEY[k], 1.0))
+        pmap = pmaps[nuis]
+        nom[k] = pmap["nominal"]
+        d_up[k] = (pmap["Up_template_value"] - nom[k]) * kf
+        d_dn[k] = (nom[k] - pmap["Down_template_value"]) * kf
+    return nom, d_up, d_dn
+
+
+def _theta_to_physical(theta, maps):
+    """θ [..., len(NP_NUIS)] -> physical values, same shape."""
+    nom, d_up, d_dn = maps
     return nom + np.maximum(theta, 0) * d_up - np.maximum(-theta, 0) * d_dn
 
 
 def sample_toys(fitresults_path, kfactors, n_toys, seed=0):
     """Read postfit means+cov for the 6 NPs, sample n_toys θ-vectors from MVN,
-    translate each to physical {lambda_2, lambda_4, ..., Lambda_4}.
+    translate them to physical {lambda_2, lambda_4, ..., Lambda_4}.
 
     Returns (central_dict, toys_phys) where central_dict is the postfit
-    physical point and toys_phys is a list of dicts (one per toy).
-    Frozen parameters (variance 0 in cov) are kept at their central value.
+    physical point and toys_phys an [n_toys, 6] array, columns in NP_PHYS_KEY
+    order. Frozen parameters (variance 0 in cov) are kept at their central
+    value.
     """
     sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
     sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
@@ -101,7 +117,6 @@ def sample_toys(fitresults_path, kfactors, n_toys, seed=0):
 
     # Pull θ and variance for each NP; identify frozen.
     theta = np.zeros(len(NP_NUIS))
-    in_cov = [False] * len(NP_NUIS)
     cov_idx = []
     for k, nm in enumerate(NP_NUIS):
         if nm in names:
@@ -110,41 +125,69 @@ def sample_toys(fitresults_path, kfactors, n_toys, seed=0):
         if nm in cov_names:
             ci = cov_names.index(nm)
             if cov[ci, ci] > 0:
-                in_cov[k] = True
                 cov_idx.append((k, ci))
 
-    def _kf(k):
-        # Accept kfactor keyed by either the rabbit nuisance name or the
-        # physical-parameter name (whichever the user passed).
-        return kfactors.get(NP_NUIS[k], kfactors.get(NP_PHYS_KEY[k], 1.0))
+    maps = _param_maps(kfactors)
+    central = _theta_to_physical(theta, maps)
+    central_phys = {key: float(v) for key, v in zip(NP_PHYS_KEY, central)}
 
-    central_phys = {
-        NP_PHYS_KEY[k]: float(_theta_to_physical(theta[k], NP_NUIS[k], _kf(k)))
-        for k in range(len(NP_NUIS))
-    }
-
-    # Sample θ-toys only for unfrozen params, then expand back to 6-vec.
+    # Sample θ-toys only for unfrozen params; the rest stay at θ.
     rng = np.random.default_rng(seed)
+    toys_theta = np.tile(theta, (n_toys, 1))
     if cov_idx:
-        means = np.array([theta[k] for k, _ in cov_idx])
-        sub = cov[np.ix_([ci for _, ci in cov_idx], [ci for _, ci in cov_idx])]
-        toys_sub = rng.multivariate_normal(means, sub, size=n_toys)
-    else:
-        toys_sub = np.zeros((n_toys, 0))
+        ks = [k for k, _ in cov_idx]
+        cis = [ci for _, ci in cov_idx]
+        toys_theta[:, ks] = rng.multivariate_normal(
+            theta[ks], cov[np.ix_(cis, cis)], size=n_toys
+        )
+    return central_phys, _theta_to_physical(toys_theta, maps)
 
-    toys_theta = np.tile(theta, (n_toys, 1))
-    for j, (k, _) in enumerate(cov_idx):
-        toys_theta[:, k] = toys_sub[:, j]
-
-    toys_phys = []
-    for t in range(n_toys):
-        d = {}
-        for k in range(len(NP_NUIS)):
-            d[NP_PHYS_KEY[k]] = float(
-                _theta_to_physical(toys_theta[t, k], NP_NUIS[k], _kf(k))
-            )
-        toys_phys.append(d)
-    return central_phys, toys_phys
+
+def toy_bands(bT, ys, toys, cls=(68.0,), chunk_mb=32, workers=None):
+    """Central-interval bands of γ̃^NP(b_T) and f^NP(b_T, y) over the toys.
+
+    The kernels are evaluated on a [y × b_T × toys] grid by broadcasting the
+    toy columns against b_T, and all quantiles are taken along the toy axis in
+    one call per b_T chunk (~chunk_mb each). Chunks run on `workers` threads
+    (default: all cores; numpy releases the GIL), so 10⁵–10⁶ toys stay within
+    memory and take seconds on a worker node.
+
+    Returns (band_cs, band_tmd): band_cs = {cl: (lo, hi)} and
+    band_tmd = {y: {cl: (lo, hi)}}, each lo/hi an array over bT.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    bT = np.asarray(bT, np.float64)
+    ys = np.asarray(ys, np.float64)
+    qs = np.array([q for cl in cls for q in (0.5 - cl / 200.0, 0.5 + cl / 200.0)])
+    p = {key: toys[:, k] for k, key in enumerate(NP_PHYS_KEY)}
+    q_cs = np.empty((len(qs), len(bT)))
+    q_tmd = np.empty((len(qs), len(ys), len(bT)))
+    step = max(1, int(chunk_mb * 2**20 / (8 * len(toys) * (len(ys) + 1))))
+
+    def chunk(s):
+        b = bT[s : s + step, None]
+        q_cs[:, s : s + step] = np.quantile(gamma_NP(b, p), qs, axis=-1)
+        q_tmd[:, :, s : s + step] = np.quantile(
+            f_NP(b[None], ys[:, None, None], p), qs, axis=-1
+        )
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        list(ex.map(chunk, range(0, len(bT), step)))
+
+    band_cs = {cl: (q_cs[2 * i], q_cs[2 * i + 1]) for i, cl in enumerate(cls)}
+    band_tmd = {
+        float(yv): {
+            cl: (q_tmd[2 * i, j], q_tmd[2 * i + 1, j]) for i, cl in enumerate(cls)
+        }
+        for j, yv in enumerate(ys)
+    }
+    return band_cs, band_tmd
+
+
+def band_alphas(n, alpha):
+    """Fill alphas for n nested bands, widest (drawn first) lightest."""
+    return np.linspace(alpha / 2, alpha, n) if n > 1 else [alpha]
 
 
 def parse_kfactor_args(args):
@@ -192,6 +235,19 @@ def main():
         default=500,
         help="Number of toys to sample from postfit MVN (default 500)",
     )
+    p.add_argument(
+        "--cl",
+        type=float,
+        nargs="+",
+        default=[68.0],
+        help="Central-interval toy bands to draw, in %% (e.g. 68 95; default 68)",
+    )
+    p.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=32,
+        help="Size of one [y x b_T x toys] kernel-grid chunk (default 32)",
+    )
     # Common
     p.add_argument("--label", default="postfit")
     p.add_argument("--y", type=float, nargs="+", default=[0.0, 2.5])
@@ -259,32 +315,23 @@ def main():
     bT = np.linspace(0, args.bT_max, 401)
     fig, (axL, axR) = plt.subplots(1, 2, figsize=(13, 4.5))
 
-    # If we have toys, compute 16/84 percentile bands on γ̃^NP(b_T) and on f^NP(b_T,y) per y.
-    band_cs = None
-    band_tmd = {}  # y → (lo, hi)
+    # If we have toys, compute central-interval bands (16/84 percentiles for
+    # 68%) on γ̃^NP(b_T) and on f^NP(b_T,y) per y.
+    band_cs = {}  # cl → (lo, hi)
+    band_tmd = {}  # y → {cl → (lo, hi)}
+    cls = sorted(args.cl, reverse=True)  # widest first, drawn underneath
     if toys is not None:
-        gamma_vals = np.array([gamma_NP(bT, t) for t in toys])
-        band_cs = (
-            np.percentile(gamma_vals, 16, axis=0),
-            np.percentile(gamma_vals, 84, axis=0),
-        )
-        for y in args.y:
-            fvals = np.array([f_NP(bT, y, t) for t in toys])
-            band_tmd[y] = (
-                np.percentile(fvals, 16, axis=0),
-                np.percentile(fvals, 84, axis=0),
-            )
+        band_cs, band_tmd = toy_bands(bT, args.y, toys, cls, args.chunk_mb)
 
     # Left panel: CS kernel γ̃^NP(b_T)
     axL.plot(bT, gamma_NP(bT, AN), label="AN central", color="C0", lw=2)
-    if band_cs is not None:
+    for cl, alpha in zip(band_cs, band_alphas(len(band_cs), 0.25)):
         axL.fill_between(
             bT,
-            band_cs[0],
-            band_cs[1],
+            *band_cs[cl],
             color="C3",
-            alpha=0.25,
-            label=f"{args.label} 68% band ({args.n_toys} toys)",
+            alpha=alpha,
+            label=f"{args.label} {cl:g}% band ({args.n_toys} toys)",
         )
     axL.plot(bT, gamma_NP(bT, point), label=args.label, color="C3", lw=2)
     axL.axhline(0, color="k", lw=0.5)
@@ -314,9 +361,9 @@ def main():
         axR.plot(
             bT, f_NP(bT, y, AN), color=cmap_AN(shade), lw=2, label=f"AN central, y={y}"
         )
-        if y in band_tmd:
-            lo, hi = band_tmd[y]
-            axR.fill_between(bT, lo, hi, color=cmap_P(shade), alpha=0.20)
+        bands = band_tmd.get(y, {})
+        for cl, alpha in zip(bands, band_alphas(len(bands), 0.20)):
+            axR.fill_between(bT, *band_tmd[y][cl], color=cmap_P(shade), alpha=alpha)
         axR.plot(
             bT,
             f_NP(bT, y, point),
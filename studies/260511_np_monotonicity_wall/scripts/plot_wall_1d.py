@@ -15,6 +15,18 @@ TMD walls are summed at y=0 and y=Y_MAX.
 
 The total penalty plotted is the bare sum P (before the exp(2τ) multiplier).
 Where 2·τ = 10 (the configs we run), the actual NLL contribution is P·22 026.
+
+constraint_funcs / wall_penalty broadcast over array-valued parameters, so
+beyond the 1D scans the script can also map the wall in more dimensions:
+
+  --pairs            2D slices of log10 P through --slice-at for every pair of
+                     scanned parameters, with each f_i = 0 line (wall_penalty_2d.png)
+  --volume-points N  feasible fraction of an N^5 grid over the SCANS box
+  --volume-toys N    the same from N uniform samples in the box
+  --from-fitresults  the same for postfit toys (plot_np_kernel.sample_toys)
+
+each with the fraction of points whose NLL contribution P·exp(2τ) exceeds 0.5
+for every --tau, to compare candidate --wallStrength values.
 """
 
 import argparse, os
@@ -50,13 +62,17 @@ def constraint_funcs(p):
 
     The penalty per constraint is max(0, -f)². Plotting f directly shows the
     margin to / past the wall on every active constraint.
+
+    The values of p may be scalars or arrays: they are broadcast against each
+    other, so an open grid (see open_grid) or toy columns give f on the whole
+    grid / every toy at once.
     """
-    l2 = p["lambda_2"]
-    l4 = p["lambda_4"]
-    L2 = p["Lambda_2"]
-    DL2 = p["Delta_Lambda_2"]
-    L4 = p["Lambda_4"]
-    l2_safe = max(l2, 0.0)
+    l2 = np.asarray(p["lambda_2"], np.float64)
+    l4 = np.asarray(p["lambda_4"], np.float64)
+    L2 = np.asarray(p["Lambda_2"], np.float64)
+    DL2 = np.asarray(p["Delta_Lambda_2"], np.float64)
+    L4 = np.asarray(p["Lambda_4"], np.float64)
+    l2_safe = np.maximum(l2, 0.0)
     cs_floor = -np.sqrt(K_CS * l2_safe * LAMBDA_6)
     out = {
         r"$\lambda_2$": l2,
@@ -64,7 +80,7 @@ def constraint_funcs(p):
     }
     for y, y_sq, ylab in ((0.0, 0.0, "0"), (Y_MAX, Y_MAX**2, str(Y_MAX))):
         L2y = L2 + DL2 * y_sq
-        L2y_safe = max(L2y, 0.0)
+        L2y_safe = np.maximum(L2y, 0.0)
         c1 = 3.0 * L4 + L2y_safe**3
         floor = -np.sqrt(K_TMD * BIG_LAMBDA_6 * L2y_safe)
         out[rf"$L_2(y{{=}}{ylab})$"] = L2y
@@ -75,8 +91,63 @@ def constraint_funcs(p):
 
 
 def wall_penalty(p):
-    """Total penalty: sum of max(0, -f)² over all constraints in constraint_funcs."""
-    return sum(max(0.0, -f) ** 2 for f in constraint_funcs(p).values())
+    """Total penalty: sum of max(0, -f)² over all constraints in constraint_funcs,
+    broadcast over the values of p like constraint_funcs."""
+    return sum(np.maximum(0.0, -f) ** 2 for f in constraint_funcs(p).values())
+
+
+def open_grid(axes, base=AN):
+    """Parameter dict for an N-D grid: axes {name: 1D values} each get their
+    own dimension (in the order given), the other parameters stay at `base`.
+    The grid is open (np.ix_), so it costs nothing until evaluated; the result
+    of wall_penalty on it has shape (len(v) for v in axes.values())."""
+    return {**base, **dict(zip(axes, np.ix_(*axes.values())))}
+
+
+def toys_dict(toys, keys=tuple(AN)):
+    """[n, len(keys)] array (e.g. plot_np_kernel.sample_toys) -> {name: column}."""
+    toys = np.asarray(toys, np.float64)
+    return {k: toys[:, i] for i, k in enumerate(keys)}
+
+
+def penalty_summary(P, taus=()):
+    """Counts over an array of penalties P: n points, n feasible (P == 0) and,
+    per τ, n with an NLL contribution P·exp(2τ) above 0.5 (i.e. past 1σ)."""
+    P = np.asarray(P)
+    return {
+        "n": P.size,
+        "feasible": int(np.count_nonzero(P == 0.0)),
+        "above": {
+            tau: int(np.count_nonzero(P * np.exp(2 * tau) > 0.5)) for tau in taus
+        },
+    }
+
+
+def grid_summary(axes, base=AN, taus=(), chunk_points=2**22):
+    """penalty_summary over the full N-D grid of `axes`, evaluated in slabs
+    along the first axis of at most ~chunk_points points."""
+    names = list(axes)
+    first, rest = names[0], {k: axes[k] for k in names[1:]}
+    per_row = int(np.prod([len(v) for v in rest.values()]))
+    step = max(1, chunk_points // max(per_row, 1))
+    tot = {"n": 0, "feasible": 0, "above": {tau: 0 for tau in taus}}
+    for s in range(0, len(axes[first]), step):
+        sub = {first: np.asarray(axes[first][s : s + step]), **rest}
+        P = np.broadcast_to(
+            wall_penalty(open_grid(sub, base)), [len(v) for v in sub.values()]
+        )
+        c = penalty_summary(P, taus)
+        tot["n"] += c["n"]
+        tot["feasible"] += c["feasible"]
+        for tau in taus:
+            tot["above"][tau] += c["above"][tau]
+    return tot
+
+
+def print_summary(label, c):
+    print(f"{label}: feasible {c['feasible']}/{c['n']} = {c['feasible'] / c['n']:.4f}")
+    for tau, n in c["above"].items():
+        print(f"  tau={tau:g}: P*exp(2tau) > 0.5 for {n / c['n']:.4f}")
 
 
 # Constraints that respond to each scanned parameter (used to thin the
@@ -184,21 +255,170 @@ SCANS = [
 ]
 
 
+POSTFIT_COLORS = {"inflate2x": "C1", "inflate5x": "C3", "unconstrained τ=3": "C2"}
+
+
+def plot_pairs(outdir, at="AN central", n_points=201):
+    """Lower-triangle grid of 2D slices through POSTFIT[at]: log10 P over each
+    pair of scanned parameters (the rest frozen at that point), feasible region
+    left white, every constraint's f = 0 line drawn on top."""
+    base = POSTFIT[at]
+    names = [s[0] for s in SCANS]
+    scans = {s[0]: s for s in SCANS}
+    n = len(names) - 1
+    fig, axes = plt.subplots(n, n, figsize=(3.2 * n, 3.2 * n), squeeze=False)
+    norm = matplotlib.colors.Normalize(vmin=-8, vmax=0)
+    im = None
+    for i in range(n):
+        for j in range(n):
+            ax = axes[i, j]
+            if j > i:
+                ax.axis("off")
+                continue
+            px, py = names[j], names[i + 1]
+            xs = np.linspace(scans[px][1][0], scans[px][1][-1], n_points)
+            ys = np.linspace(scans[py][1][0], scans[py][1][-1], n_points)
+            grid = open_grid({py: ys, px: xs}, base)
+            shape = (len(ys), len(xs))
+            P = np.broadcast_to(wall_penalty(grid), shape)
+            logP = np.ma.masked_where(P <= 0, np.log10(np.where(P > 0, P, 1.0)))
+            im = ax.pcolormesh(xs, ys, logP, cmap="viridis", norm=norm, shading="auto")
+            for f in constraint_funcs(grid).values():
+                f = np.broadcast_to(f, shape)
+                if f.min() < 0 < f.max():
+                    ax.contour(xs, ys, f, levels=[0.0], colors="k", linewidths=0.8)
+            for plab, pdct in POSTFIT.items():
+                ax.scatter(
+                    [pdct[px]],
+                    [pdct[py]],
+                    color=POSTFIT_COLORS.get(plab, "grey"),
+                    marker="*" if plab == at else "o",
+                    s=40,
+                    zorder=5,
+                    label=plab,
+                )
+            ax.set_xlim(xs[0], xs[-1])
+            ax.set_ylim(ys[0], ys[-1])
+            if i == n - 1:
+                ax.set_xlabel(scans[px][2])
+            if j == 0:
+                ax.set_ylabel(scans[py][2])
+    axes[0, 0].legend(loc="best", fontsize=7)
+    fig.colorbar(im, ax=axes.ravel().tolist(), shrink=0.6, label=r"$\log_{10} P$")
+    fig.suptitle(
+        f"Wall penalty slices through {at} (others frozen there; white = "
+        r"feasible, black = $f_i = 0$; $\lambda_\infty$ enters no wall)",
+        fontsize=11,
+    )
+    out = os.path.join(outdir, "wall_penalty_2d.png")
+    fig.savefig(out, dpi=120)
+    plt.close(fig)
+    print(f"Wrote {out}")
+
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--outdir", "-o", required=True)
+    p.add_argument(
+        "--pairs",
+        action="store_true",
+        help="Also plot the 2D slices through --slice-at for every pair of "
+        "scanned parameters (wall_penalty_2d.png)",
+    )
+    p.add_argument(
+        "--slice-at",
+        default="AN central",
+        choices=list(POSTFIT),
+        help="POSTFIT point the 2D slices go through (default AN central)",
+    )
+    p.add_argument(
+        "--pair-points",
+        type=int,
+        default=201,
+        help="Grid points per axis of each 2D slice (default 201)",
+    )
+    p.add_argument(
+        "--volume-points",
+        type=int,
+        default=0,
+        help="Points per axis of a full grid over the SCANS box of the five "
+        "parameters that enter the walls; prints the feasible volume fraction "
+        "(0 = skip, default)",
+    )
+    p.add_argument(
+        "--volume-toys",
+        type=int,
+        default=0,
+        help="Same from uniform random samples in the SCANS box (0 = skip)",
+    )
+    p.add_argument(
+        "--from-fitresults",
+        help="Also print the fractions for postfit toys (plot_np_kernel.sample_toys)",
+    )
+    p.add_argument(
+        "--kfactor",
+        nargs="*",
+        default=[],
+        help="Per-NP kfactor overrides as NAME=K for --from-fitresults",
+    )
+    p.add_argument(
+        "--n-toys",
+        type=int,
+        default=100000,
+        help="Toys to sample with --from-fitresults (default 100000)",
+    )
+    p.add_argument(
+        "--tau",
+        type=float,
+        nargs="*",
+        default=[3.0, 5.0],
+        help="--wallStrength values for which to print the fraction of points "
+        "with P·exp(2τ) > 0.5 (default 3 5)",
+    )
+    p.add_argument("--seed", type=int, default=0)
     args = p.parse_args()
     os.makedirs(args.outdir, exist_ok=True)
 
+    box = {s[0]: (s[1][0], s[1][-1]) for s in SCANS}
+    if args.volume_points:
+        axes = {
+            k: np.linspace(lo, hi, args.volume_points) for k, (lo, hi) in box.items()
+        }
+        print_summary(
+            f"grid {args.volume_points}^{len(axes)}",
+            grid_summary(axes, taus=args.tau),
+        )
+    if args.volume_toys:
+        rng = np.random.default_rng(args.seed)
+        toys = {**AN}
+        for k, (lo, hi) in box.items():
+            toys[k] = rng.uniform(lo, hi, args.volume_toys)
+        print_summary(
+            f"{args.volume_toys} uniform samples",
+            penalty_summary(wall_penalty(toys), args.tau),
+        )
+    if args.from_fitresults:
+        from plot_np_kernel import NP_PHYS_KEY, parse_kfactor_args, sample_toys
+
+        point, toys = sample_toys(
+            args.from_fitresults,
+            parse_kfactor_args(args.kfactor),
+            args.n_toys,
+            seed=args.seed,
+        )
+        P = wall_penalty(toys_dict(toys, NP_PHYS_KEY))
+        print_summary(f"{args.n_toys} postfit toys", penalty_summary(P, args.tau))
+        print(f"  postfit point: P = {float(wall_penalty(point)):.3g}")
+    if args.pairs:
+        plot_pairs(args.outdir, args.slice_at, args.pair_points)
+
     n = len(SCANS)
     fig, axes = plt.subplots(1, n, figsize=(4 * n, 4))
     if n == 1:
         axes = [axes]
 
-    postfit_colors = {"inflate2x": "C1", "inflate5x": "C3", "unconstrained τ=3": "C2"}
-
     for ax, (pname, xs, label, side, constraint_text) in zip(axes, SCANS):
-        ys_P = [wall_penalty({**AN, pname: x}) for x in xs]
+        ys_P = wall_penalty({**AN, pname: xs})
         ax.plot(xs, ys_P, color="C0", lw=2, label=r"penalty $P$")
         ax.axvline(
             AN[pname],
@@ -216,7 +436,7 @@ def main():
             ax.scatter(
                 [xv],
                 [yv],
-                color=postfit_colors[plab],
+                color=POSTFIT_COLORS[plab],
                 s=40,
                 zorder=5,
                 label=f"{plab}: {xv:+.3f}",
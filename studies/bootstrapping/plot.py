@@ -4,11 +4,21 @@ You have ran the fit with different toys, and put them in a directory, containin
 where toyN is the toy number.
 You want to read the the fit results from all the toys, and plot them.
 This is the script for you.
+
+The parms values/variances of all toys are first consolidated, in parallel
+(-j), into one columnar HDF5 store (--store): 2D [toy, param] arrays plus the
+parameter names and the (file, result) of each row. Re-runs only read toys
+that are new or changed since the last run, and append them to the store. The
+store records the --fitresultResult selection it was built with and is
+rebuilt when reused with another one.
 """
 
 import os
 import sys
 import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from hist import Hist
 import matplotlib.pyplot as plt
@@ -23,113 +33,327 @@ import combinetf2.io_tools
 hep.style.use("CMS")
 
 
-def load_results_from_dir(
-    indirs,
-    fitresult_name="fitresults.hdf5",
-    fitresult_result=None,
-    params=["pdfAlphaS"],
-    skip_toy0=False,
-):
+STORE_VERSION = 1
+REGEX_CHARS = ".^$*+?{}[]\\|()"
+DEFAULT_STORE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "bootstrapping_toys",
+)
 
-    fit_values = {}
-    fit_variances = {}
+
+def has_wildcard(s):
+    return "*" in s or "?" in s or "[" in s
+
+
+def find_fitresult_files(indirs, fitresult_name="fitresults.hdf5"):
+    """Expand the (possibly wildcarded) input directories and file names."""
 
     # create a list of directories to process in case there are wildcards
     dirs_to_process = []
     for dir in indirs:
-        if "*" in dir or "?" in dir or "[" in dir:
+        if has_wildcard(dir):
             matched_dirs = glob.glob(dir)
             if not matched_dirs:
                 print(f"No directories matched pattern {dir}")
                 continue
-            dirs_to_process.extend(matched_dirs)
+            dirs_to_process.extend(sorted(matched_dirs))
         else:
             dirs_to_process.append(dir)
 
-    # Loop over all subdirectories in the input directory and read the fit results
+    paths = []
     for subdir in dirs_to_process:
+        if has_wildcard(fitresult_name):
+            pattern = os.path.join(subdir, fitresult_name)
+            matched_files = glob.glob(pattern)
+            if not matched_files:
+                print(f"No files matched pattern {pattern}")
+                continue
+            paths.extend(sorted(matched_files))
+        else:
+            paths.append(os.path.join(subdir, fitresult_name))
+    return [os.path.abspath(p) for p in paths]
+
+
+def select_results(avail_fitresult_results, fitresult_result):
+    """Results of one file to read: all matching a regex, a single name, or None
+    (the default result)."""
+    if type(fitresult_result) is not str:
+        return [fitresult_result]
+
+    # Check if fitresult_result is a regex (contains special regex characters)
+    if any(c in fitresult_result for c in REGEX_CHARS):
+        regex = re.compile(fitresult_result)
+        matched = [r for r in avail_fitresult_results if regex.fullmatch(r)]
+        if not matched:
+            print(
+                f"\t\tNo fitresult_result matched regex '{fitresult_result}' in {avail_fitresult_results}"
+            )
+        return matched
+    if fitresult_result in avail_fitresult_results:
+        return [fitresult_result]
+    print(
+        f"\t\tfitresult_result '{fitresult_result}' not found in {avail_fitresult_results}"
+    )
+    return []
+
+
+def result_selected(result, fitresult_result):
+    """Whether a stored result name ("" for the default result) belongs to the
+    fitresult_result selection, as select_results picks them."""
+    if type(fitresult_result) is not str:
+        return result == (fitresult_result or "")
+    if any(c in fitresult_result for c in REGEX_CHARS):
+        return re.fullmatch(fitresult_result, result) is not None
+    return result == fitresult_result
+
+
+def read_toy_file(fitresult_path, fitresult_result=None):
+    """One fitresults file -> [(result, names, values, variances)] of the parms
+    hist for every selected result. Runs in the worker processes."""
+    with h5py.File(fitresult_path, mode="r") as f:
+        avail_fitresult_results = list(f.keys())
+
+    out = []
+    for result in select_results(avail_fitresult_results, fitresult_result):
+        fitresult, meta = combinetf2.io_tools.get_fitresult(
+            fitresult_path,
+            result=result.replace("results_", "") if result else None,
+            meta=True,
+        )
+        pulls = fitresult["parms"].get()
+        names = [n.decode() if isinstance(n, bytes) else str(n) for n in pulls.axes[0]]
+        out.append(
+            (
+                result or "",
+                names,
+                np.asarray(pulls.values(), dtype=np.float64),
+                np.asarray(pulls.variances(), dtype=np.float64),
+            )
+        )
+    return out
+
+
+def file_key(path):
+    """Identity of a file's current contents: inode + size + mtime."""
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def default_store_path(indirs, fitresult_name, fitresult_result):
+    spec = json.dumps([sorted(indirs), fitresult_name, fitresult_result])
+    digest = hashlib.sha1(spec.encode()).hexdigest()[:16]
+    return os.path.join(DEFAULT_STORE_DIR, f"toys_{digest}.hdf5")
+
+
+def selection_key(fitresult_result):
+    return json.dumps(fitresult_result)
 
-        if "toys_0" in subdir and skip_toy0:
-            print(f"Skipping toy 0 in {subdir} as requested.")
-            continue
-
-        print("Reading fit results from", subdir)
-
-        try:
-
-            # Handle wildcard in fitresult_name
-            if "*" in fitresult_name or "?" in fitresult_name or "[" in fitresult_name:
-                pattern = os.path.join(subdir, fitresult_name)
-                matched_files = glob.glob(pattern)
-                if not matched_files:
-                    print(f"No files matched pattern {pattern}")
-                    continue
-                fitresult_paths = matched_files
-            else:
-                fitresult_paths = [os.path.join(subdir, fitresult_name)]
-
-            for fitresult_path in fitresult_paths:
-
-                print(f"\tProcessing fit result file: {fitresult_path}")
-
-                with h5py.File(fitresult_path, mode="r") as f:
-                    avail_fitresult_results = list(f.keys())
-
-                fitresult_results_to_process = []
-                if type(fitresult_result) is str:
-
-                    # Check if fitresult_result is a regex (contains special regex characters)
-                    if any(c in fitresult_result for c in ".^$*+?{}[]\\|()"):
-                        regex = re.compile(fitresult_result)
-                        print(regex)
-                        matched = [
-                            r for r in avail_fitresult_results if regex.fullmatch(r)
-                        ]
-                        if not matched:
-                            print(
-                                f"\t\tNo fitresult_result matched regex '{fitresult_result}' in {avail_fitresult_results}"
-                            )
-                        fitresult_results_to_process.extend(matched)
-                    elif fitresult_result in avail_fitresult_results:
-                        fitresult_results_to_process.append(fitresult_result)
-                    else:
-                        print(
-                            f"\t\tfitresult_result '{fitresult_result}' not found in {avail_fitresult_results}"
-                        )
-
-                else:
-                    fitresult_results_to_process.append(fitresult_result)
-
-                for fitresult_result_to_process in fitresult_results_to_process:
-
-                    print(f"\t\tProcessing fit result: {fitresult_result_to_process}")
-
-                    fitresult, meta = combinetf2.io_tools.get_fitresult(
-                        fitresult_path,
-                        result=fitresult_result_to_process.replace("results_", ""),
-                        meta=True,
-                    )
-                    pulls = fitresult["parms"].get()
-                    if params == "*":
-                        params = [n for n in pulls.axes[0]]
-                    for param in params:
-                        if param not in fit_values:
-                            fit_values[param] = np.array([])
-                            fit_variances[param] = np.array([])
-                        fit_values[param] = np.append(
-                            fit_values[param], pulls[param].value
-                        )
-                        fit_variances[param] = np.append(
-                            fit_variances[param], pulls[param].variance
-                        )
-                        if param == "pdfAlphaS":
-                            print(f"\t\t{pulls[param].value}")
-
-        except Exception as e:
-            print(f"Error reading fit results from {subdir}: {e}")
-            continue
-
-    return fit_values, fit_variances
+
+def init_store(f, fitresult_result=None):
+    """Empty store: one row per (file, result), one column per parameter.
+
+    Columns are appended as new parameter names show up; entries a toy
+    doesn't have are NaN (the datasets' fill value).
+    """
+    f.attrs["version"] = STORE_VERSION
+    f.attrs["selection"] = selection_key(fitresult_result)
+    str_dt = h5py.string_dtype()
+    for name in ("names", "files", "results"):
+        f.create_dataset(name, (0,), maxshape=(None,), dtype=str_dt)
+    f.create_dataset("file_keys", (0, 4), maxshape=(None, 4), dtype="i8")
+    for name in ("values", "variances"):
+        f.create_dataset(
+            name,
+            (0, 0),
+            maxshape=(None, None),
+            chunks=(64, 512),
+            dtype="f8",
+            fillvalue=np.nan,
+        )
+
+
+def as_str(a):
+    return [x.decode() if isinstance(x, bytes) else str(x) for x in a]
+
+
+def consolidate(fitresult_paths, store_path, fitresult_result=None, jobs=1):
+    """Bring the columnar toy store up to date with fitresult_paths.
+
+    Only files that are new or changed since they were stored (path + inode +
+    size + mtime) are read, in parallel over `jobs` processes; their rows are
+    appended (or overwritten in place) in one block. Files that fail to read
+    are not stored, so the next run retries them. A store built for another
+    fitresult_result selection is emptied and rebuilt.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    with h5py.File(store_path, "a") as f:
+        selection = selection_key(fitresult_result)
+        if (
+            f.attrs.get("version") != STORE_VERSION
+            or f.attrs.get("selection") != selection
+        ):
+            if "selection" in f.attrs:
+                print(
+                    f"{store_path} holds results for --fitresultResult "
+                    f"{f.attrs['selection']}, rebuilding it for {selection}"
+                )
+            for k in list(f.keys()):
+                del f[k]
+            init_store(f, fitresult_result)
+
+        nrows = len(f["files"])
+        files = as_str(f["files"][:])
+        results = as_str(f["results"][:])
+        stored_keys = {p: list(k) for p, k in zip(files, f["file_keys"][:nrows])}
+        row_of = {(p, r): i for i, (p, r) in enumerate(zip(files, results))}
+        names = as_str(f["names"][:])
+        col_of = {n: i for i, n in enumerate(names)}
+
+        todo, keys = [], {}
+        for path in fitresult_paths:
+            try:
+                keys[path] = file_key(path)
+            except OSError as e:
+                print(f"Error reading fit results from {path}: {e}")
+                continue
+            if stored_keys.get(path) != keys[path]:
+                todo.append(path)
+        print(
+            f"{len(fitresult_paths) - len(todo)} files already in {store_path}, "
+            f"{len(todo)} to read"
+        )
+        if not todo:
+            return
+
+        read = {}
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+                futures = {
+                    path: pool.submit(read_toy_file, path, fitresult_result)
+                    for path in todo
+                }
+                for path, fut in futures.items():
+                    try:
+                        read[path] = fut.result()
+                    except Exception as e:
+                        print(f"Error reading fit results from {path}: {e}")
+        else:
+            for path in todo:
+                try:
+                    read[path] = read_toy_file(path, fitresult_result)
+                except Exception as e:
+                    print(f"Error reading fit results from {path}: {e}")
+
+        # assign rows and columns, then build the new block in memory
+        entries = []
+        new_rows = []
+        for path, file_results in read.items():
+            for result, pnames, vals, vars_ in file_results:
+                for n in pnames:
+                    if n not in col_of:
+                        col_of[n] = len(names)
+                        names.append(n)
+                row = row_of.get((path, result))
+                if row is None:
+                    row = nrows + len(new_rows)
+                    row_of[(path, result)] = row
+                    new_rows.append((path, result))
+                cols = np.array([col_of[n] for n in pnames], dtype=np.int64)
+                entries.append((row, path, cols, vals, vars_))
+        if not entries:
+            return
+
+        ncols = len(names)
+        ntot = nrows + len(new_rows)
+        f["names"].resize((ncols,))
+        f["names"][:] = names
+        for name in ("values", "variances"):
+            f[name].resize((ntot, ncols))
+
+        block_vals = np.full((len(entries), ncols), np.nan)
+        block_vars = np.full((len(entries), ncols), np.nan)
+        rows = np.array([e[0] for e in entries])
+        for k, (_, _, cols, vals, vars_) in enumerate(entries):
+            block_vals[k, cols] = vals
+            block_vars[k, cols] = vars_
+        appended = rows >= nrows
+        if appended.any():
+            order = np.argsort(rows[appended])
+            f["values"][nrows:ntot] = block_vals[appended][order]
+            f["variances"][nrows:ntot] = block_vars[appended][order]
+        for k in np.flatnonzero(~appended):
+            f["values"][rows[k]] = block_vals[k]
+            f["variances"][rows[k]] = block_vars[k]
+
+        # results that disappeared from a re-read file are blanked
+        current = {(path, res) for path in read for res, *_ in read[path]}
+        for (path, res), r in row_of.items():
+            if path in read and (path, res) not in current and r < nrows:
+                f["values"][r] = np.nan
+                f["variances"][r] = np.nan
+
+        # the row index goes last: a crash above leaves the old rows valid
+        f["file_keys"].resize((ntot, 4))
+        for (path, res), r in row_of.items():
+            if path in read:
+                f["file_keys"][r] = keys[path]
+        for name, i in (("files", 0), ("results", 1)):
+            f[name].resize((ntot,))
+            if new_rows:
+                f[name][nrows:ntot] = [x[i] for x in new_rows]
+        print(f"Stored {len(entries)} results ({len(new_rows)} new) in {store_path}")
+
+
+def load_store(
+    store_path, fitresult_paths=None, skip_toy0=False, fitresult_result=None
+):
+    """Read the store -> (names, values, variances), with one row per toy.
+
+    Rows are restricted to fitresult_paths, if given, and to the results
+    selected by fitresult_result (see select_results).
+    """
+    with h5py.File(store_path, "r") as f:
+        nrows = len(f["files"])
+        files = np.array(as_str(f["files"][:]))
+        results = as_str(f["results"][:])
+        names = as_str(f["names"][:])
+        values = f["values"][:nrows]
+        variances = f["variances"][:nrows]
+
+    # rows blanked by consolidate (result gone from a re-read file)
+    keep = ~np.all(np.isnan(values), axis=1)
+    keep &= np.array([result_selected(r, fitresult_result) for r in results], bool)
+    if fitresult_paths is not None:
+        keep &= np.isin(files, list(fitresult_paths))
+    if skip_toy0:
+        toy0 = np.array(["toys_0" in os.path.dirname(p) for p in files], dtype=bool)
+        if toy0.any():
+            print(f"Skipping toy 0 ({toy0.sum()} results) as requested.")
+        keep &= ~toy0
+    return names, values[keep], variances[keep]
+
+
+def load_results_from_dir(
+    indirs,
+    fitresult_name="fitresults.hdf5",
+    fitresult_result=None,
+    skip_toy0=False,
+    store_path=None,
+    jobs=1,
+):
+    """Consolidate the toys under indirs into the columnar store and read it.
+
+    Returns names (Nparam,), values and variances (Ntoy, Nparam).
+    """
+    paths = find_fitresult_files(indirs, fitresult_name)
+    if store_path is None:
+        store_path = default_store_path(indirs, fitresult_name, fitresult_result)
+    consolidate(paths, store_path, fitresult_result=fitresult_result, jobs=jobs)
+    names, values, variances = load_store(
+        store_path, paths, skip_toy0=skip_toy0, fitresult_result=fitresult_result
+    )
+    print(f"Loaded {values.shape[0]} toys x {values.shape[1]} parameters")
+    return names, values, variances
 
 
 def plot_alphaS_postfit(fit_values, outdir, postfix=None):
@@ -184,15 +408,16 @@ def plot_alphaS_postfit(fit_values, outdir, postfix=None):
     fig.savefig(fname + ".png", bbox_inches="tight", dpi=300)
 
 
-def plot_pulls(fit_values, outdir, postfix=None, nparams=20):
+def plot_pulls(names, fit_values, outdir, postfix=None, nparams=20):
 
     # define leading nparams parameters to plot
-    fit_values = {k: v for k, v in fit_values.items() if "pdf" in k}
-    largest_pull_params = sorted(
-        fit_values.keys(), key=lambda x: np.abs(np.mean(fit_values[x])), reverse=True
-    )[:nparams]
-    largest_mean_pulls = [np.mean(fit_values[param]) for param in largest_pull_params]
-    largest_std_pulls = [np.std(fit_values[param]) for param in largest_pull_params]
+    cols = np.array([i for i, n in enumerate(names) if "pdf" in n], dtype=int)
+    mean_pulls = np.nanmean(fit_values[:, cols], axis=0)
+    std_pulls = np.nanstd(fit_values[:, cols], axis=0)
+    order = np.argsort(-np.abs(mean_pulls), kind="stable")[:nparams]
+    largest_pull_params = [names[cols[i]] for i in order]
+    largest_mean_pulls = mean_pulls[order]
+    largest_std_pulls = std_pulls[order]
 
     # plot them
     fig, ax = plt.subplots(1, 1, figsize=(12, 10))
@@ -267,30 +492,37 @@ def main():
         action="store_true",
         help="Skip toy 0 in the fit results. This is useful if you want to skip the first toy, which is usually the non-randomized toy.",
     )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Columnar toy store (HDF5) to consolidate the fit results into. "
+        f"Default: a file under {DEFAULT_STORE_DIR} keyed by the input arguments.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes reading new fit results into the store.",
+    )
     args = parser.parse_args()
 
-    if not args.noAlphaSHist:
-
-        fit_values, fit_variances = load_results_from_dir(
-            indirs=args.indir,
-            fitresult_name=args.fitresultName,
-            fitresult_result=args.fitresultResult,
-            params=["pdfAlphaS"],
-            skip_toy0=args.skipToy0,
-        )
+    names, fit_values, fit_variances = load_results_from_dir(
+        indirs=args.indir,
+        fitresult_name=args.fitresultName,
+        fitresult_result=args.fitresultResult,
+        skip_toy0=args.skipToy0,
+        store_path=args.store,
+        jobs=args.jobs,
+    )
 
-        plot_alphaS_postfit(fit_values["pdfAlphaS"], args.outdir, args.postfix)
+    if not args.noAlphaSHist:
+        alphaS = fit_values[:, names.index("pdfAlphaS")]
+        plot_alphaS_postfit(alphaS[np.isfinite(alphaS)], args.outdir, args.postfix)
 
     if args.pulls:
-
-        fit_values, fit_variances = load_results_from_dir(
-            indirs=args.indir,
-            fitresult_name=args.fitresultName,
-            fitresult_result=args.fitresultResult,
-            params="*",
-        )
-
-        plot_pulls(fit_values, args.outdir, args.postfix, nparams=20)
+        plot_pulls(names, fit_values, args.outdir, args.postfix, nparams=20)
 
 
 if __name__ == "__main__":
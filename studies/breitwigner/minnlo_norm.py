@@ -3,11 +3,10 @@ import sys
 sys.path.append("../../WRemnants/")
 import os
 import re
-from wums import ioutils
+from scripts.narf_io import load_results_h5py
 import argparse
 import h5py
 import pprint
-from wums import ioutils
 from wums import boostHistHelpers as hh
 import numpy as np
 import mplhep as hep
@@ -20,14 +19,6 @@ from hist import Hist
 hep.style.use("CMS")
 
 
-def load_results_h5py(h5file):
-
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 def is_regex(pattern):
 
     if any([x in pattern for x in ["*", "/"]]):
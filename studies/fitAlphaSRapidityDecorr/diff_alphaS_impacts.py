@@ -17,15 +17,24 @@ Sanity checks:
   - For each POI j: sum_i (I_ij * theta_hat_i) should ~ (alphaS_j_postfit - alphaS_j_prefit).
   - For each pair (j, k): sum_i (I_ij - I_ik) * theta_hat_i should ~ (alphaS_j - alphaS_k)_postfit.
 
+All quantities are computed on the whole (POI x nuisance) impact matrix at
+once. Rankings keep only the top N entries (argpartition) before anything is
+formatted. --allPairs evaluates contrib_ijk for every POI pair, in pair chunks
+bounded by --chunkMB, and reports each pair's top drivers. Several impact
+flavours (--impactType global traditional ..., or all) are read from the one
+loaded fitresult and reported in the same invocation.
+
 Usage:
     diff_alphaS_impacts.py results/fitresults.hdf5 \
-        --poiRegex '^alphaS_y\d+$' --topN 20
+        --poiRegex '^alphaS_y\d+$' --topN 20 [--impactType all] [--allPairs]
 
 The fit must have been run with --doImpacts --globalImpacts (default impactType
 here is "global").
 """
 
 import argparse
+import csv
+import os
 import re
 import sys
 
@@ -33,6 +42,8 @@ import numpy as np
 
 from rabbit import io_tools
 
+IMPACT_TYPES = ["global", "gaussian_global", "traditional", "nonprofiled"]
+
 
 def make_parser():
     p = argparse.ArgumentParser(
@@ -61,9 +72,11 @@ def make_parser():
     )
     p.add_argument(
         "--impactType",
-        default="global",
-        choices=["global", "gaussian_global", "traditional", "nonprofiled"],
-        help="Which impact flavor to read (default: global).",
+        nargs="+",
+        default=["global"],
+        choices=IMPACT_TYPES + ["all"],
+        help="Impact flavor(s) to read (default: global); 'all' for every "
+        "flavor present. Each gets its own set of tables.",
     )
     p.add_argument(
         "--grouped",
@@ -84,6 +97,25 @@ def make_parser():
         help="Restrict per-pair contribution analysis to this POI pair. "
         "Default: the pair with the largest postfit alphaS difference.",
     )
+    p.add_argument(
+        "--allPairs",
+        action="store_true",
+        help="Also decompose every POI pair (not just --pair / the extreme "
+        "pair) and print each pair's top drivers.",
+    )
+    p.add_argument(
+        "--pairsCsv",
+        default=None,
+        help="With --allPairs, write the top --topN drivers of every pair to "
+        "this CSV (suffixed with the impact type if several are requested).",
+    )
+    p.add_argument(
+        "--chunkMB",
+        type=float,
+        default=512,
+        help="Memory bound for one chunk of the (pair x nuisance) "
+        "contribution tensor (default: 512).",
+    )
     p.add_argument(
         "--groupBy",
         default=None,
@@ -227,94 +259,90 @@ def print_table(title, rows, headers, sort_key=None, reverse=True, top=None):
         print("  ".join(str(r[i]).ljust(widths[i]) for i in range(len(headers))))
 
 
-def main():
-    args = make_parser().parse_args()
+def top_indices(score, top, keep=None):
+    """Indices of the `top` largest finite entries of `score`, sorted descending.
 
-    fitresult, meta = io_tools.get_fitresult(args.infile, args.result, meta=True)
+    Uses argpartition so only the selected entries are sorted. Entries outside
+    `keep` (boolean mask) or non-finite are never selected. top=None keeps all.
+    """
+    ok = np.isfinite(score)
+    if keep is not None:
+        ok &= keep
+    cand = np.flatnonzero(ok)
+    if top is not None and len(cand) > top:
+        if top <= 0:
+            return cand[:0]
+        part = np.argpartition(score[cand], len(cand) - top)[len(cand) - top :]
+        cand = cand[part]
+    return cand[np.argsort(score[cand], kind="stable")[::-1]]
 
-    all_pois = io_tools.get_poi_names(meta)
-    pat = re.compile(args.poiRegex)
-    poi_names = np.array([p for p in all_pois if pat.match(p)])
-    if len(poi_names) < 2:
-        sys.exit(f"Need >=2 POIs matching {args.poiRegex}; found {list(poi_names)}")
-    print(f"Selected {len(poi_names)} POIs: {list(poi_names)}")
 
-    nuis_labels, I = load_poi_table(fitresult, poi_names, args.impactType, args.grouped)
-    print(
-        f"Loaded {len(nuis_labels)} {'grouped' if args.grouped else 'individual'} "
-        f"{args.impactType} impact entries per POI."
-    )
+def pair_chunks(npairs, nnuis, chunk_mb):
+    """Slices over the pair axis so one (pair x nuisance) float64 block fits chunk_mb."""
+    step = max(1, int(chunk_mb * 2**20) // (8 * max(nnuis, 1)))
+    for start in range(0, npairs, step):
+        yield slice(start, min(start + step, npairs))
 
-    pull_labels, pulls, _ = io_tools.get_pulls_and_constraints(fitresult)
-    theta_hat, missing = align_pulls(nuis_labels, pull_labels, pulls)
-    if missing:
-        print(
-            f"NOTE: {len(missing)} impact labels have no matching post-fit pull "
-            f"(treated as 0). Examples: {missing[:5]}"
-        )
 
-    centrals, sigmas = get_poi_central_and_sigma(fitresult, poi_names)
-    centrals_pre, _ = get_poi_central_and_sigma(fitresult, poi_names, prefit=True)
-    raw_shift = centrals - centrals_pre
-    # If --blindingGroup was used, all selected POIs share an identical additive
-    # blinding offset that survives in 'parms' but not in 'parms_prefit'. Estimate
-    # and remove it so the per-POI shifts are interpretable. The robust estimator
-    # is the median across POIs (the per-bin shifts due to the fit itself average
-    # ~ 0 for noi-style alphaS POIs); spread metrics are invariant under this.
-    blinding_offset = float(np.median(raw_shift))
-    shift = raw_shift - blinding_offset
+def pair_drivers(I, theta_hat, ja, jb, top, keep=None, chunk_mb=512):
+    """Top drivers contrib_ijk = (I_ij - I_ik) * theta_hat_i of every pair (j, k).
+
+    The (pair x nuisance) contribution tensor is formed by broadcasting, one
+    chunk of pairs at a time (see pair_chunks), and reduced to its per-pair
+    linearised sum and top-`top` entries by |contrib| with argpartition.
+
+    Returns
+    -------
+    sums : (Npair,) linearised sum over all nuisances
+    idx  : (Npair, Ntop) nuisance indices, by decreasing |contrib|; -1 padding
+    vals : (Npair, Ntop) signed contributions; NaN padding
+    """
+    npairs, nnuis = len(ja), I.shape[1]
+    ntop = nnuis if top is None else max(0, min(top, nnuis))
+    sums = np.empty(npairs, dtype=np.float64)
+    idx = np.full((npairs, ntop), -1, dtype=np.int64)
+    vals = np.full((npairs, ntop), np.nan, dtype=np.float64)
+    if npairs == 0:
+        return sums, idx, vals
+    drop = ~keep if keep is not None else np.zeros(nnuis, dtype=bool)
+
+    for sl in pair_chunks(npairs, nnuis, chunk_mb):
+        c = (I[ja[sl]] - I[jb[sl]]) * theta_hat[None, :]
+        sums[sl] = c.sum(axis=1)
+        if ntop == 0:
+            continue
+        # Negate so that the largest |contrib| come first; excluded -> +inf.
+        score = -np.abs(c)
+        score[~np.isfinite(score) | drop[None, :]] = np.inf
+        if ntop < nnuis:
+            sel = np.argpartition(score, ntop - 1, axis=1)[:, :ntop]
+        else:
+            sel = np.broadcast_to(np.arange(nnuis), score.shape)
+        order = np.argsort(np.take_along_axis(score, sel, axis=1), axis=1)
+        sel = np.take_along_axis(sel, order, axis=1)
+        valid = np.isfinite(np.take_along_axis(score, sel, axis=1))
+        idx[sl] = np.where(valid, sel, -1)
+        vals[sl] = np.where(valid, np.take_along_axis(c, sel, axis=1), np.nan)
+    return sums, idx, vals
+
+
+def tagged_path(path, impact_type, multi):
+    """Suffix an output path with the impact type when several are reported."""
+    if not multi:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{impact_type}{ext}"
+
+
+def report_impacts(
+    args, impact_type, poi_names, nuis_labels, I, theta_hat, centrals, shift, multi
+):
+    """Print (and optionally write) all tables for one impact flavour."""
+    tag = f"[{impact_type}] " if multi else ""
     spread_obs = centrals.max() - centrals.min()
     j_max = int(np.argmax(centrals))
     j_min = int(np.argmin(centrals))
 
-    print("\n=== Per-POI postfit (BLINDED if --blindingGroup was used) ===")
-    print(
-        f"Estimated common blinding offset (median postfit-prefit) = "
-        f"{fmt(blinding_offset)} (subtracted in 'shift' below)."
-    )
-    print(
-        f"{'POI':<35} {'central':>12} {'sigma':>12} "
-        f"{'shift/sigma':>12} {'shift':>12}"
-    )
-    for p, c, s, sh in zip(poi_names, centrals, sigmas, shift):
-        z = sh / s if s > 0 else float("nan")
-        print(f"{p:<35} {fmt(c):>12} {fmt(s):>12} {fmt(z):>12} {fmt(sh):>12}")
-    print(
-        f"Observed spread (max-min): {fmt(spread_obs)}  "
-        f"between {poi_names[j_max]} and {poi_names[j_min]}"
-    )
-    if np.median(sigmas) > 0:
-        print(f"  ~ {spread_obs / np.median(sigmas):+.2f} x median(sigma_POI)")
-
-    # Likelihood-ratio compatibility test (Wilks). This is the correct overall
-    # test for "is one common alphaS sufficient?".
-    if args.inclusive is not None:
-        from scipy.stats import chi2 as _chi2
-
-        nll_decorr = float(fitresult["nllvalreduced"][...])
-        f_incl = io_tools.get_fitresult(args.inclusive, args.result)
-        nll_incl = float(f_incl["nllvalreduced"][...])
-        ndf = len(poi_names) - 1
-        chi2_lr = 2.0 * (nll_incl - nll_decorr)
-        p_lr = 1.0 - _chi2.cdf(chi2_lr, ndf)
-        print("\n=== Likelihood-ratio compatibility test (Wilks) ===")
-        print(f"  NLL_inclusive  = {nll_incl:.4f}")
-        print(f"  NLL_decorr     = {nll_decorr:.4f}")
-        print(f"  chi2 = 2*(NLL_inc - NLL_dec) = {chi2_lr:.3f}")
-        print(f"  ndf  = N_POI - 1             = {ndf}")
-        print(f"  p-value                       = {p_lr:.3g}")
-        if "nllvalfull" in fitresult.keys():
-            try:
-                nll_decorr_f = float(fitresult["nllvalfull"][...])
-                nll_incl_f = float(f_incl["nllvalfull"][...])
-                chi2_lr_f = 2.0 * (nll_incl_f - nll_decorr_f)
-                p_lr_f = 1.0 - _chi2.cdf(chi2_lr_f, ndf)
-                print(
-                    f"  (full likelihood) chi2 = {chi2_lr_f:.3f}, " f"p = {p_lr_f:.3g}"
-                )
-            except Exception:
-                pass
-
     # Per-nuisance metrics
     mean_I = np.nanmean(I, axis=0)
     max_I = np.nanmax(I, axis=0)
@@ -323,8 +351,6 @@ def main():
     std_I = np.nanstd(I, axis=0, ddof=1)
     delta = spread_I * theta_hat  # active extreme-pair contribution
     delta_std = std_I * theta_hat  # active bulk-spread contribution
-    abs_delta = np.abs(delta)
-    abs_delta_std = np.abs(delta_std)
     mean_contrib = mean_I * theta_hat  # contribution to the *mean* alphaS
 
     # Linearized differential decomposition.
@@ -334,11 +360,13 @@ def main():
     # nuisances. So treat the numbers below as a *partial* decomposition useful
     # for ranking which nuisances are most differential, not as a "% explained".
     # The correct overall compatibility test is the LR test above.
-    pred_postfit_shift = (I * theta_hat[None, :]).sum(axis=1)  # per POI
-    pred_pair = (I[j_max] - I[j_min]) * theta_hat
-    pred_spread = pred_pair.sum()
+    pred_postfit_shift = I @ theta_hat  # per POI
+    pred_spread = (I[j_max] - I[j_min]) @ theta_hat
 
-    print("\n=== Linearised differential decomposition (PARTIAL, not an identity) ===")
+    print(
+        f"\n=== {tag}Linearised differential decomposition "
+        f"(PARTIAL, not an identity) ==="
+    )
     print(f"{'POI':<35} {'shift':>14} {'sum I*theta':>14}")
     for p, sh, pr in zip(poi_names, shift, pred_postfit_shift):
         print(f"{p:<35} {fmt(sh):>14} {fmt(pr):>14}")
@@ -355,23 +383,21 @@ def main():
     keep = spread_I >= args.minSpread
 
     # Ranking 1: |delta| = active differential contribution
-    rows = []
-    for i, l in enumerate(nuis_labels):
-        if not keep[i]:
-            continue
-        rows.append(
-            (
-                l,
-                fmt(theta_hat[i]),
-                fmt(mean_I[i]),
-                fmt(spread_I[i]),
-                fmt(std_I[i]),
-                fmt(delta[i]),
-                f"{abs_delta[i]:.4g}",
-            )
+    rows = [
+        (
+            nuis_labels[i],
+            fmt(theta_hat[i]),
+            fmt(mean_I[i]),
+            fmt(spread_I[i]),
+            fmt(std_I[i]),
+            fmt(delta[i]),
+            f"{abs(delta[i]):.4g}",
         )
+        for i in top_indices(np.abs(delta), args.topN, keep)
+    ]
     print_table(
-        f"Top {args.topN} nuisances by |spread x pull|  (currently driving the spread)",
+        f"{tag}Top {args.topN} nuisances by |spread x pull|  "
+        f"(currently driving the spread)",
         rows,
         (
             "nuisance",
@@ -382,31 +408,25 @@ def main():
             "delta=spread*pull",
             "|delta|",
         ),
-        sort_key=lambda r: float(r[-1]),
-        top=args.topN,
     )
 
     # Ranking 2: spread alone (capacity)
-    rows2 = []
-    for i, l in enumerate(nuis_labels):
-        if not keep[i]:
-            continue
-        rows2.append(
-            (
-                l,
-                fmt(theta_hat[i]),
-                fmt(mean_I[i]),
-                fmt(spread_I[i]),
-                fmt(std_I[i]),
-                f"{abs(spread_I[i]):.4g}",
-            )
+    rows2 = [
+        (
+            nuis_labels[i],
+            fmt(theta_hat[i]),
+            fmt(mean_I[i]),
+            fmt(spread_I[i]),
+            fmt(std_I[i]),
+            f"{abs(spread_I[i]):.4g}",
         )
+        for i in top_indices(np.abs(spread_I), args.topN, keep)
+    ]
     print_table(
-        f"Top {args.topN} nuisances by |spread_I|  (capacity, regardless of pull)",
+        f"{tag}Top {args.topN} nuisances by |spread_I|  "
+        f"(capacity, regardless of pull)",
         rows2,
         ("nuisance", "pull", "mean_I", "spread_I", "std_I", "|spread_I|"),
-        sort_key=lambda r: float(r[-1]),
-        top=args.topN,
     )
 
     # Ranking 3: std_I x pull -- robust analogue of |spread x pull|.
@@ -414,23 +434,20 @@ def main():
     # postfit pull. Less outlier-sensitive than spread and the natural
     # heuristic for "which nuisances drive the *bulk* spread" (the rms
     # spread of alphaS values across bins) rather than the extreme pair.
-    rows3 = []
-    for i, l in enumerate(nuis_labels):
-        if not keep[i]:
-            continue
-        rows3.append(
-            (
-                l,
-                fmt(theta_hat[i]),
-                fmt(mean_I[i]),
-                fmt(spread_I[i]),
-                fmt(std_I[i]),
-                fmt(delta_std[i]),
-                f"{abs_delta_std[i]:.4g}",
-            )
+    rows3 = [
+        (
+            nuis_labels[i],
+            fmt(theta_hat[i]),
+            fmt(mean_I[i]),
+            fmt(spread_I[i]),
+            fmt(std_I[i]),
+            fmt(delta_std[i]),
+            f"{abs(delta_std[i]):.4g}",
         )
+        for i in top_indices(np.abs(delta_std), args.topN, keep)
+    ]
     print_table(
-        f"Top {args.topN} nuisances by |std_I x pull|  "
+        f"{tag}Top {args.topN} nuisances by |std_I x pull|  "
         f"(active bulk-spread driver; rms-based, outlier-robust)",
         rows3,
         (
@@ -442,32 +459,25 @@ def main():
             "delta=std*pull",
             "|delta_std|",
         ),
-        sort_key=lambda r: float(r[-1]),
-        top=args.topN,
     )
 
     # Ranking 4: std alone (bulk capacity)
-    rows4 = []
-    for i, l in enumerate(nuis_labels):
-        if not keep[i]:
-            continue
-        rows4.append(
-            (
-                l,
-                fmt(theta_hat[i]),
-                fmt(mean_I[i]),
-                fmt(spread_I[i]),
-                fmt(std_I[i]),
-                f"{abs(std_I[i]):.4g}",
-            )
+    rows4 = [
+        (
+            nuis_labels[i],
+            fmt(theta_hat[i]),
+            fmt(mean_I[i]),
+            fmt(spread_I[i]),
+            fmt(std_I[i]),
+            f"{abs(std_I[i]):.4g}",
         )
+        for i in top_indices(np.abs(std_I), args.topN, keep)
+    ]
     print_table(
-        f"Top {args.topN} nuisances by |std_I|  "
+        f"{tag}Top {args.topN} nuisances by |std_I|  "
         f"(bulk capacity, regardless of pull)",
         rows4,
         ("nuisance", "pull", "mean_I", "spread_I", "std_I", "|std_I|"),
-        sort_key=lambda r: float(r[-1]),
-        top=args.topN,
     )
 
     # Per-pair contributions
@@ -482,24 +492,21 @@ def main():
     pair_label = f"{poi_names[ja]} - {poi_names[jb]}"
     contrib = (I[ja] - I[jb]) * theta_hat
     obs_pair = centrals[ja] - centrals[jb]
-    rows3 = []
-    for i, l in enumerate(nuis_labels):
-        if not keep[i]:
-            continue
-        rows3.append(
-            (
-                l,
-                fmt(theta_hat[i]),
-                fmt(I[ja, i]),
-                fmt(I[jb, i]),
-                fmt(contrib[i]),
-                f"{abs(contrib[i]):.4g}",
-            )
+    rows5 = [
+        (
+            nuis_labels[i],
+            fmt(theta_hat[i]),
+            fmt(I[ja, i]),
+            fmt(I[jb, i]),
+            fmt(contrib[i]),
+            f"{abs(contrib[i]):.4g}",
         )
+        for i in top_indices(np.abs(contrib), args.topN, keep)
+    ]
     print_table(
-        f"Top {args.topN} contributors to ({pair_label})  "
+        f"{tag}Top {args.topN} contributors to ({pair_label})  "
         f"observed={fmt(obs_pair)}, linearized sum={fmt(contrib.sum())}",
-        rows3,
+        rows5,
         (
             "nuisance",
             "pull",
@@ -508,38 +515,100 @@ def main():
             "(Ia-Ib)*pull",
             "|contrib|",
         ),
-        sort_key=lambda r: float(r[-1]),
-        top=args.topN,
     )
 
+    # All pairs at once: (pair x nuisance) tensor, chunked over pairs
+    if args.allPairs:
+        pa, pb = np.triu_indices(len(poi_names), k=1)
+        sums, idx, vals = pair_drivers(
+            I, theta_hat, pa, pb, args.topN, keep=keep, chunk_mb=args.chunkMB
+        )
+        obs = centrals[pa] - centrals[pb]
+        order = np.argsort(np.abs(obs), kind="stable")[::-1]
+        nshow = min(3, idx.shape[1])
+        rows6 = []
+        for p in order:
+            drivers = [
+                f"{nuis_labels[i]}({fmt(v, 3)})"
+                for i, v in zip(idx[p, :nshow], vals[p, :nshow])
+                if i >= 0
+            ]
+            rows6.append(
+                (
+                    f"{poi_names[pa[p]]} - {poi_names[pb[p]]}",
+                    fmt(obs[p]),
+                    fmt(sums[p]),
+                    ", ".join(drivers),
+                )
+            )
+        print_table(
+            f"{tag}All {len(pa)} POI pairs by |observed difference|  "
+            f"(top {nshow} drivers each)",
+            rows6,
+            ("pair", "observed", "linearized sum", "top drivers (contrib)"),
+        )
+
+        if args.pairsCsv:
+            path = tagged_path(args.pairsCsv, impact_type, multi)
+            with open(path, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(
+                    [
+                        "poi_a",
+                        "poi_b",
+                        "observed",
+                        "linearized_sum",
+                        "rank",
+                        "nuisance",
+                        "pull",
+                        "contrib",
+                    ]
+                )
+                for p in order:
+                    for r, (i, v) in enumerate(zip(idx[p], vals[p])):
+                        if i < 0:
+                            break
+                        w.writerow(
+                            [
+                                poi_names[pa[p]],
+                                poi_names[pb[p]],
+                                obs[p],
+                                sums[p],
+                                r + 1,
+                                nuis_labels[i],
+                                theta_hat[i],
+                                v,
+                            ]
+                        )
+            print(f"\nWrote per-pair driver table to {path}")
+
     # Optional group aggregation
     if args.groupBy is not None:
         tags = assign_groups(nuis_labels, args.groupBy)
-        agg_delta = {}
-        agg_mean = {}
-        agg_pair = {}
-        agg_quad_spread = {}
-        for tag in sorted(set(tags)):
-            mask = tags == tag
-            agg_delta[tag] = float(np.nansum(delta[mask]))
-            agg_mean[tag] = float(np.nansum(mean_contrib[mask]))
-            agg_pair[tag] = float(np.nansum(contrib[mask]))
-            # group-level spread is non-additive; sum in quadrature as a heuristic
-            agg_quad_spread[tag] = float(np.sqrt(np.nansum(spread_I[mask] ** 2)))
-        rows4 = [
+        groups, inv = np.unique(tags, return_inverse=True)
+
+        def group_sum(x):
+            return np.bincount(inv, weights=np.nan_to_num(x), minlength=len(groups))
+
+        agg_delta = group_sum(delta)
+        agg_mean = group_sum(mean_contrib)
+        agg_pair = group_sum(contrib)
+        # group-level spread is non-additive; sum in quadrature as a heuristic
+        agg_quad_spread = np.sqrt(group_sum(spread_I**2))
+        rows7 = [
             (
-                tag,
-                fmt(agg_mean[tag]),
-                fmt(agg_delta[tag]),
-                fmt(agg_quad_spread[tag]),
-                fmt(agg_pair[tag]),
-                f"{abs(agg_pair[tag]):.4g}",
+                g,
+                fmt(agg_mean[k]),
+                fmt(agg_delta[k]),
+                fmt(agg_quad_spread[k]),
+                fmt(agg_pair[k]),
+                f"{abs(agg_pair[k]):.4g}",
             )
-            for tag in agg_delta
+            for k, g in enumerate(groups)
         ]
         print_table(
-            f"Group-level contributions to ({pair_label})",
-            rows4,
+            f"{tag}Group-level contributions to ({pair_label})",
+            rows7,
             (
                 "group",
                 "sum mean*pull",
@@ -553,9 +622,8 @@ def main():
         )
 
     if args.csv:
-        import csv
-
-        with open(args.csv, "w", newline="") as f:
+        path = tagged_path(args.csv, impact_type, multi)
+        with open(path, "w", newline="") as f:
             w = csv.writer(f)
             header = (
                 ["nuisance", "pull"]
@@ -563,13 +631,133 @@ def main():
                 + ["mean_I", "spread_I", "std_I", "delta", "pair_contrib"]
             )
             w.writerow(header)
-            for i, l in enumerate(nuis_labels):
-                w.writerow(
-                    [l, theta_hat[i]]
-                    + list(I[:, i])
-                    + [mean_I[i], spread_I[i], std_I[i], delta[i], contrib[i]]
+            cols = np.column_stack(
+                [theta_hat, I.T, mean_I, spread_I, std_I, delta, contrib]
+            )
+            for l, row in zip(nuis_labels, cols):
+                w.writerow([l] + list(row))
+        print(f"\nWrote per-nuisance table to {path}")
+
+
+def main():
+    args = make_parser().parse_args()
+
+    fitresult, meta = io_tools.get_fitresult(args.infile, args.result, meta=True)
+
+    all_pois = io_tools.get_poi_names(meta)
+    pat = re.compile(args.poiRegex)
+    poi_names = np.array([p for p in all_pois if pat.match(p)])
+    if len(poi_names) < 2:
+        sys.exit(f"Need >=2 POIs matching {args.poiRegex}; found {list(poi_names)}")
+    print(f"Selected {len(poi_names)} POIs: {list(poi_names)}")
+
+    # Load every requested impact flavour from the one open fitresult up front.
+    want_all = "all" in args.impactType
+    impact_types = IMPACT_TYPES if want_all else list(dict.fromkeys(args.impactType))
+    tables = {}
+    for impact_type in impact_types:
+        try:
+            tables[impact_type] = load_poi_table(
+                fitresult, poi_names, impact_type, args.grouped
+            )
+        except Exception as e:
+            if not want_all:
+                raise
+            print(f"NOTE: no {impact_type} impacts in {args.infile} ({e}); skipping.")
+            continue
+        print(
+            f"Loaded {len(tables[impact_type][0])} "
+            f"{'grouped' if args.grouped else 'individual'} "
+            f"{impact_type} impact entries per POI."
+        )
+    if not tables:
+        sys.exit(
+            f"No impacts found in {args.infile}; was the fit run with --doImpacts?"
+        )
+
+    pull_labels, pulls, _ = io_tools.get_pulls_and_constraints(fitresult)
+
+    centrals, sigmas = get_poi_central_and_sigma(fitresult, poi_names)
+    centrals_pre, _ = get_poi_central_and_sigma(fitresult, poi_names, prefit=True)
+    raw_shift = centrals - centrals_pre
+    # If --blindingGroup was used, all selected POIs share an identical additive
+    # blinding offset that survives in 'parms' but not in 'parms_prefit'. Estimate
+    # and remove it so the per-POI shifts are interpretable. The robust estimator
+    # is the median across POIs (the per-bin shifts due to the fit itself average
+    # ~ 0 for noi-style alphaS POIs); spread metrics are invariant under this.
+    blinding_offset = float(np.median(raw_shift))
+    shift = raw_shift - blinding_offset
+    spread_obs = centrals.max() - centrals.min()
+    j_max = int(np.argmax(centrals))
+    j_min = int(np.argmin(centrals))
+
+    print("\n=== Per-POI postfit (BLINDED if --blindingGroup was used) ===")
+    print(
+        f"Estimated common blinding offset (median postfit-prefit) = "
+        f"{fmt(blinding_offset)} (subtracted in 'shift' below)."
+    )
+    print(
+        f"{'POI':<35} {'central':>12} {'sigma':>12} "
+        f"{'shift/sigma':>12} {'shift':>12}"
+    )
+    for p, c, s, sh in zip(poi_names, centrals, sigmas, shift):
+        z = sh / s if s > 0 else float("nan")
+        print(f"{p:<35} {fmt(c):>12} {fmt(s):>12} {fmt(z):>12} {fmt(sh):>12}")
+    print(
+        f"Observed spread (max-min): {fmt(spread_obs)}  "
+        f"between {poi_names[j_max]} and {poi_names[j_min]}"
+    )
+    if np.median(sigmas) > 0:
+        print(f"  ~ {spread_obs / np.median(sigmas):+.2f} x median(sigma_POI)")
+
+    # Likelihood-ratio compatibility test (Wilks). This is the correct overall
+    # test for "is one common alphaS sufficient?".
+    if args.inclusive is not None:
+        from scipy.stats import chi2 as _chi2
+
+        nll_decorr = float(fitresult["nllvalreduced"][...])
+        f_incl = io_tools.get_fitresult(args.inclusive, args.result)
+        nll_incl = float(f_incl["nllvalreduced"][...])
+        ndf = len(poi_names) - 1
+        chi2_lr = 2.0 * (nll_incl - nll_decorr)
+        p_lr = 1.0 - _chi2.cdf(chi2_lr, ndf)
+        print("\n=== Likelihood-ratio compatibility test (Wilks) ===")
+        print(f"  NLL_inclusive  = {nll_incl:.4f}")
+        print(f"  NLL_decorr     = {nll_decorr:.4f}")
+        print(f"  chi2 = 2*(NLL_inc - NLL_dec) = {chi2_lr:.3f}")
+        print(f"  ndf  = N_POI - 1             = {ndf}")
+        print(f"  p-value                       = {p_lr:.3g}")
+        if "nllvalfull" in fitresult.keys():
+            try:
+                nll_decorr_f = float(fitresult["nllvalfull"][...])
+                nll_incl_f = float(f_incl["nllvalfull"][...])
+                chi2_lr_f = 2.0 * (nll_incl_f - nll_decorr_f)
+                p_lr_f = 1.0 - _chi2.cdf(chi2_lr_f, ndf)
+                print(
+                    f"  (full likelihood) chi2 = {chi2_lr_f:.3f}, " f"p = {p_lr_f:.3g}"
                 )
-        print(f"\nWrote per-nuisance table to {args.csv}")
+            except Exception:
+                pass
+
+    multi = len(tables) > 1
+    for impact_type, (nuis_labels, I) in tables.items():
+        theta_hat, missing = align_pulls(nuis_labels, pull_labels, pulls)
+        if missing:
+            print(
+                f"\nNOTE: {len(missing)} {impact_type} impact labels have no "
+                f"matching post-fit pull (treated as 0). Examples: {missing[:5]}"
+            )
+        report_impacts(
+            args,
+            impact_type,
+            poi_names,
+            nuis_labels,
+            I,
+            theta_hat,
+            centrals,
+            shift,
+            multi,
+        )
 
 
 if __name__ == "__main__":
@@ -34,7 +34,6 @@ import sys
 import textwrap
 from pathlib import Path
 
-import h5py
 import yaml
 
 REPO = Path("/home/submit/lavezzo/alphaS/WRemnantsHelpers")
@@ -52,12 +51,10 @@ def read_baseline_command(baseline_h5):
     """Pull the original fit command and args from meta_info."""
     sys.path.insert(0, str(WUMS))
     sys.path.insert(0, str(RABBIT))
-    from wums import ioutils  # noqa: E402
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "scripts"))
+    import fitresult_io  # noqa: E402
 
-    with h5py.File(baseline_h5, "r") as f:
-        meta = ioutils.pickle_load_h5py(f["meta"])
-    mi = meta["meta_info"]
-    return mi["command"], mi["args"]
+    return fitresult_io.read_meta_args(baseline_h5)
 
 
 def strip_one_value_flag(tokens, flag):
@@ -18,7 +18,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import mplhep as hep
 import h5py
-from wums import ioutils
+from scripts.narf_io import load_results_h5py
 
 hep.style.use("CMS")
 
@@ -77,7 +77,7 @@ def main():
     os.makedirs(args.output, exist_ok=True)
 
     f = h5py.File(args.infile, "r")
-    res = {k: ioutils.pickle_load_h5py(v) for k, v in f.items()}
+    res = load_results_h5py(f)
     h = res[args.proc]["output"][args.hist].get()
     print(f"Loaded {args.hist}: axes = {[a.name for a in h.axes]}")
 
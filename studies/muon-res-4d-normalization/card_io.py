@@ -0,0 +1,439 @@
+"""Chunk-aligned, parallel access to the flat tensors of a rabbit datacard.
+
+The big datasets of a card (hlogk, and hnorm/hsumw/hsumw2) are written flat
+and chunked, with gzip or blosc compression. Reading them in row blocks of
+arbitrary size decompresses the chunks straddling each block boundary twice,
+and h5py decompresses under its global lock, i.e. on one core.
+
+iter_chunks() instead reads the raw (still compressed) chunks in file order
+with read_direct_chunk and decodes them in a thread pool (zlib and blosc
+release the GIL), falling back to plain chunk-aligned h5py reads for filter
+pipelines it does not know. iter_rows() reassembles the decoded chunks into
+blocks of whole rows, and scan_logk() builds on it to collect, in one pass
+over hlogk, the large-variation statistics of every (bin, process) at once.
+
+patch_card() is the write side: it rebuilds a card with element-range edits
+to its flat datasets, grouping the edits by chunk so that every touched chunk
+is decoded, patched and recompressed exactly once, while every other chunk of
+the file is carried over raw (read_direct_chunk -> write_direct_chunk), i.e.
+without a decompress/recompress cycle. logk_edits() builds the usual edits
+(zeroing or masking logk rows of a process).
+
+Used by flagged_bin_yields.py and zero_lowstat_systs.py.
+"""
+
+import os
+import re
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import hdf5plugin  # noqa: F401  (registers the blosc filter used by the cards)
+import h5py
+import numpy as np
+
+FILTER_BLOSC = 32001
+
+
+def read_layout(f):
+    """Process/syst names and tensor dimensions of an open card."""
+    procs = [x.decode() if isinstance(x, bytes) else x for x in f["hprocs"][:]]
+    systs = [x.decode() if isinstance(x, bytes) else x for x in f["hsysts"][:]]
+    if "hlogk" not in f:
+        raise SystemExit("card has no dense hlogk (sparse cards are not supported)")
+    shape = [int(n) for n in f["hlogk"].attrs["original_shape"]]
+    return dict(
+        procs=procs,
+        systs=systs,
+        nproc=len(procs),
+        nsyst=len(systs),
+        nb=int(f["hnorm"].attrs["original_shape"][0]),
+        logk_shape=shape,
+        symmetric=len(shape) == 3,
+        # elements per (bin, process) row of hlogk: nsyst, or 2*nsyst if asymmetric
+        row_len=int(np.prod(shape[2:])),
+    )
+
+
+def syst_family(name):
+    """Collapse a systematic name to its family (strip trailing var index)."""
+    if name.startswith("Resolution_correction_smearing"):
+        return "Resolution_smearing"
+    if name.startswith("Scale_correction"):
+        return "Scale_correction"
+    n = re.sub(r"\d+$", "", name)
+    n = re.sub(r"(SymAvg|SymDiff)$", "", n)
+    return n.rstrip("_") or name
+
+
+def _blosc_decompress():
+    try:
+        import blosc2
+
+        return blosc2.decompress
+    except ImportError:
+        pass
+    try:
+        import blosc
+
+        return blosc.decompress
+    except ImportError:
+        return None
+
+
+def chunk_decoder(ds):
+    """Return decode(raw bytes, filter_mask) -> bytes for the filter pipeline
+    of a 1D chunked dataset, or None if it contains an unsupported filter."""
+    plist = ds.id.get_create_plist()
+    filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+    itemsize = ds.dtype.itemsize
+    steps = []
+    for code in filters:
+        if code == h5py.h5z.FILTER_DEFLATE:
+            steps.append(zlib.decompress)
+        elif code == h5py.h5z.FILTER_SHUFFLE:
+
+            def unshuffle(b):
+                n = len(b) // itemsize
+                a = np.frombuffer(b, dtype=np.uint8, count=n * itemsize)
+                return a.reshape(itemsize, n).T.tobytes() + b[n * itemsize :]
+
+            steps.append(unshuffle)
+        elif code == FILTER_BLOSC:
+            decompress = _blosc_decompress()
+            if decompress is None:
+                return None
+            steps.append(decompress)
+        else:
+            return None
+
+    def decode(raw, filter_mask=0):
+        b = bytes(raw)
+        # filters are applied in pipeline order on write, undone in reverse
+        for i in reversed(range(len(steps))):
+            if not filter_mask & (1 << i):
+                b = steps[i](b)
+        return b
+
+    return decode
+
+
+def chunk_elements(ds):
+    if ds.chunks is None or len(ds.shape) != 1:
+        return None
+    return ds.chunks[0]
+
+
+def iter_chunks(ds, jobs=None):
+    """Yield (start, array) for consecutive chunk-aligned pieces of a flat
+    dataset, in order. Chunks are decoded in `jobs` threads when the filter
+    pipeline is known, otherwise read one chunk-aligned piece at a time."""
+    n = ds.shape[0]
+    chunk = chunk_elements(ds)
+    if chunk is None:
+        step = max(1, (64 << 20) // ds.dtype.itemsize)
+        for e0 in range(0, n, step):
+            yield e0, ds[e0 : min(e0 + step, n)]
+        return
+
+    decode = chunk_decoder(ds)
+    if decode is None:
+        # unknown filters: let h5py decode, but never split a chunk
+        per_read = max(1, (64 << 20) // (chunk * ds.dtype.itemsize))
+        for e0 in range(0, n, chunk * per_read):
+            yield e0, ds[e0 : min(e0 + chunk * per_read, n)]
+        return
+
+    jobs = jobs or min(8, os.cpu_count() or 1)
+    dtype = ds.dtype
+    dsid = ds.id
+
+    def work(e0, raw, mask):
+        if raw is None:  # unallocated chunk reads as the fill value
+            return e0, np.zeros(min(chunk, n - e0), dtype=dtype)
+        arr = np.frombuffer(decode(raw, mask), dtype=dtype)
+        return e0, arr[: min(chunk, n - e0)]
+
+    def read_raw(e0):
+        try:
+            mask, raw = dsid.read_direct_chunk((e0,))
+        except (KeyError, OSError):
+            return None, 0
+        return raw, mask
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        inflight = deque()
+        for e0 in range(0, n, chunk):
+            raw, mask = read_raw(e0)
+            inflight.append(executor.submit(work, e0, raw, mask))
+            if len(inflight) >= 2 * jobs:
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+
+def iter_rows(ds, row_len, jobs=None, block_bytes=256 << 20):
+    """Yield (first row, block of shape (nrows, row_len)) covering a flat
+    dataset of whole rows, assembled from chunk-aligned pieces."""
+    target = max(row_len, block_bytes // ds.dtype.itemsize)
+    pending = []
+    npending = 0
+    row0 = 0
+    for _, arr in iter_chunks(ds, jobs=jobs):
+        pending.append(arr)
+        npending += arr.size
+        if npending >= target:
+            buf = np.concatenate(pending)
+            nfull = (buf.size // row_len) * row_len
+            if nfull:
+                yield row0, buf[:nfull].reshape(-1, row_len)
+                row0 += nfull // row_len
+            pending = [buf[nfull:]]
+            npending = pending[0].size
+    if npending:
+        buf = np.concatenate(pending)
+        if buf.size % row_len:
+            raise ValueError(
+                f"dataset size is not a multiple of the row length {row_len}"
+            )
+        yield row0, buf.reshape(-1, row_len)
+
+
+def read_flat(ds, jobs=None):
+    """Whole flat dataset, decoded in parallel."""
+    out = np.empty(ds.shape[0], dtype=ds.dtype)
+    for e0, arr in iter_chunks(ds, jobs=jobs):
+        out[e0 : e0 + arr.size] = arr
+    return out
+
+
+def neff_table(f, layout, jobs=None):
+    """(sumw, sumw2, n_eff), each of shape (nb, nproc); n_eff = sumw^2/sumw2
+    where both are positive, inf elsewhere."""
+    shape = (layout["nb"], layout["nproc"])
+    sumw = read_flat(f["hsumw"], jobs=jobs).reshape(shape)
+    sumw2 = read_flat(f["hsumw2"], jobs=jobs).reshape(shape)
+    ok = (sumw > 0) & (sumw2 > 0)
+    neff = np.full(shape, np.inf)
+    neff[ok] = sumw[ok] ** 2 / sumw2[ok]
+    return sumw, sumw2, neff
+
+
+def scan_logk(f, layout, log_thr, jobs=None):
+    """One pass over hlogk collecting, for every process at once:
+
+      maxlogk[b, p], argsyst[b, p]   largest |logk| of each (bin, process) row
+                                      and the syst giving it
+      trips_per_bin[b, p]            systs with |logk| > log_thr in that row
+      maxlogk_syst[p, s], argbin_syst[p, s], trips_per_syst[p, s]
+                                      the same per (process, syst) over bins
+
+    For asymmetric cards the up and down variations of a syst are merged
+    (max / either trips).
+    """
+    nb, nproc, ns = layout["nb"], layout["nproc"], layout["nsyst"]
+    nrow = nb * nproc
+    maxlogk = np.zeros(nrow)
+    argsyst = np.zeros(nrow, dtype=np.int64)
+    trips_per_bin = np.zeros(nrow, dtype=np.int64)
+    maxlogk_syst = np.zeros((nproc, ns))
+    argbin_syst = np.zeros((nproc, ns), dtype=np.int64)
+    trips_per_syst = np.zeros((nproc, ns), dtype=np.int64)
+
+    for r0, block in iter_rows(f["hlogk"], layout["row_len"], jobs=jobs):
+        a = np.abs(block).reshape(block.shape[0], -1, ns).max(axis=1)
+        r1 = r0 + a.shape[0]
+        maxlogk[r0:r1] = a.max(axis=1)
+        argsyst[r0:r1] = a.argmax(axis=1)
+        trip = a > log_thr
+        trips_per_bin[r0:r1] = trip.sum(axis=1)
+        for ip in range(nproc):
+            k0 = (ip - r0) % nproc  # first row of process ip in this block
+            if k0 >= a.shape[0]:
+                continue
+            pa = a[k0::nproc]
+            smax = pa.max(axis=0)
+            sarg = (r0 + k0) // nproc + pa.argmax(axis=0)
+            upd = smax > maxlogk_syst[ip]
+            maxlogk_syst[ip, upd] = smax[upd]
+            argbin_syst[ip, upd] = sarg[upd]
+            trips_per_syst[ip] += trip[k0::nproc].sum(axis=0)
+
+    return dict(
+        maxlogk=maxlogk.reshape(nb, nproc),
+        argsyst=argsyst.reshape(nb, nproc),
+        trips_per_bin=trips_per_bin.reshape(nb, nproc),
+        maxlogk_syst=maxlogk_syst,
+        argbin_syst=argbin_syst,
+        trips_per_syst=trips_per_syst,
+    )
+
+
+def trips_per_family(systs, trips_per_syst):
+    """{family: (number of tripping systs, trip pairs)} for one process."""
+    out = {}
+    for i, n in enumerate(trips_per_syst):
+        if n == 0:
+            continue
+        fam = syst_family(systs[i])
+        nsyst, ntrips = out.get(fam, (0, 0))
+        out[fam] = (nsyst + 1, ntrips + int(n))
+    return out
+
+
+def read_row(ds, layout, b, ip):
+    """|logk| of one (bin, process) row, folded to one value per syst."""
+    rl = layout["row_len"]
+    start = (int(b) * layout["nproc"] + ip) * rl
+    row = np.abs(ds[start : start + rl])
+    return row.reshape(-1, layout["nsyst"]).max(axis=0)
+
+
+def logk_edits(layout, bins, ip, systs=None, value=0.0):
+    """[(start, stop, value)] element ranges of hlogk setting the rows of
+    process ip in `bins` to `value`: all systs, or only the syst indices in
+    `systs` (both up and down for asymmetric cards)."""
+    rl, ns = layout["row_len"], layout["nsyst"]
+    edits = []
+    for b in bins:
+        start = (int(b) * layout["nproc"] + ip) * rl
+        if systs is None:
+            edits.append((start, start + rl, value))
+        else:
+            for off in range(0, rl, ns):
+                edits.extend(
+                    (start + off + int(s), start + off + int(s) + 1, value)
+                    for s in systs
+                )
+    return edits
+
+
+def _edits_by_chunk(edits, chunk, n):
+    """{chunk index: [(start, stop, value)]} with ranges split at chunk
+    boundaries; edits are kept in the order given."""
+    out = {}
+    for start, stop, value in edits:
+        if not 0 <= start <= stop <= n:
+            raise ValueError(f"edit [{start}, {stop}) outside dataset of size {n}")
+        full = np.ndim(value) != 0
+        for c in range(start // chunk, (stop - 1) // chunk + 1 if stop > start else 0):
+            a, b = max(start, c * chunk), min(stop, (c + 1) * chunk)
+            v = value[a - start : b - start] if full else value
+            out.setdefault(c, []).append((a, b, v))
+    return out
+
+
+def _copy_attrs(src, dst):
+    for key in src.attrs:
+        dst.attrs.create(key, src.attrs[key], dtype=src.attrs.get_id(key).dtype)
+
+
+def _copy_chunked(src, parent, name, edits=None, jobs=None):
+    """Recreate chunked dataset `src` in group `parent` with the same creation
+    properties (filters included). Chunks without edits are copied raw; each
+    chunk with edits is decoded once, patched and written back whole.
+    -> (patched chunks, raw-copied chunks)."""
+    dsid = h5py.h5d.create(
+        parent.id,
+        name.encode(),
+        src.id.get_type(),
+        src.id.get_space(),
+        dcpl=src.id.get_create_plist(),
+    )
+    dst = h5py.Dataset(dsid)
+    _copy_attrs(src, dst)
+
+    touched = {}
+    if edits:
+        if len(src.shape) != 1:
+            raise ValueError(f"{src.name}: edits are only supported on flat datasets")
+        touched = _edits_by_chunk(edits, src.chunks[0], src.shape[0])
+
+    ncopied = 0
+    for i in range(src.id.get_num_chunks()):
+        info = src.id.get_chunk_info(i)
+        if touched and info.chunk_offset[0] // src.chunks[0] in touched:
+            continue
+        mask, raw = src.id.read_direct_chunk(info.chunk_offset)
+        dst.id.write_direct_chunk(info.chunk_offset, raw, filter_mask=mask)
+        ncopied += 1
+    if not touched:
+        return 0, ncopied
+
+    n, chunk = src.shape[0], src.chunks[0]
+    decode = chunk_decoder(src)
+
+    def patched(c):
+        e0, e1 = c * chunk, min((c + 1) * chunk, n)
+        try:
+            mask, raw = src.id.read_direct_chunk((e0,))
+        except (KeyError, OSError):
+            raw = None
+        if raw is None:  # unallocated chunk reads as the fill value
+            arr = np.zeros(e1 - e0, dtype=src.dtype)
+        elif decode is not None:
+            arr = np.frombuffer(decode(raw, mask), dtype=src.dtype)[: e1 - e0].copy()
+        else:
+            arr = src[e0:e1]
+        for a, b, v in touched[c]:
+            arr[a - e0 : b - e0] = v
+        return e0, arr
+
+    jobs = jobs or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for e0, arr in executor.map(patched, sorted(touched)):
+            # a whole-chunk write: HDF5 compresses it once, nothing is read back
+            dst[e0 : e0 + arr.size] = arr
+    return len(touched), ncopied
+
+
+def patch_card(src_path, dst_path, edits, jobs=None):
+    """Write a copy of the card at src_path to dst_path with `edits` applied.
+
+    edits: {flat dataset name: [(start, stop, value)]}, value a scalar or an
+    array of length stop - start; later edits win where ranges overlap.
+    Groups and attributes are recreated, chunked datasets are rebuilt chunk by
+    chunk (raw copies except for the chunks with edits), anything else is
+    copied with H5Ocopy. The output is written to a temporary file next to
+    dst_path and renamed into place, and src_path is only ever read.
+    -> {dataset name: (patched chunks, raw-copied chunks)} for chunked datasets.
+    """
+    if os.path.abspath(dst_path) == os.path.abspath(src_path):
+        raise ValueError("output must differ from the input card")
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(dst_path)), prefix=".tmp_patch_"
+    )
+    os.close(fd)
+    stats = {}
+    try:
+        with h5py.File(src_path, "r") as fsrc, h5py.File(tmp, "w") as fdst:
+            missing = [k for k in edits if k not in fsrc]
+            if missing:
+                raise KeyError(f"datasets to patch not in card: {missing}")
+            _copy_attrs(fsrc, fdst)
+
+            # collected first: visititems holds h5py's lock during the
+            # callback, which would stall the decoding threads
+            names = []
+            fsrc.visit(names.append)
+            for name in names:
+                obj = fsrc[name]
+                parent = fdst[os.path.dirname(name) or "/"]
+                base = os.path.basename(name)
+                if isinstance(obj, h5py.Group):
+                    _copy_attrs(obj, parent.create_group(base))
+                elif obj.chunks is not None:
+                    stats[name] = _copy_chunked(
+                        obj, parent, base, edits=edits.get(name), jobs=jobs
+                    )
+                elif name in edits:
+                    raise ValueError(f"{name} is not chunked, cannot patch it")
+                else:
+                    fsrc.copy(obj, parent, name=base)
+        os.replace(tmp, dst_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return stats
@@ -14,37 +14,38 @@ The point of the tool: these flagged bins are near-empty cancellation residuals
 log-normal syst ratio there is floating-point noise. See
 studies/muon-res-4d-normalization/LOGBOOK.md.
 
+hlogk is scanned once for all processes (card_io.scan_logk: chunk-aligned
+reads, chunks decompressed in -j threads), so reporting several processes, or
+all of them with --process all, costs the same as reporting one.
+
 Runs on the login node (h5py only, no TensorFlow / no container needed).
 
 Usage:
-    python3 flagged_bin_yields.py CARD.hdf5 [--process Ztautau] [--threshold 2.0]
-                                            [--top 20] [--channel ch0]
+    python3 flagged_bin_yields.py CARD.hdf5 [--process Ztautau ...|all]
+                                            [--threshold 2.0] [--top 20] [-j 8]
 
 Examples:
     python3 flagged_bin_yields.py \\
         /scratch/submit/cms/areimers/alphas/fitinput/AlphaS/Theorymodels/\\
 ZMassDilepton_..._Ptll0to44/ZMassDilepton.hdf5
     python3 flagged_bin_yields.py CARD.hdf5 --process Other --threshold 10 --top 40
+    python3 flagged_bin_yields.py CARD.hdf5 --process all --by-syst
 """
 
 import argparse
 import pickle
-import re
 
 import hdf5plugin  # noqa: F401  (registers the blosc filter used by the cards)
 import h5py
 import numpy as np
 
-
-def syst_family(name):
-    """Collapse a systematic name to its family (strip trailing var index)."""
-    if name.startswith("Resolution_correction_smearing"):
-        return "Resolution_smearing"
-    if name.startswith("Scale_correction"):
-        return "Scale_correction"
-    n = re.sub(r"\d+$", "", name)
-    n = re.sub(r"(SymAvg|SymDiff)$", "", n)
-    return n.rstrip("_") or name
+from card_io import (
+    neff_table,
+    read_layout,
+    read_row,
+    scan_logk,
+    trips_per_family,
+)
 
 
 def build_channel_map(meta):
@@ -89,7 +90,11 @@ def main():
     )
     p.add_argument("card", help="path to ZMassDilepton.hdf5 rabbit datacard")
     p.add_argument(
-        "--process", default="Ztautau", help="process to inspect (default: Ztautau)"
+        "--process",
+        nargs="+",
+        default=["Ztautau"],
+        help="process(es) to inspect, or 'all' (default: Ztautau); "
+        "hlogk is scanned once whatever the number",
     )
     p.add_argument(
         "--threshold",
@@ -112,78 +117,85 @@ def main():
         "SAME bins or different ones? (per-bin syst count, "
         "per-syst bin count, per-family rollup)",
     )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=8,
+        help="threads decompressing hlogk chunks (default 8)",
+    )
     args = p.parse_args()
 
     log_thr = np.log(args.threshold)
 
     with h5py.File(args.card, "r") as f:
-        procs = [x.decode() if isinstance(x, bytes) else x for x in f["hprocs"][:]]
-        if args.process not in procs:
-            raise SystemExit(f"process {args.process!r} not in card procs {procs}")
-        ip = procs.index(args.process)
-        NPROC = len(procs)
-        systs = [x.decode() if isinstance(x, bytes) else x for x in f["hsysts"][:]]
-        NS = len(systs)
-        nb = int(f["hnorm"].attrs["original_shape"][0])
-
-        sumw = f["hsumw"][:].reshape(nb, NPROC)[:, ip]
-        sumw2 = f["hsumw2"][:].reshape(nb, NPROC)[:, ip]
+        layout = read_layout(f)
+        procs = layout["procs"]
+        if args.process == ["all"]:
+            args.process = list(procs)
+        for pr in args.process:
+            if pr not in procs:
+                raise SystemExit(f"process {pr!r} not in card procs {procs}")
+        systs = layout["systs"]
+
+        sumw_all, sumw2_all, neff_all = neff_table(f, layout, jobs=args.jobs)
 
         meta = pickle.loads(f["meta/pickle_data"][:].tobytes())
         chans = build_channel_map(meta)
 
-        # Stream hlogk; for this process compute per-bin max|logk| and which syst.
-        # Also accumulate, per syst and per bin, how many (bin,syst) cells trip
+        # One pass over hlogk for all processes: per (bin, proc) max|logk| and
+        # which syst, and per syst and per bin how many (bin,syst) cells trip
         # the flag (|logk|>log_thr) -> answers "same bins or different?".
-        ds = f["hlogk"]
-        maxlogk = np.zeros(nb)  # per bin: largest |logk| over systs
-        argsyst = np.zeros(nb, dtype=np.int64)
-        maxlogk_syst = np.zeros(NS)  # per syst: largest |logk| over bins
-        argbin_syst = np.zeros(NS, dtype=np.int64)
-        trips_per_syst = np.zeros(NS, dtype=np.int64)
-        trips_per_bin = np.zeros(nb, dtype=np.int64)
-        rows_per_chunk = max(1, 40_000_000 // NS)
-        nrow = nb * NPROC
-        for r0 in range(0, nrow, rows_per_chunk * NPROC):
-            r1 = min(r0 + rows_per_chunk * NPROC, nrow)
-            block = ds[r0 * NS : r1 * NS].reshape((r1 - r0) // NPROC, NPROC, NS)
-            proc_block = np.abs(block[:, ip, :])
-            b0 = r0 // NPROC
-            b1 = r1 // NPROC
-            maxlogk[b0:b1] = proc_block.max(axis=1)
-            argsyst[b0:b1] = proc_block.argmax(axis=1)
-            # per-syst largest variation (and which bin) across this chunk
-            chunk_syst_max = proc_block.max(axis=0)
-            chunk_syst_arg = proc_block.argmax(axis=0) + b0
-            upd = chunk_syst_max > maxlogk_syst
-            maxlogk_syst[upd] = chunk_syst_max[upd]
-            argbin_syst[upd] = chunk_syst_arg[upd]
-            trip = proc_block > log_thr
-            trips_per_syst += trip.sum(axis=0)
-            trips_per_bin[b0:b1] = trip.sum(axis=1)
-
-    ok = (sumw > 0) & (sumw2 > 0)
-    neff = np.full(nb, np.inf)
-    neff[ok] = sumw[ok] ** 2 / sumw2[ok]
+        scan = scan_logk(f, layout, log_thr, jobs=args.jobs)
+
+    for n, pr in enumerate(args.process):
+        if n:
+            print("\n" + "#" * 70 + "\n")
+        ip = procs.index(pr)
+        report_process(
+            args,
+            pr,
+            ip,
+            procs,
+            systs,
+            chans,
+            log_thr,
+            sumw_all[:, ip],
+            sumw2_all[:, ip],
+            neff_all[:, ip],
+            {
+                k: v[:, ip] if k in ("maxlogk", "argsyst", "trips_per_bin") else v[ip]
+                for k, v in scan.items()
+            },
+            layout,
+        )
+
+
+def report_process(
+    args, process, ip, procs, systs, chans, log_thr, sumw, sumw2, neff, scan, layout
+):
+    """Flagged-bin table (and --by-syst cross-tab) of one process."""
+    maxlogk = scan["maxlogk"]
+    argsyst = scan["argsyst"]
 
     flagged = np.where((maxlogk > log_thr) & (sumw > 0))[0]
     flagged = flagged[np.argsort(-maxlogk[flagged])]
 
     tot = sumw[sumw > 0].sum()
     print(f"# card:      {args.card}")
-    print(f"# process:   {args.process}   (index {ip} of {procs})")
+    print(f"# process:   {process}   (index {ip} of {procs})")
     print(
         f"# flag rule: any syst with |logk| > log({args.threshold}) "
         f"= {log_thr:.3f}  (i.e. > {args.threshold:g}x or < {1/args.threshold:g}x)"
     )
     print(
-        f"# {args.process} total yield = {tot:.1f} events "
+        f"# {process} total yield = {tot:.1f} events "
         f"over {(sumw > 0).sum()} populated bins"
     )
     print(
         f"# flagged bins: {len(flagged)}  "
         f"carrying {sumw[flagged].sum():.4g} events "
-        f"({100 * sumw[flagged].sum() / tot:.3f}% of {args.process})"
+        f"({100 * sumw[flagged].sum() / max(tot, 1e-300):.3f}% of {process})"
     )
     if len(flagged):
         print(
@@ -217,18 +229,17 @@ def main():
         report_by_syst(
             args,
             systs,
-            trips_per_syst,
-            trips_per_bin,
+            scan["trips_per_syst"],
+            scan["trips_per_bin"],
             flagged,
             sumw,
             neff,
             chans,
             ip,
-            NPROC,
-            NS,
+            layout,
             log_thr,
-            maxlogk_syst,
-            argbin_syst,
+            scan["maxlogk_syst"],
+            scan["argbin_syst"],
         )
 
 
@@ -242,13 +253,13 @@ def report_by_syst(
     neff,
     chans,
     ip,
-    NPROC,
-    NS,
+    layout,
     log_thr,
     maxlogk_syst,
     argbin_syst,
 ):
     """Same bins, or different bins for different systematics?"""
+    NS = layout["nsyst"]
     NB = 15
     total_trips = int(trips_per_syst.sum())
     n_bins_tripped = int((trips_per_bin > 0).sum())
@@ -292,7 +303,7 @@ def report_by_syst(
     with h5py.File(args.card, "r") as f:
         ds = f["hlogk"]
         for B in topbins:
-            row = np.abs(ds[(B * NPROC + ip) * NS : (B * NPROC + ip) * NS + NS])
+            row = read_row(ds, layout, B, ip)
             trip_idx = np.where(row > log_thr)[0]
             nres = sum(
                 1
@@ -329,13 +340,9 @@ def report_by_syst(
         )
 
     # --- rollup by systematic family ---
-    fam_trips, fam_nsyst = {}, {}
-    for i in range(NS):
-        if trips_per_syst[i] == 0:
-            continue
-        fam = syst_family(systs[i])
-        fam_trips[fam] = fam_trips.get(fam, 0) + int(trips_per_syst[i])
-        fam_nsyst[fam] = fam_nsyst.get(fam, 0) + 1
+    fams = trips_per_family(systs, trips_per_syst)
+    fam_nsyst = {fam: n for fam, (n, _) in fams.items()}
+    fam_trips = {fam: t for fam, (_, t) in fams.items()}
     print("\ntrip pairs by systematic family (which families misbehave):")
     print(f"  {'family':<32} {'#systs':>7} {'trip pairs':>11}")
     for fam in sorted(fam_trips, key=lambda k: -fam_trips[k])[:NB]:
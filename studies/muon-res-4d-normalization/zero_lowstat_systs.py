@@ -15,9 +15,11 @@ variation). NOTHING ELSE is touched:
   - only the target process's logk rows in the flagged bins change;
   - all other processes are untouched by construction (we index the process).
 
-Implementation is copy-then-patch: the original card is copied verbatim (all
-datasets, attrs, groups, compression preserved) and only the targeted hlogk
-rows are overwritten with zeros in the copy. The original is never modified.
+Implementation is copy-then-patch (card_io.patch_card): the card is rebuilt
+with all datasets, attrs, groups and compression preserved. The zeroed rows are
+grouped by hlogk chunk, so each touched chunk is decompressed, patched and
+recompressed once; every other chunk is copied raw. The original is never
+modified.
 
 Runs on the login node (h5py only, no TensorFlow / container).
 
@@ -28,11 +30,11 @@ Usage:
 
 import argparse
 import os
-import shutil
+import time
 
-import hdf5plugin  # noqa: F401  (registers the blosc filter used by the cards)
 import h5py
 import numpy as np
+from card_io import logk_edits, neff_table, patch_card, read_layout
 
 
 def main():
@@ -59,19 +61,22 @@ def main():
         action="store_true",
         help="report what would be zeroed; do not write output",
     )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=8,
+        help="threads for (de)compressing chunks (default 8)",
+    )
     args = p.parse_args()
 
     # ---- read layout + per-(bin,proc) n_eff from the ORIGINAL (read-only) ----
     with h5py.File(args.card, "r") as f:
-        procs = [x.decode() if isinstance(x, bytes) else x for x in f["hprocs"][:]]
-        NPROC = len(procs)
-        NS = int(f["hlogk"].attrs["original_shape"][2])
-        nb = int(f["hnorm"].attrs["original_shape"][0])
-        sumw = f["hsumw"][:].reshape(nb, NPROC)
-        sumw2 = f["hsumw2"][:].reshape(nb, NPROC)
-        symmetric = int(f["hlogk"].attrs["original_shape"].shape[0]) == 3
-
-    if not symmetric:
+        layout = read_layout(f)
+        sumw, sumw2, neff = neff_table(f, layout, jobs=args.jobs)
+    procs, NPROC, NS = layout["procs"], layout["nproc"], layout["nsyst"]
+
+    if not layout["symmetric"]:
         raise SystemExit(
             "hlogk is not the symmetric [nb,nproc,nsyst] layout; "
             "this tool only handles symmetric_tensor cards."
@@ -84,13 +89,8 @@ def main():
     targets = {}  # proc_index -> array of bin indices
     for pr in args.process:
         ip = procs.index(pr)
-        w = sumw[:, ip]
-        w2 = sumw2[:, ip]
-        ok = (w > 0) & (w2 > 0)
-        neff = np.full(nb, np.inf)
-        neff[ok] = w[ok] ** 2 / w2[ok]
-        bins = np.where(ok & (neff < args.neff))[0]
-        targets[ip] = bins
+        ok = (sumw[:, ip] > 0) & (sumw2[:, ip] > 0)
+        targets[ip] = np.where(ok & (neff[:, ip] < args.neff))[0]
 
     print(f"# card:   {args.card}")
     print(
@@ -120,19 +120,18 @@ def main():
     # ---- copy-then-patch ----
     if os.path.abspath(args.output) == os.path.abspath(args.card):
         raise SystemExit("output must differ from input (original is never modified)")
-    print(f"# copying -> {args.output}")
-    shutil.copy2(args.card, args.output)
-
-    with h5py.File(args.output, "r+") as f:
-        ds = f["hlogk"]  # flat 1D, length nb*NPROC*NS
-        zeros = np.zeros(NS, dtype=ds.dtype)
-        nwritten = 0
-        for ip, bins in targets.items():
-            for B in bins:
-                start = (int(B) * NPROC + ip) * NS
-                ds[start : start + NS] = zeros
-                nwritten += 1
-    print(f"# done: zeroed {nwritten} (bin,proc) logk rows in {args.output}")
+    edits = []
+    for ip, bins in targets.items():
+        edits.extend(logk_edits(layout, bins, ip))
+    print(f"# writing -> {args.output}")
+    t0 = time.time()
+    stats = patch_card(args.card, args.output, {"hlogk": edits}, jobs=args.jobs)
+    npatched, ncopied = stats["hlogk"]
+    print(
+        f"# done: zeroed {len(edits)} (bin,proc) logk rows in {args.output} "
+        f"({npatched} hlogk chunks rewritten, {ncopied} copied raw; "
+        f"{time.time() - t0:.1f}s)"
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,11 @@
+import argparse
 import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+
+import job_matrix
 
 pdfs_to_test = [
     "ct18",
@@ -18,7 +25,22 @@ pdfs_for_uncs = [
 extra_pdfs = ["nnpdf30", "atlasWZj20", "herapdf20ext", "msht20an3lo"]
 
 all_pdfs = pdfs_to_test + pdfs_for_uncs + extra_pdfs
-for i, central_pdf in enumerate(pdfs_to_test):
+
+parser = argparse.ArgumentParser(
+    description="Run the histmaker once per central PDF set."
+)
+parser.add_argument(
+    "--central-pdfs",
+    nargs="+",
+    choices=pdfs_to_test,
+    default=pdfs_to_test,
+    help="PDF set names to use as central inputs. (default: %(default)s)",
+)
+job_matrix.add_matrix_args(parser, default_jobs=1)
+args = parser.parse_args()
+
+cells = []
+for central_pdf in args.central_pdfs:
 
     command_extra = ""
     if central_pdf == "msht20":
@@ -29,7 +51,20 @@ for i, central_pdf in enumerate(pdfs_to_test):
     other_pdfs = [pdf for pdf in all_pdfs if pdf != central_pdf]
 
     command = f"{os.environ['MY_WORK_DIR']}/workflows/histmaker.sh -e ' --filterProcs ZmumuPostVFP dataPostVFP -j 450 --pdfs {central_pdf} {' '.join(other_pdfs)} --postfix {central_pdf} {command_extra}' "
-    try:
-        os.system(command)
-    except Exception as e:
-        print(f"Error running command: {command}\n{e}")
+    cells.append(
+        {
+            "id": central_pdf,
+            "cmd": command,
+            "output": job_matrix.histmaker_output(central_pdf),
+        }
+    )
+
+sys.exit(
+    job_matrix.run_from_args(
+        cells,
+        args,
+        os.path.join(
+            os.environ["MY_OUT_DIR"], ".job_matrix", "pdf_bias_test_histmakers"
+        ),
+    )
+)
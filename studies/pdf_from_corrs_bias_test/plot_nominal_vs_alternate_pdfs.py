@@ -4,12 +4,11 @@ import os
 
 import h5py
 import mplhep as hep
-from hist import Hist
 
 from utilities import parsing
 from wremnants import theory_tools
 from wums import boostHistHelpers as hh
-from wums import ioutils
+from scripts.narf_io import load_hist, load_results_h5py
 from wums import output_tools
 from wums import plot_tools
 
@@ -35,12 +34,6 @@ DEFAULT_PSEUDODATA_PDFS = {
 }
 
 
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 def get_pdf_map_name(pdf_key):
     info = theory_tools.pdfMap.get(pdf_key)
     if info:
@@ -251,12 +244,6 @@ def resolve_minnlo_hist_name(pdf_key, output_hists):
     return None
 
 
-def load_hist(entry):
-    if isinstance(entry, Hist):
-        return entry
-    return entry.get()
-
-
 def main():
     args = parse_args()
     os.makedirs(args.outdir, exist_ok=True)
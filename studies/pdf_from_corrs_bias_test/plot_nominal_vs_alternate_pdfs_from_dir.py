@@ -11,7 +11,7 @@ from hist import Hist
 from utilities import parsing
 from wremnants import theory_tools
 from wums import boostHistHelpers as hh
-from wums import ioutils
+from scripts.narf_io import load_results_h5py
 from wums import output_tools
 from wums import plot_tools
 from scripts.common_plot_style import build_cms_color_cycle
@@ -145,12 +145,6 @@ def parse_args():
     return parser.parse_args()
 
 
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 def apply_selection(h, selections):
     if not selections:
         return h
@@ -5,6 +5,7 @@ sys.path.append("../../WRemnants/")
 import os
 import re
 from wums import ioutils
+from scripts.narf_io import load_results_h5py
 import argparse
 import h5py
 import pprint
@@ -23,14 +24,6 @@ import datetime
 hep.style.use("CMS")
 
 
-def load_results_h5py(h5file):
-
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 # infile = f"{os.environ['MY_OUT_DIR']}/251124_gen_alphaSByHelicity/w_z_gen_dists_scetlib_dyturboN3p1LL_pdfasCorr_maxFiles_m1.hdf5"
 
 # with h5py.File(infile, "r") as h5file:
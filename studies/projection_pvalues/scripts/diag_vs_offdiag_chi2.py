@@ -11,6 +11,11 @@ For each C: chi2 = r^T C^-1 r. We also report the eigendecomposition of C and
 the chi2 contribution per eigenmode (sorted), so you can read off where the
 chi2 lives.
 
+Inputs come from projection_cov.ProjectionCov (cached next to the fitresult);
+J J^T + diag(nobs) is solved through Woodbury. For projections too large to
+keep cov_post densely (> DENSE_MAX_BINS bins), C_post is unavailable and the
+breakdown below uses C_systs instead.
+
 Usage:
     python diag_vs_offdiag_chi2.py <fitresults.hdf5> [proj_key]
 """
@@ -20,59 +25,56 @@ import sys
 
 import numpy as np
 
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
-
-from rabbit.io_tools import get_fitresult  # noqa: E402
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-NOI_NAMES = {"pdfAlphaS"}
+from projection_cov import ProjectionCov, eigenmodes  # noqa: E402
 
 
 def main():
     fitres = sys.argv[1]
     proj = sys.argv[2] if len(sys.argv) > 2 else "Project ch0 ptll"
-    fr, _ = get_fitresult(fitres, meta=True)
-    m = fr["mappings"][proj]
-    ch0 = m["channels"]["ch0"]
-    data = ch0["hist_data_obs"].get().values()
-    pred_post = ch0["hist_postfit_inclusive"].get().values()
-    nobs = ch0["hist_nobs"].get().values()
-    cov_post = m["hist_postfit_inclusive_cov"].get().values()
-    Jhist = ch0["hist_prefit_inclusive_global_impacts"].get()
-    impact_names = list(Jhist.axes[1])
-    J_all = Jhist.values()
-    keep = np.array([n not in NOI_NAMES for n in impact_names])
-    J = J_all[:, keep]
-
-    r = pred_post - data
-    chi2_true = float(m["chi2"])
-    ndf_true = int(m["ndf"])
-
-    # Three candidate covariance constructions.
-    cand = {
-        "cov_post + diag(nobs)         (per-bin-pull denominator)": cov_post
-        + np.diag(nobs),
-        "J J^T   + diag(nobs)          (res_cov approximation)  ": J @ J.T
-        + np.diag(nobs),
-        "diag(cov_post + nobs) ONLY    (no off-diagonal at all) ": np.diag(
-            np.diag(cov_post) + nobs
-        ),
-    }
+    pc = ProjectionCov.load(fitres, proj)
+    nobs = pc.nobs
+    cov_post = pc.cov_post
+    diag_post = pc.cov_post_diag
+
+    r = pc.res
+    chi2_true = pc.chi2_true
+    ndf_true = pc.ndf_true
+
+    # Three candidate covariance constructions, as chi2 functions.
+    cand = {}
+    if cov_post is not None:
+        cand["cov_post + diag(nobs)         (per-bin-pull denominator)"] = (
+            lambda x: float(x @ np.linalg.solve(cov_post + np.diag(nobs), x))
+        )
+    cand["J J^T   + diag(nobs)          (res_cov approximation)  "] = pc.cov().chi2
+    cand["diag(cov_post + nobs) ONLY    (no off-diagonal at all) "] = lambda x: float(
+        np.sum(x**2 / (diag_post + nobs))
+    )
 
     print(f"=== {proj} ===")
     print(f"true chi2 (rabbit)              = {chi2_true:.2f}  /  ndf {ndf_true}")
     print()
     print(f"{'reconstruction':62s} {'chi2':>8s} {'chi2/true':>10s}")
-    for label, C in cand.items():
-        c = float(r @ np.linalg.solve(C, r))
+    for label, chi2 in cand.items():
+        c = chi2(r)
         print(f"  {label:60s} {c:8.2f}    {c/chi2_true*100:6.1f}%")
 
     # Same comparison but for ALL projections (printed compactly).
     print()
-    print("Diagonal-vs-full breakdown for the chosen reconstruction (cov_post + nobs):")
-    C_full = cov_post + np.diag(nobs)
-    chi2_full = float(r @ np.linalg.solve(C_full, r))
-    chi2_diag = float(np.sum(r**2 / (np.diag(cov_post) + nobs)))
+    if cov_post is not None:
+        label = "cov_post + nobs"
+        C_full = cov_post + np.diag(nobs)
+        chi2_full = float(r @ np.linalg.solve(C_full, r))
+        diag_full = diag_post + nobs
+    else:
+        label = "J J^T + nobs; cov_post not kept for this many bins"
+        C_full = pc.cov()
+        chi2_full = C_full.chi2(r)
+        diag_full = C_full.diagonal()
+    print(f"Diagonal-vs-full breakdown for the chosen reconstruction ({label}):")
+    chi2_diag = float(np.sum(r**2 / diag_full))
     chi2_offdiag = chi2_full - chi2_diag
     print(
         f"  diag-only chi2  (sum of per-bin pull^2 in the displayed plot) = {chi2_diag:.2f}"
@@ -89,11 +91,9 @@ def main():
     print()
 
     # Eigendecomposition of C_full and chi2 per eigenmode.
-    eigvals, U = np.linalg.eigh(C_full)
-    r_proj = U.T @ r  # coords of r in eigenbasis
-    chi2_per_mode = (r_proj**2) / eigvals
+    eigvals, U, r_proj, chi2_per_mode, _ = eigenmodes(C_full, r)
     order = np.argsort(-chi2_per_mode)
-    print("Eigenmode chi2 contribution (top 10 modes of C_full = cov_post+nobs):")
+    print(f"Eigenmode chi2 contribution (top 10 modes of C_full = {label}):")
     print(
         f"{'rank':>4} {'eigvalue':>12} {'r·e_k':>10} {'chi2_k':>8} {'cum chi2':>10}  "
         f"{'top |bins|':<25}"
@@ -123,7 +123,7 @@ def main():
     # Also show: bin pulls (diagonal) for context.
     print()
     print("Per-bin diagonal pull r_i / sqrt(C_post_ii + nobs_i):")
-    sigma_diag = np.sqrt(np.diag(cov_post) + nobs)
+    sigma_diag = np.sqrt(diag_post + nobs)
     pulls = r / sigma_diag
     bin_idx_sorted = np.argsort(-np.abs(pulls))
     print(f"{'rank':>4} {'bin':>4} {'r_i':>10} {'sigma_i':>10} {'pull_i':>8}")
@@ -21,6 +21,11 @@ Approach (avoids re-running rabbit_fit):
   estimate diag of cov_post if needed; in practice the systs+stat already
   reproduce the chi2 well enough for an eigendecomposition.
 
+The reconstruction itself lives in projection_cov.py (ProjectionCov), which
+keeps J low-rank, solves through Woodbury and caches its inputs next to the
+fitresult. Projections larger than DENSE_MAX_BINS bins are decomposed into
+modes relative to the diagonal instead of a dense eigh.
+
 Usage:
     python dump_rescov.py <fitresults.hdf5> <out_dir> [proj_key]
 """
@@ -31,70 +36,14 @@ import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
-
-from rabbit.io_tools import get_fitresult  # noqa: E402
-
-NOI_NAMES = {"pdfAlphaS"}
-
-
-def reconstruct_rescov(fr, proj_key):
-    m = fr["mappings"][proj_key]
-    ch0 = m["channels"]["ch0"]
-    data = ch0["hist_data_obs"].get().values()
-    nobs = ch0["hist_nobs"].get().values()
-    pred_post = ch0["hist_postfit_inclusive"].get().values()
-    cov_post = m["hist_postfit_inclusive_cov"].get().values()
-    J = ch0["hist_prefit_inclusive_global_impacts"].get()
-    impacts_axis = J.axes[1]
-    impact_names = list(impacts_axis)
-    Jvals = J.values()  # (nbins, nimpacts)
-
-    # Drop NOIs (var_theta0=0).
-    keep = np.array([n not in NOI_NAMES for n in impact_names])
-    J_keep = Jvals[:, keep]
-
-    res = pred_post - data
-
-    # Build res_cov = J J^T + diag(nobs); BBB approximated by max(0, cov_post - J J^T).
-    JJt = J_keep @ J_keep.T
-    res_cov_systs_stat = JJt + np.diag(nobs)
-
-    # BBB approximation: residual variance in cov_post not explained by
-    # systematics (cov_post is dexpdx @ cov @ dexpdx^T + BBB ).
-    # Here we add an isotropic floor only on the diagonal so we don't
-    # invert a positive correction.
-    delta_diag = np.maximum(np.diag(cov_post) - np.diag(JJt), 0.0)
-    res_cov = res_cov_systs_stat + np.diag(delta_diag)
-
-    return {
-        "res": res,
-        "res_cov_systs_stat": res_cov_systs_stat,
-        "res_cov_with_bbb_diag": res_cov,
-        "cov_post": cov_post,
-        "JJt": JJt,
-        "data": data,
-        "nobs": nobs,
-        "pred_post": pred_post,
-        "impact_names": [n for n, k in zip(impact_names, keep) if k],
-        "J_keep": J_keep,
-        "chi2_true": float(m["chi2"]),
-        "ndf_true": int(m["ndf"]),
-    }
-
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def whitened_eigendecomp(res, res_cov):
-    # Use eigendecomposition of res_cov; whitened residual is diag(1/sqrt(eig)) @ U^T @ r
-    # where res_cov = U diag(eig) U^T.
-    eigvals, U = np.linalg.eigh(res_cov)
-    # Numerical floor.
-    pos = eigvals > 0
-    r_whit = np.zeros(len(eigvals))
-    r_proj = U.T @ res  # (n,)
-    r_whit[pos] = r_proj[pos] / np.sqrt(eigvals[pos])
-    chi2_per_mode = r_whit**2
-    return eigvals, U, r_proj, r_whit, chi2_per_mode
+from projection_cov import (  # noqa: E402
+    DENSE_MAX_BINS,
+    LowRankCov,
+    ProjectionCov,
+    eigenmodes,
+)
 
 
 def main():
@@ -102,35 +51,42 @@ def main():
     out_dir = sys.argv[2]
     proj = sys.argv[3] if len(sys.argv) > 3 else "Project ch0 ptll"
     os.makedirs(out_dir, exist_ok=True)
-    fr, _ = get_fitresult(fitres, meta=True)
-    info = reconstruct_rescov(fr, proj)
-    res = info["res"]
-    chi2_true = info["chi2_true"]
-
-    chi2_a = float(res @ np.linalg.solve(info["res_cov_systs_stat"], res))
-    chi2_b = float(res @ np.linalg.solve(info["res_cov_with_bbb_diag"], res))
-    chi2_post_only = float(
-        res @ np.linalg.solve(info["cov_post"] + np.diag(info["nobs"]), res)
-    )
+    pc = ProjectionCov.load(fitres, proj)
+    res = pc.res
+    chi2_true = pc.chi2_true
+
+    # systs+stat (J J^T + nobs) and with the BBB diagonal floor, both solved
+    # through Woodbury; cov_post + nobs only exists densely for small projections
+    cov_a = pc.cov()
+    cov_b = pc.cov(bbb=True)
+    chi2_a = cov_a.chi2(res)
+    chi2_b = cov_b.chi2(res)
     print(f"--- {proj} ---")
     print(f"chi2_true                   = {chi2_true:.2f}")
     print(f"chi2 systs+stat (JJt+nobs)  = {chi2_a:.2f}")
     print(f"chi2 systs+stat+bbb_diag    = {chi2_b:.2f}")
-    print(f"chi2 cov_post + nobs        = {chi2_post_only:.2f}")
-
-    # Pick the cov whose chi2 is closest to true for the eigendecomposition.
     candidates = {
-        "systs+stat": (chi2_a, info["res_cov_systs_stat"]),
-        "systs+stat+bbb_diag": (chi2_b, info["res_cov_with_bbb_diag"]),
-        "cov_post+nobs": (chi2_post_only, info["cov_post"] + np.diag(info["nobs"])),
+        "systs+stat": (chi2_a, cov_a),
+        "systs+stat+bbb_diag": (chi2_b, cov_b),
     }
+    if pc.cov_post is not None:
+        C_post = pc.cov_post + np.diag(pc.nobs)
+        chi2_post_only = float(res @ np.linalg.solve(C_post, res))
+        print(f"chi2 cov_post + nobs        = {chi2_post_only:.2f}")
+        candidates["cov_post+nobs"] = (chi2_post_only, C_post)
+
+    # Pick the cov whose chi2 is closest to true for the eigendecomposition.
     best_label = min(candidates.keys(), key=lambda k: abs(candidates[k][0] - chi2_true))
     print(
         f"Using best-matching reconstruction: {best_label} ({candidates[best_label][0]:.2f})"
     )
     cov_used = candidates[best_label][1]
 
-    eigvals, U, r_proj, r_whit, chi2_per_mode = whitened_eigendecomp(res, cov_used)
+    eigvals, U, r_proj, chi2_per_mode, kind = eigenmodes(cov_used, res)
+    # whitened residual per mode, r_whit^2 = chi2 contribution
+    r_whit = np.zeros(len(eigvals))
+    pos = eigvals > 0
+    r_whit[pos] = r_proj[pos] / np.sqrt(eigvals[pos])
 
     order = np.argsort(-chi2_per_mode)
     print("Top modes by chi2 contribution:")
@@ -185,10 +141,15 @@ def main():
     print(f"Saved plot: {out}")
 
     # Also save numerical dump.
+    dump = {}
+    if len(res) <= DENSE_MAX_BINS:
+        dump["res_cov"] = (
+            cov_used.dense() if isinstance(cov_used, LowRankCov) else cov_used
+        )
     np.savez(
         os.path.join(out_dir, f"rescov_{safe}.npz"),
         res=res,
-        res_cov=cov_used,
+        **dump,
         eigvals=eigvals,
         eigvecs=U,
         r_proj=r_proj,
@@ -196,6 +157,7 @@ def main():
         chi2_per_mode=chi2_per_mode,
         chi2_true=chi2_true,
         method=best_label,
+        mode_kind=kind,
     )
 
 
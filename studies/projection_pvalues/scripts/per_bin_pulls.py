@@ -18,11 +18,9 @@ import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
-# Make rabbit + wums importable from outside the container.
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from rabbit.io_tools import get_fitresult  # noqa: E402
+from projection_cov import load_projections  # noqa: E402
 
 PROJ_KEYS = [
     "Project ch0 ptll",
@@ -32,31 +30,19 @@ PROJ_KEYS = [
 ]
 
 
-def _hist_axis_centers(h):
-    ax = h.axes[0]
-    edges = ax.edges
+def _axis_centers(edges):
     return 0.5 * (edges[:-1] + edges[1:]), edges
 
 
-def make_pull_plot(fr, proj, out_dir):
-    m = fr["mappings"][proj]
-    chans = m["channels"]
-    ch0 = chans["ch0"]
-    data = ch0["hist_data_obs"].get().values()
-    pred_post = ch0["hist_postfit_inclusive"].get().values()
-    pred_pre = ch0["hist_prefit_inclusive"].get().values()
-    nobs = ch0["hist_nobs"].get().values()
-    if "hist_postfit_inclusive_cov" in m:
-        cov_post = m["hist_postfit_inclusive_cov"].get().values()  # (N, N)
-        diag_post = np.diag(cov_post)
-    else:
-        # Cov was not computed (no --computeHistCov). Use the variance of the
-        # postfit prediction histogram as a fallback.
-        h_pred = ch0["hist_postfit_inclusive"].get()
-        try:
-            diag_post = h_pred.variances()
-        except Exception:
-            diag_post = np.zeros_like(pred_post)
+def make_pull_plot(pc, out_dir):
+    proj = pc.proj
+    data = pc.data
+    pred_post = pc.pred_post
+    pred_pre = pc.pred_pre
+    nobs = pc.nobs
+    # diag of the saved postfit prediction cov, or (no --computeHistCov) the
+    # variance of the postfit prediction histogram
+    diag_post = pc.cov_post_diag
 
     res_post = pred_post - data
     res_pre = pred_pre - data
@@ -65,12 +51,13 @@ def make_pull_plot(fr, proj, out_dir):
     # Use the same denominator scale for prefit comparison (visual only).
     pulls_pre = res_pre / sigma_post
 
-    centers, edges = _hist_axis_centers(ch0["hist_data_obs"].get())
+    edges = pc.edges if pc.edges is not None else np.arange(len(data) + 1.0)
+    centers, edges = _axis_centers(edges)
 
-    chi2_post = float(m["chi2"])
-    ndf = float(m["ndf"])
-    chi2_pre = float(m["chi2_prefit"]) if "chi2_prefit" in m else None
-    chi2_sat = float(m["chi2_saturated"]) if "chi2_saturated" in m else None
+    chi2_post = pc.chi2_true
+    ndf = float(pc.ndf_true)
+    chi2_pre = pc.chi2_prefit
+    chi2_sat = pc.chi2_saturated
 
     fig, axes = plt.subplots(
         2, 1, figsize=(10, 6), sharex=True, gridspec_kw={"height_ratios": [2, 1]}
@@ -153,13 +140,9 @@ def main():
     fitres = sys.argv[1]
     out_dir = sys.argv[2]
     os.makedirs(out_dir, exist_ok=True)
-    fr, _ = get_fitresult(fitres, meta=True)
     rows = []
-    for proj in PROJ_KEYS:
-        if proj not in fr["mappings"]:
-            print(f"Skipping {proj} (not in mappings)")
-            continue
-        rows.append(make_pull_plot(fr, proj, out_dir))
+    for pc in load_projections(fitres, PROJ_KEYS).values():
+        rows.append(make_pull_plot(pc, out_dir))
     print("\n=== T1 summary ===")
     print(f"input: {fitres}")
     print(f"out_dir: {out_dir}")
@@ -0,0 +1,505 @@
+"""Shared residual-covariance object for the projection diagnostics.
+
+Every diagnostic here works with the same reconstruction of the projection
+residual covariance (see dump_rescov.py for its derivation):
+
+    res_cov = J J^T + diag(nobs) [+ diag(delta_bbb)]
+
+with J = `hist_prefit_inclusive_global_impacts` (NOIs dropped), of shape
+(nbins, nimpacts). ProjectionCov reads everything the diagnostics need from a
+fitresult once per (fitresult, projection) and keeps J as a low-rank factor
+plus a diagonal (LowRankCov). Solves, chi2 and whitening then go through the
+Woodbury identity
+
+    C^-1 = D^-1 - D^-1 F (I + F^T D^-1 F)^-1 F^T D^-1
+
+with a cached Cholesky factorization of the small rank x rank core, so the
+dense nbins x nbins matrix is never formed. That matters on the full 4D
+projection (~50k bins, thousands of nuisances). When there are more impacts
+than bins, F is first compressed to rank <= nbins by an SVD. Empty bins
+(nobs = 0) enter through a small Schur complement instead of D^-1.
+
+The inputs are cached in <fitresult>.projcov_<proj>.npz, keyed on the
+fitresult's size and mtime. Later runs then need neither rabbit nor
+unpickling the fitresult.
+
+GroupedRidge serves the per-group absorption fits of
+residual_on_nuisance_basis.py from one Gram matrix of J.
+
+Used by dump_rescov.py, residual_on_nuisance_basis.py, per_bin_pulls.py and
+diag_vs_offdiag_chi2.py.
+"""
+
+import os
+import sys
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, cholesky, solve_triangular
+
+sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
+sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
+
+NOI_NAMES = {"pdfAlphaS"}
+
+CACHE_VERSION = 1
+
+# largest projection for which dense nbins x nbins matrices (cov_post, eigh)
+# are kept / formed
+DENSE_MAX_BINS = 4000
+
+
+class LowRankCov:
+    """C = F F^T + diag(d), F of shape (n, k), d >= 0.
+
+    Bins with d = 0 (no observed events) are solved exactly through the
+    Schur complement S = F_Z (I + F_P^T D_P^-1 F_P)^-1 F_Z^T of the zero
+    block Z, which is positive definite whenever C is. If it is not (more
+    empty bins than impacts can resolve), those bins are masked instead: they
+    get no weight in solve/chi2/whiten, with a printed warning.
+    """
+
+    def __init__(self, F, d):
+        d = np.asarray(d, dtype=float)
+        if np.any(d < 0):
+            raise ValueError(
+                f"diagonal term must be non-negative ({int(np.sum(d < 0))} bins are not)"
+            )
+        F = np.asarray(F, dtype=float)
+        if F.shape[1] > F.shape[0]:
+            # more impacts than bins: F F^T only has rank <= n
+            U, s, _ = np.linalg.svd(F, full_matrices=False)
+            keep = s > (s[0] if s.size else 0.0) * F.shape[0] * np.finfo(float).eps
+            F = U[:, keep] * s[keep]
+        self.F = F
+        self.d = d
+        self.pos = d > 0
+        self.zero = np.flatnonzero(~self.pos)
+        self.masked = np.zeros(0, dtype=int)
+        self._Fp = F[self.pos]
+        self._dp = d[self.pos]
+        self._core = None
+        self._schur = None
+        self._svd = None
+        if self.zero.size:
+            try:
+                self.schur()
+            except np.linalg.LinAlgError:
+                print(
+                    f"WARNING: J J^T is singular on the {self.zero.size} bins with "
+                    f"zero diagonal term; masking them"
+                )
+                self.masked = self.zero
+
+    @property
+    def n(self):
+        return self.d.size
+
+    @property
+    def rank(self):
+        return self.F.shape[1]
+
+    @property
+    def _exact_zero(self):
+        return self.zero.size > 0 and self.masked.size == 0
+
+    def core(self):
+        """Cholesky factor of I + F_P^T D_P^-1 F_P (rank x rank), computed once."""
+        if self._core is None:
+            G = self._Fp / self._dp[:, None] ** 0.5
+            M = G.T @ G
+            M[np.diag_indices_from(M)] += 1.0
+            self._core = cho_factor(M, lower=True)
+        return self._core
+
+    def schur(self):
+        """Lower Cholesky factor of S = F_Z M^-1 F_Z^T for the zero bins Z."""
+        if self._schur is None:
+            Fz = self.F[self.zero]
+            self._schur = cholesky(Fz @ cho_solve(self.core(), Fz.T), lower=True)
+        return self._schur
+
+    def _solve_pos(self, x):
+        """(F_P F_P^T + D_P)^-1 x on the bins with d > 0 (Woodbury)."""
+        d = self._dp if x.ndim == 1 else self._dp[:, None]
+        y = x / d
+        if self.rank == 0:
+            return y
+        return y - (self._Fp @ cho_solve(self.core(), self._Fp.T @ y)) / d
+
+    def solve(self, x):
+        """C^-1 x for x of shape (n,) or (n, m); masked bins give 0."""
+        x = np.asarray(x, dtype=float)
+        out = np.zeros_like(x)
+        xp = x[self.pos]
+        if not self._exact_zero:
+            out[self.pos] = self._solve_pos(xp)
+            return out
+        # saddle-point form of C x = b with y = F^T x:
+        #   x_P = D_P^-1 (b_P - F_P y),  F_Z y = b_Z,  M y - F_Z^T x_Z = c
+        d = self._dp if x.ndim == 1 else self._dp[:, None]
+        Fz = self.F[self.zero]
+        t = cho_solve(self.core(), self._Fp.T @ (xp / d))
+        L = self.schur()
+        xz = cho_solve((L, True), x[self.zero] - Fz @ t)
+        y = t + cho_solve(self.core(), Fz.T @ xz)
+        out[self.pos] = (xp - self._Fp @ y) / d
+        out[self.zero] = xz
+        return out
+
+    def chi2(self, r):
+        return float(r @ self.solve(r))
+
+    def diagonal(self):
+        return self.d + np.einsum("ij,ij->i", self.F, self.F)
+
+    def logdet(self):
+        """log det C (of the unmasked bins): det D_P det M det S."""
+        c, _ = self.core()
+        out = np.sum(np.log(self._dp)) + 2 * np.sum(np.log(np.diag(c)))
+        if self._exact_zero:
+            out += 2 * np.sum(np.log(np.diag(self.schur())))
+        return float(out)
+
+    def dense(self):
+        return self.F @ self.F.T + np.diag(self.d)
+
+    def _whitening_svd(self):
+        if self._svd is None:
+            G = self._Fp / self._dp[:, None] ** 0.5
+            Q, s, _ = np.linalg.svd(G, full_matrices=False)
+            self._svd = Q, s
+        return self._svd
+
+    def _whiten_pos(self, x):
+        """W_P x_P with W_P = (I + G G^T)^-1/2 D_P^-1/2, G = D_P^-1/2 F_P."""
+        Q, s = self._whitening_svd()
+        y = x / (self._dp**0.5 if x.ndim == 1 else self._dp[:, None] ** 0.5)
+        scale = (1.0 + s**2) ** -0.5 - 1.0
+        return y + Q @ ((Q.T @ y) * (scale if x.ndim == 1 else scale[:, None]))
+
+    def _whiten_zero(self, x):
+        """L_S^-1 (x_Z - C_ZP C_PP^-1 x_P): the zero bins' whitened part, so
+        that |W_P x_P|^2 + |this|^2 = x^T C^-1 x."""
+        cond = x[self.zero] - self.F[self.zero] @ (
+            self._Fp.T @ self._solve_pos(x[self.pos])
+        )
+        return solve_triangular(self.schur(), cond, lower=True)
+
+    def whiten(self, x):
+        """W x with W^T W = C^-1 (block-triangular in the zero bins), each
+        entry at its bin's position; masked bins give 0."""
+        x = np.asarray(x, dtype=float)
+        out = np.zeros_like(x)
+        out[self.pos] = self._whiten_pos(x[self.pos])
+        if self._exact_zero:
+            out[self.zero] = self._whiten_zero(x)
+        return out
+
+    def relative_modes(self, r):
+        """Modes of C relative to its diagonal part: C u = lam D u, with
+        lam = 1 + s^2 for the singular values s of G = D^-1/2 F. Needs only
+        the thin SVD of G, so it works for any number of bins. Bins with
+        d = 0 are left out of the modes (zero rows in the shapes); their
+        chi2 goes into the rest.
+
+        -> (lam, mode shapes D^1/2 Q (n, rank), r_proj, chi2 per mode,
+            chi2 of the part of r outside the span of F)"""
+        Q, s = self._whitening_svd()
+        y = r[self.pos] / self._dp**0.5
+        r_proj = Q.T @ y
+        lam = 1.0 + s**2
+        chi2_modes = r_proj**2 / lam
+        chi2_rest = float(y @ y - r_proj @ r_proj)
+        if self._exact_zero:
+            chi2_rest += float(np.sum(self._whiten_zero(r) ** 2))
+        shapes = np.zeros((self.n, Q.shape[1]))
+        shapes[self.pos] = Q * self._dp[:, None] ** 0.5
+        return lam, shapes, r_proj, chi2_modes, chi2_rest
+
+
+def eigenmodes(C, r, max_dense=DENSE_MAX_BINS):
+    """Eigen-decomposition of a residual covariance and the chi2 of r per mode.
+
+    C is a dense array or a LowRankCov. Dense eigh is used up to max_dense
+    bins. Beyond that a LowRankCov falls back to its modes relative to the
+    diagonal (LowRankCov.relative_modes); their chi2 then sums to the total
+    minus the (printed) part of r outside the span of J.
+
+    -> (eigvals, eigvecs (n, nmodes), r_proj, chi2_per_mode, kind)
+    """
+    n = r.size
+    if isinstance(C, LowRankCov) and n > max_dense:
+        lam, shapes, r_proj, chi2_modes, chi2_rest = C.relative_modes(r)
+        print(
+            f"{n} bins > {max_dense}: using modes relative to the diagonal "
+            f"({chi2_rest:.2f} of the chi2 lies outside the J span)"
+        )
+        return lam, shapes, r_proj, chi2_modes, "relative"
+    dense = C.dense() if isinstance(C, LowRankCov) else C
+    eigvals, U = np.linalg.eigh(dense)
+    r_proj = U.T @ r
+    chi2_modes = np.zeros(n)
+    pos = eigvals > 0
+    chi2_modes[pos] = r_proj[pos] ** 2 / eigvals[pos]
+    return eigvals, U, r_proj, chi2_modes, "eigh"
+
+
+class GroupedRidge:
+    """Ridge fits  min_a |r - J_S a|^2_W + |a|^2  on column subsets S of J,
+    with W diagonal and unit Gaussian priors on the nuisances.
+
+    The Gram matrix G = J^T W J and b = J^T W r are formed once. The chi2
+    absorbed by a subset,
+
+        absorbed(S) = b_S^T (G_SS + I)^-1 b_S,
+
+    then only needs a Cholesky of the |S| x |S| sub-block, so overlapping
+    groups never refactorize the projection. cumulative() extends one
+    Cholesky factor block by block as groups are added, and leave_one_out()
+    gets the loss from dropping each group out of the inverse of the full
+    system:
+
+        absorbed(U) - absorbed(U minus S) = a_S^T ((A^-1)_SS)^-1 a_S,
+        a = A^-1 b_U, A = G_UU + I.
+    """
+
+    def __init__(self, J, w, r):
+        sw = np.sqrt(w)
+        Jw = J * sw[:, None]
+        y = r * sw
+        self.chi2_before = float(y @ y)
+        self.gram = Jw.T @ Jw
+        self.b = Jw.T @ y
+
+    def _system(self, idx):
+        A = self.gram[np.ix_(idx, idx)]
+        A[np.diag_indices_from(A)] += 1.0
+        return A
+
+    def fit(self, idx):
+        """-> dict(a, absorbed, prior = |a|^2, chi2_after = data term left)."""
+        idx = np.asarray(idx, dtype=int)
+        a = cho_solve(cho_factor(self._system(idx), lower=True), self.b[idx])
+        absorbed = float(self.b[idx] @ a)
+        prior = float(a @ a)
+        return dict(
+            a=a,
+            absorbed=absorbed,
+            prior=prior,
+            chi2_after=self.chi2_before - absorbed - prior,
+        )
+
+    def cumulative(self, subsets):
+        """Absorbed chi2 of the union of the first 1, 2, ... subsets, for
+        [(name, idx)] in the given order. -> [(name, new columns, absorbed)]"""
+        L = np.zeros((0, 0))
+        z = np.zeros(0)
+        seen = []
+        seen_set = set()
+        out = []
+        for name, idx in subsets:
+            new = [int(i) for i in idx if int(i) not in seen_set]
+            if new:
+                B = solve_triangular(L, self.gram[np.ix_(seen, new)], lower=True)
+                S = self._system(new) - B.T @ B
+                L22 = cholesky(S, lower=True)
+                z_new = solve_triangular(L22, self.b[new] - B.T @ z, lower=True)
+                L = np.block([[L, np.zeros((len(seen), len(new)))], [B.T, L22]])
+                z = np.concatenate([z, z_new])
+                seen.extend(new)
+                seen_set.update(new)
+            out.append((name, len(new), float(z @ z)))
+        return out
+
+    def leave_one_out(self, subsets):
+        """For [(name, idx)], the union U of all subsets and, per subset S,
+        the chi2 no longer absorbed when S is dropped from U.
+        -> (absorbed(U), {name: loss})"""
+        union = list(dict.fromkeys(int(i) for _, idx in subsets for i in idx))
+        A_inv = cho_solve(
+            cho_factor(self._system(union), lower=True), np.eye(len(union))
+        )
+        a = A_inv @ self.b[union]
+        pos = {c: k for k, c in enumerate(union)}
+        losses = {}
+        for name, idx in subsets:
+            s = [pos[int(i)] for i in dict.fromkeys(idx)]
+            losses[name] = float(a[s] @ np.linalg.solve(A_inv[np.ix_(s, s)], a[s]))
+        return float(self.b[union] @ a), losses
+
+
+def cache_path(fitres, proj):
+    return f"{fitres}.projcov_{proj.replace(' ', '_')}.npz"
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+class ProjectionCov:
+    """Residual, impacts and covariance pieces of one projection mapping."""
+
+    _FIELDS = (
+        "res",
+        "data",
+        "nobs",
+        "pred_post",
+        "pred_pre",
+        "edges",
+        "shape",
+        "J",
+        "impact_names",
+        "cov_post_diag",
+        "cov_post",
+        "chi2_true",
+        "ndf_true",
+        "chi2_prefit",
+        "chi2_saturated",
+    )
+
+    def __init__(self, proj, **fields):
+        self.proj = proj
+        for key in self._FIELDS:
+            setattr(self, key, fields.get(key))
+        self._covs = {}
+
+    @property
+    def delta_bbb(self):
+        """Diagonal floor approximating the BBB term: the part of the
+        postfit prediction variance not explained by J J^T."""
+        return np.maximum(
+            self.cov_post_diag - np.einsum("ij,ij->i", self.J, self.J), 0.0
+        )
+
+    def cov(self, bbb=False):
+        """LowRankCov of J J^T + diag(nobs) [+ diag(delta_bbb)], cached."""
+        if bbb not in self._covs:
+            d = self.nobs + self.delta_bbb if bbb else self.nobs
+            self._covs[bbb] = LowRankCov(self.J, d)
+        return self._covs[bbb]
+
+    @classmethod
+    def from_fitresult(cls, fr, proj):
+        """Read one projection mapping; multi-dimensional projections are
+        flattened to 1D bin vectors (J to (nbins, nimpacts))."""
+        m = fr["mappings"][proj]
+        ch0 = m["channels"]["ch0"]
+        h_data = ch0["hist_data_obs"].get()
+        data = h_data.values().reshape(-1)
+        n = data.size
+        h_post = ch0["hist_postfit_inclusive"].get()
+        pred_post = h_post.values().reshape(-1)
+        Jhist = ch0["hist_prefit_inclusive_global_impacts"].get()
+        impact_names = list(Jhist.axes[-1])
+        keep = np.array([name not in NOI_NAMES for name in impact_names])
+        cov_post = None
+        if "hist_postfit_inclusive_cov" in m:
+            cov_post = m["hist_postfit_inclusive_cov"].get().values().reshape(n, n)
+            cov_post_diag = np.diag(cov_post).copy()
+            if n > DENSE_MAX_BINS:
+                cov_post = None
+        else:
+            # no --computeHistCov: fall back to the postfit prediction variance
+            try:
+                cov_post_diag = h_post.variances()
+            except Exception:
+                cov_post_diag = None
+            cov_post_diag = (
+                np.zeros(n) if cov_post_diag is None else cov_post_diag.reshape(-1)
+            )
+        return cls(
+            proj,
+            res=pred_post - data,
+            data=data,
+            nobs=ch0["hist_nobs"].get().values().reshape(-1),
+            pred_post=pred_post,
+            pred_pre=(
+                ch0["hist_prefit_inclusive"].get().values().reshape(-1)
+                if "hist_prefit_inclusive" in ch0
+                else None
+            ),
+            edges=h_data.axes[0].edges if h_data.ndim == 1 else None,
+            shape=np.array(h_data.shape),
+            J=Jhist.values().reshape(n, -1)[:, keep],
+            impact_names=[name for name, k in zip(impact_names, keep) if k],
+            cov_post_diag=cov_post_diag,
+            cov_post=cov_post,
+            chi2_true=float(m["chi2"]),
+            ndf_true=int(m["ndf"]),
+            chi2_prefit=float(m["chi2_prefit"]) if "chi2_prefit" in m else None,
+            chi2_saturated=(
+                float(m["chi2_saturated"]) if "chi2_saturated" in m else None
+            ),
+        )
+
+    def save(self, path, stamp):
+        arrays = {"version": np.int64(CACHE_VERSION), "stamp": stamp}
+        arrays["proj"] = np.array(self.proj)
+        for key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                arrays[key] = np.asarray(value)
+        tmp = f"{path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_cache(cls, path, stamp):
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as z:
+                if int(z["version"]) != CACHE_VERSION:
+                    return None
+                if not np.array_equal(z["stamp"], stamp):
+                    print(f"Cache {path} is stale, ignoring it.")
+                    return None
+                fields = {k: z[k] for k in cls._FIELDS if k in z.files}
+                proj = str(z["proj"])
+        except (OSError, ValueError, KeyError):
+            return None
+        fields["impact_names"] = [str(n) for n in fields["impact_names"]]
+        for key in ("chi2_true", "chi2_prefit", "chi2_saturated"):
+            if key in fields:
+                fields[key] = float(fields[key])
+        fields["ndf_true"] = int(fields["ndf_true"])
+        return cls(proj, **fields)
+
+    @classmethod
+    def load(cls, fitres, proj, fr=None, cache=True):
+        """ProjectionCov for (fitres, proj), from the .npz cache when it
+        matches the fitresult, else read from the fitresult (fr, if already
+        open) and cached."""
+        pcs = load_projections(fitres, [proj], fr=fr, cache=cache)
+        if proj not in pcs:
+            raise KeyError(f"{proj!r} is not a mapping of {fitres}")
+        return pcs[proj]
+
+
+def load_projections(fitres, projs, fr=None, cache=True):
+    """{proj: ProjectionCov} for the projections of `projs` present in the
+    fitresult. The fitresult is only opened (once) if some cache is missing
+    or stale."""
+    stamp = _file_stamp(fitres)
+    out = {}
+    for proj in projs:
+        path = cache_path(fitres, proj)
+        pc = ProjectionCov.from_cache(path, stamp) if cache else None
+        if pc is None:
+            if fr is None:
+                from rabbit.io_tools import get_fitresult
+
+                fr, _ = get_fitresult(fitres, meta=True)
+            if proj not in fr["mappings"]:
+                print(f"Skipping {proj} (not in mappings)")
+                continue
+            pc = ProjectionCov.from_fitresult(fr, proj)
+            if cache:
+                try:
+                    pc.save(path, stamp)
+                    print(f"Wrote cache {path}")
+                except OSError as e:
+                    print(f"Could not write cache {path}: {e}")
+        out[proj] = pc
+    return out
@@ -14,6 +14,9 @@ projection (compared to the existing postfit theta_i and its prior).
 Group analogues are computed for nuisance groups (NP, resum, QCDscale,
 helicity, eff, BBB, ...) by stacking columns and solving the
 constrained least-squares J_g a = -r → chi2 absorbed by group g.
+All group fits come from one Gram matrix of J (projection_cov.GroupedRidge),
+which also gives the cumulative absorption with groups added in ranking
+order and the chi2 lost when each group is left out of the full set.
 
 Usage:
     python residual_on_nuisance_basis.py <fitresults.hdf5> <out_dir>
@@ -26,12 +29,9 @@ import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/rabbit")
-sys.path.insert(0, "/home/submit/lavezzo/alphaS/main/WRemnants/wums")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from rabbit.io_tools import get_fitresult  # noqa: E402
-
-NOI_NAMES = {"pdfAlphaS"}
+from projection_cov import GroupedRidge, ProjectionCov  # noqa: E402
 
 # Group definitions — name → list of regex prefixes (matched on parm name).
 GROUPS = {
@@ -93,29 +93,17 @@ def main():
     out_dir = sys.argv[2]
     proj = sys.argv[3] if len(sys.argv) > 3 else "Project ch0 ptll"
     os.makedirs(out_dir, exist_ok=True)
-    fr, _ = get_fitresult(fitres, meta=True)
-    m = fr["mappings"][proj]
-    ch0 = m["channels"]["ch0"]
-    data = ch0["hist_data_obs"].get().values()
-    pred_post = ch0["hist_postfit_inclusive"].get().values()
-    nobs = ch0["hist_nobs"].get().values()
-    Jhist = ch0["hist_prefit_inclusive_global_impacts"].get()
-    impact_names = list(Jhist.axes[1])
-    J = Jhist.values()  # (nbins, nimpacts)
-    res = pred_post - data
-    chi2_true = float(m["chi2"])
-
-    keep = np.array([n not in NOI_NAMES for n in impact_names])
-    impact_names = [n for n, k in zip(impact_names, keep) if k]
-    J = J[:, keep]
+    pc = ProjectionCov.load(fitres, proj)
+    impact_names = pc.impact_names
+    J = pc.J  # (nbins, nimpacts), NOIs dropped
+    res = pc.res
+    nobs = pc.nobs
+    chi2_true = pc.chi2_true
 
-    # Per-nuisance scalar projection using only systs cov + diag(nobs).
+    # Per-nuisance scalar projection using only systs cov + diag(nobs)
+    # (Woodbury solve, no dense nbins x nbins matrix).
     sigma2_d = nobs
-    cov_systs_stat = J @ J.T + np.diag(sigma2_d)
-
-    # Pre-compute Cinv @ r once.
-    Cinv_r = np.linalg.solve(cov_systs_stat, res)
-    chi2_systs_stat = float(res @ Cinv_r)
+    chi2_systs_stat = pc.cov().chi2(res)
 
     rJ = J.T @ res  # (nimpacts,)
     JJ = np.einsum("bi,bi->i", J, J)  # (nimpacts,)
@@ -129,11 +117,11 @@ def main():
     #   Δchi2 = (J_i^T C0^{-1} r)^2 / (1 + J_i^T C0^{-1} J_i)
     # where C0 is the data-only cov diag(nobs). Useful for "what the prior
     # has to absorb if it were the only freedom."
-    Cdata = np.diag(sigma2_d)
-    Cdata_inv = np.diag(1.0 / sigma2_d)
-    Cdr = Cdata_inv @ res  # (nbins,)
+    # C0 is diagonal, so C0^{-1} is applied as a per-bin scaling.
+    Cdata_inv = 1.0 / sigma2_d
+    Cdr = Cdata_inv * res  # (nbins,)
     Jt_Cinv_r = J.T @ Cdr  # (nimpacts,)
-    Jt_Cinv_J = np.einsum("bi,bi->i", J, Cdata_inv @ J)
+    Jt_Cinv_J = np.einsum("bi,bi,b->i", J, J, Cdata_inv)
     chi2_per_nuis_marg_to_data = (Jt_Cinv_r**2) / (1.0 + Jt_Cinv_J)
 
     # Print per-nuisance top entries.
@@ -158,46 +146,48 @@ def main():
             f"{delta_theta_implied[idx]:+10.2f}"
         )
 
-    # Group projection: take all nuisances in group, compute residual norm
-    # difference when restricting to that subspace.
+    # Group projection: ridge fit of the residual on each group's columns,
+    # all served from one Gram matrix of J (groups overlap heavily).
     helicity_groups = fill_helicity_groups(impact_names)
+    col = {n: i for i, n in enumerate(impact_names)}
+
+    def group_index(gnames):
+        members = []
+        for g in gnames:
+            prefixes = GROUPS.get(g)
+            if prefixes is None:
+                members.extend(helicity_groups.get(g, []))
+            else:
+                members.extend(
+                    n for n in impact_names if any(n.startswith(p) for p in prefixes)
+                )
+        members = list(dict.fromkeys(members))  # de-dup, preserve order
+        return np.array([col[n] for n in members], dtype=int)
+
+    ridge = GroupedRidge(J, Cdata_inv, res)
+    chi2_before = ridge.chi2_before
+    group_idx = {g: group_index([g]) for g in GROUPS}
     rows = []
-    n_in_group = {}
-    for gname in list(GROUPS.keys()):
-        prefixes = GROUPS[gname]
-        if prefixes is None:
-            members = helicity_groups.get(gname, [])
-        else:
-            members = [
-                n for n in impact_names if any(n.startswith(p) for p in prefixes)
-            ]
-        idx = np.array([impact_names.index(n) for n in members], dtype=int)
-        n_in_group[gname] = len(idx)
+    for gname, idx in group_idx.items():
         if len(idx) == 0:
             continue
-        Jg = J[:, idx]
         # solve (Jg^T Cdata_inv Jg + I) a = Jg^T Cdata_inv r  → "ridge" with prior I.
-        A = Jg.T @ Cdata_inv @ Jg + np.eye(len(idx))
-        b = Jg.T @ Cdata_inv @ res
         try:
-            a = np.linalg.solve(A, b)
+            fit = ridge.fit(idx)
         except np.linalg.LinAlgError:
             continue
-        # delta-residual after the group repulls by a (relative to data-only fit baseline).
-        r_after = res - Jg @ a
-        chi2_before = float(res @ Cdata_inv @ res)
-        chi2_after = float(r_after @ Cdata_inv @ r_after) + float(
-            a @ a
-        )  # +prior penalty
-        absorbed = chi2_before - chi2_after
+        a = fit["a"]
+        chi2_after = fit["chi2_after"] + fit["prior"]  # +prior penalty
         rms_a = float(np.sqrt(np.mean(a**2)))
         max_a = float(np.max(np.abs(a)))
-        rows.append((gname, len(idx), absorbed, chi2_before, chi2_after, rms_a, max_a))
+        rows.append(
+            (gname, len(idx), fit["absorbed"], chi2_before, chi2_after, rms_a, max_a)
+        )
 
     print()
     print(
         "--- Group-level absorption (from data-only baseline; chi2_data="
-        f"{float(res @ Cdata_inv @ res):.1f} ) ---"
+        f"{chi2_before:.1f} ) ---"
     )
     print(
         f"{'group':25s} {'n':>4} {'Δchi2_absorbed':>14} {'rms_θ_implied':>13} "
@@ -207,6 +197,22 @@ def main():
     for gname, n, absorbed, c0, c1, rms_a, max_a in rows:
         print(f"{gname:25s} {n:4d} {absorbed:14.1f} {rms_a:13.2f} {max_a:15.2f}")
 
+    # Cumulative (groups added in the ranking order above) and
+    # leave-one-group-out within the union of all groups.
+    ranked = [(r[0], group_idx[r[0]]) for r in rows]
+    if ranked:
+        absorbed_all, losses = ridge.leave_one_out(ranked)
+        print()
+        print(
+            f"--- Cumulative and leave-one-group-out (all groups together absorb "
+            f"{absorbed_all:.1f}) ---"
+        )
+        print(
+            f"{'group':25s} {'n_new':>5} {'Δchi2_cumulative':>16} {'Δchi2_lost_if_dropped':>21}"
+        )
+        for gname, n_new, cum in ridge.cumulative(ranked):
+            print(f"{gname:25s} {n_new:5d} {cum:16.1f} {losses[gname]:21.1f}")
+
     # Summary: scetlibNP sum, theory sum, eff sum.
     print()
     print("Aggregate subspaces:")
@@ -240,42 +246,20 @@ def main():
         ),
         ("scetlibNP only (lambda + eigvar)", ["scetlibNP_lambda", "scetlibNP_eigvar"]),
     ]:
-        members = []
-        for g in gnames:
-            prefixes = GROUPS.get(g)
-            if prefixes is None:
-                members.extend(helicity_groups.get(g, []))
-            else:
-                if prefixes:
-                    members.extend(
-                        [
-                            n
-                            for n in impact_names
-                            if any(n.startswith(p) for p in prefixes)
-                        ]
-                    )
-        members = list(dict.fromkeys(members))  # de-dup, preserve order
-        if not members:
+        idx = group_index(gnames)
+        if len(idx) == 0:
             continue
-        idx = np.array([impact_names.index(n) for n in members], dtype=int)
-        Jg = J[:, idx]
-        A = Jg.T @ Cdata_inv @ Jg + np.eye(len(idx))
-        b = Jg.T @ Cdata_inv @ res
         try:
-            a = np.linalg.solve(A, b)
+            fit = ridge.fit(idx)
         except np.linalg.LinAlgError:
             print(f"  {label}: solve failed, n={len(idx)}")
             continue
-        r_after = res - Jg @ a
-        chi2_before = float(res @ Cdata_inv @ res)
-        chi2_after = float(r_after @ Cdata_inv @ r_after)
-        prior_pen = float(a @ a)
-        absorbed = chi2_before - (chi2_after + prior_pen)
+        a = fit["a"]
         max_a = float(np.max(np.abs(a)))
         n_above_2sig = int(np.sum(np.abs(a) > 2.0))
         print(
-            f"  {label:65s} n={len(idx):4d}  Δchi2={absorbed:7.1f}  "
-            f"residual_chi2_after={chi2_after:7.1f}  max|θ|={max_a:5.2f}  "
+            f"  {label:65s} n={len(idx):4d}  Δchi2={fit['absorbed']:7.1f}  "
+            f"residual_chi2_after={fit['chi2_after']:7.1f}  max|θ|={max_a:5.2f}  "
             f"n(|θ|>2σ)={n_above_2sig}"
         )
 
@@ -3,7 +3,8 @@
 compare_cache_vs_scetlib showed: SCETlib's OWN W_full Hankeled on the 2000-node cache grid
 -> 0.444*sval at qT=100, but on a 6000-node grid -> 0.977*sval. W is smooth, so if the base
 node density were sufficient both would agree. Here: fresh SCETlib W_full at (91,0,qT), sampled
-on logspace(bmin,bmax,N) for growing N, splined, Hankeled with the SAME fine simpson.
+on logspace(bmin,bmax,N) for growing N, splined, Hankeled with the SAME batched
+Ogata quadrature (hankel.py; was a 4M-node linear simpson per N).
 
 If h/sval climbs 0.44 -> ~0.98 with N, the cache's 2000 bT nodes are too coarse to represent
 the integrand for the deep-tail Hankel (the ~486x cancellation eats the spline error).
@@ -65,9 +66,7 @@ def main():
     sys.path.insert(0, BUILD)
     from scetlib_run import config as scetlib_config
     import scetlib_qT as qT_mod
-    from scipy.interpolate import CubicSpline
-    from scipy.integrate import simpson
-    from scipy.special import j0
+    from hankel import hankel, ogata_bT
 
     conf = scetlib_config.read_config(CARD)
     *_, sigma = scetlib_config.configure_calculation(conf)
@@ -78,21 +77,26 @@ def main():
     for qt in QTS:
         sval = sigma(Q, Y, qt).val
         print(f"\n=== Q={Q} Y={Y} qT={qt}  sval(DE)={sval:.7g} ===")
-        print(f"  {'N_nodes':>8} {'h':>13} {'h/sval':>9}")
+        print(f"  {'N_nodes':>8} {'h':>13} {'h/sval':>9} {'err':>9}")
         for N in NS:
             bT = np.logspace(np.log10(bmin), np.log10(bmax), N)
             W = np.asarray(
                 sigma.resummed_bT_integrand(Q, Y, qt, bT.tolist()), dtype=float
             )
-            spl = CubicSpline(bT, W)
-            bf = np.linspace(bmin, bmax, 4_000_000)
-            h = qt * simpson(bf * j0(qt * bf) * spl(bf), x=bf)
-            print(f"  {N:>8,} {h:13.6g} {h/sval:9.4f}")
-        # direct (no spline): sample W on the fine grid itself -> removes spline error entirely
-        bf = np.logspace(np.log10(bmin), np.log10(bmax), 400_000)
-        Wf = np.asarray(sigma.resummed_bT_integrand(Q, Y, qt, bf.tolist()), dtype=float)
-        h_direct = qt * simpson(bf * j0(qt * bf) * Wf, x=bf)
-        print(f"  direct400k(no spline)  h={h_direct:.6g}  h/sval={h_direct/sval:.4f}")
+            h, err = hankel(bT, W, qt)
+            print(f"  {N:>8,} {h:13.6g} {h/sval:9.4f} {err:9.2g}")
+        # direct (no spline): W at the Ogata nodes themselves -> removes spline error
+        # entirely; nodes outside [bmin, bmax] are dropped like the cache's range
+        bf, wf = ogata_bT(qt)
+        inside = (bf >= bmin) & (bf <= bmax)
+        Wf = np.asarray(
+            sigma.resummed_bT_integrand(Q, Y, qt, bf[inside].tolist()), dtype=float
+        )
+        h_direct = np.sum(wf[inside] * Wf)
+        print(
+            f"  direct Ogata ({inside.sum()} nodes, no spline)  h={h_direct:.6g}"
+            f"  h/sval={h_direct/sval:.4f}"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""Memory-mapped copy of a btgrid cache for the diagnostic scripts.
+
+btgrid_cache.load(BTGRID) materializes the full (nvar, nbins, nbT) I_pert and
+C_nu tensors -- GBs for the 2000-node fine grid -- and every script then
+nan_to_num's them in place, even to look at a handful of bins. Here the grid
+is converted once into plain .npy files
+
+    <out>/I_pert.npy, C_nu.npy          (nvar, nbins, nbT), NaN/inf -> 0 at write
+    <out>/I_pert.f32.npy, C_nu.f32.npy  optional float32 copies (--float32)
+    <out>/bT.npy, b_bar.npy, bins.npy
+    <out>/extra.pkl                     any other (non-array) entries
+    <out>/meta.json                     source fingerprint, shapes, dtypes
+
+and opened with mmap_mode="r": a bin is one contiguous nbT row, so reading
+grid["I_pert"][ivar][rows] touches only those pages, start-up costs a few
+file opens, and parallel scripts share the page cache instead of each holding
+a private copy. The default <out> is <BTGRID>/mmap for a cache directory
+and <BTGRID>.mmap for a single cache file; a stale copy (source files
+changed) is rebuilt on open. Conversions of one <out> are serialized through
+<out>.lock, so scripts started together convert once and all read that copy.
+
+    python btgrid_mmap.py BTGRID [--float32]     # convert ahead of time
+
+    import btgrid_mmap
+    grid = btgrid_mmap.open_btgrid(BTGRID)       # keys as btgrid_cache.load
+    W = btgrid_mmap.rows(grid, "I_pert", ibins)  # float64 rows of variation 0
+"""
+
+import argparse
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+MMAP_DIRNAME = "mmap"
+SANITIZED = ("I_pert", "C_nu")
+# rows converted per block, so converting never needs a second full copy
+BLOCK_ROWS = 4096
+
+
+def default_out(btgrid):
+    btgrid = btgrid.rstrip("/")
+    if os.path.isdir(btgrid):
+        return os.path.join(btgrid, MMAP_DIRNAME)
+    return f"{btgrid}.{MMAP_DIRNAME}"
+
+
+def source_fingerprint(btgrid):
+    """(name, size, mtime_ns) of the cache's files, minus our own output."""
+    if os.path.isdir(btgrid):
+        own = (MMAP_DIRNAME, f"{MMAP_DIRNAME}.lock")
+        files = sorted(
+            f
+            for f in glob.glob(os.path.join(btgrid, "*"))
+            if os.path.isfile(f) and os.path.basename(f) not in own
+        )
+    else:
+        files = [btgrid]
+    out = []
+    for f in files:
+        st = os.stat(f)
+        out.append([os.path.basename(f), st.st_size, st.st_mtime_ns])
+    return out
+
+
+def _write_array(path, a, sanitize=False, dtype=None):
+    a = np.asarray(a)
+    dtype = dtype or a.dtype
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=a.shape)
+    if a.ndim < 2:
+        out[...] = np.nan_to_num(a) if sanitize else a
+    else:
+        flat_in = a.reshape(-1, a.shape[-1])
+        flat_out = out.reshape(-1, a.shape[-1])
+        for s in range(0, len(flat_in), BLOCK_ROWS):
+            block = np.asarray(flat_in[s : s + BLOCK_ROWS])
+            if sanitize:
+                block = np.nan_to_num(block, nan=0.0, posinf=0.0, neginf=0.0)
+            flat_out[s : s + BLOCK_ROWS] = block
+    out.flush()
+    del out
+
+
+@contextlib.contextmanager
+def _locked(out):
+    """Exclusive lock on <out>.lock for the duration of a conversion."""
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(f"{out}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def convert(btgrid, out=None, float32=False):
+    """Write the memory-mappable copy of `btgrid` (dir or file accepted by
+    btgrid_cache.load) to `out`; returns `out`. Callers converting
+    concurrently should hold _locked(out) (open_btgrid and main do); without
+    it, losing the final rename to an equally fresh copy still counts as
+    success."""
+    from wremnants.postprocessing.scetlib_np import btgrid_cache
+
+    out = out or default_out(btgrid)
+    source = source_fingerprint(btgrid)
+    grid = btgrid_cache.load(btgrid)
+
+    tmp = f"{out}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    arrays, extra = {}, {}
+    for k, v in grid.items():
+        if k == "bins":
+            v = np.asarray(v, np.float64).reshape(-1, 3)
+        try:
+            a = np.asarray(v)
+        except ValueError:  # ragged
+            a = None
+        if a is not None and a.ndim > 0 and a.dtype != object:
+            v = a
+            _write_array(os.path.join(tmp, f"{k}.npy"), v, sanitize=k in SANITIZED)
+            if float32 and k in SANITIZED:
+                _write_array(
+                    os.path.join(tmp, f"{k}.f32.npy"),
+                    v,
+                    sanitize=k in SANITIZED,
+                    dtype=np.float32,
+                )
+            arrays[k] = {"shape": list(v.shape), "dtype": str(v.dtype)}
+        else:
+            extra[k] = v
+    with open(os.path.join(tmp, "extra.pkl"), "wb") as f:
+        pickle.dump(extra, f)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "source": source,
+                "arrays": arrays,
+                "sanitized": list(SANITIZED),
+                "float32": float32,
+            },
+            f,
+            indent=1,
+        )
+    shutil.rmtree(out, ignore_errors=True)
+    try:
+        os.replace(tmp, out)
+    except OSError:
+        # another process put its copy in place between rmtree and replace
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not is_fresh(btgrid, out, float32):
+            raise
+    return out
+
+
+def load(out, float32=False):
+    """Open a converted cache: the same keys as btgrid_cache.load, with the
+    arrays as read-only memmaps (the float32 I_pert/C_nu if asked for and
+    written)."""
+    with open(os.path.join(out, "meta.json")) as f:
+        meta = json.load(f)
+    grid = {}
+    for k in meta["arrays"]:
+        path = os.path.join(out, f"{k}.npy")
+        f32 = os.path.join(out, f"{k}.f32.npy")
+        if float32 and os.path.exists(f32):
+            path = f32
+        grid[k] = np.load(path, mmap_mode="r")
+    with open(os.path.join(out, "extra.pkl"), "rb") as f:
+        grid.update(pickle.load(f))
+    return grid
+
+
+def is_fresh(btgrid, out, float32=False):
+    """Whether `out` is a copy of the current `btgrid` (with float32 arrays,
+    if asked for)."""
+    try:
+        with open(os.path.join(out, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if float32 and not meta.get("float32"):
+        return False
+    return meta.get("source") == source_fingerprint(btgrid)
+
+
+def open_btgrid(btgrid, out=None, float32=False):
+    """load(), converting first if there is no up-to-date copy."""
+    out = out or default_out(btgrid)
+    if not is_fresh(btgrid, out, float32):
+        with _locked(out):
+            # another script may have converted while we waited
+            if not is_fresh(btgrid, out, float32):
+                print(f"[btgrid_mmap] converting {btgrid} -> {out}", flush=True)
+                convert(btgrid, out, float32=float32)
+    return load(out, float32=float32)
+
+
+def rows(grid, key, idx, ivar=0, dtype=np.float64):
+    """grid[key][ivar][idx] read from the memmap as an in-memory `dtype`
+    array; only those bins are touched."""
+    idx = np.asarray(idx)
+    return np.asarray(grid[key][ivar][idx], dtype=dtype)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("btgrid", help="btgrid cache (as passed to btgrid_cache.load)")
+    ap.add_argument(
+        "--out", default=None, help="default: <btgrid>/mmap, <btgrid>.mmap for a file"
+    )
+    ap.add_argument(
+        "--float32", action="store_true", help="Also write float32 I_pert/C_nu."
+    )
+    ap.add_argument("--force", action="store_true", help="Convert even if fresh.")
+    args = ap.parse_args()
+    out = args.out or default_out(args.btgrid)
+    with _locked(out):
+        if args.force or not is_fresh(args.btgrid, out, args.float32):
+            convert(args.btgrid, out, float32=args.float32)
+    grid = load(out, float32=args.float32)
+    for k, v in grid.items():
+        if isinstance(v, np.ndarray):
+            print(f"  {k:>8}: {v.dtype} {v.shape}")
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
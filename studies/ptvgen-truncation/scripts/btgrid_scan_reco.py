@@ -4,10 +4,11 @@ here (b0_over_bmax=0 -> NP provides ALL large-bT damping -> bare Hankel diverges
 so we apply the franksvals NP and Hankel-integrate, then compare to point-mode.
 
 Answers: does a denser / wider bT grid converge the high-qT resum reconstruction
-to SCETlib?  ours = log-Simpson (as the model does); hi = spline->fine-linear.
+to SCETlib?  ours = log-Simpson (as the model does); hi = batched Ogata Hankel
+(hankel.py) of the same nodes, all qT rows of a grid in one call.
 """
 
-import glob, pickle, re
+import glob, re
 import numpy as np
 
 SCAN = (
@@ -36,18 +37,12 @@ QT_SHOW = [70, 80, 85, 90, 95, 100]
 
 
 def main():
-    from scipy.interpolate import CubicSpline
-    from scipy.integrate import simpson as _simpson
+    from hankel import hankel
+    from point_index import PointIndex
     from scipy.special import j0
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
-    sp = pickle.load(open(POINTMODE, "rb"))["spectra"][0]
-
-    def pm_at(qT):
-        for k in sp:
-            if abs(k[0] - Q) < 1e-6 and abs(k[1] - Y) < 1e-6 and abs(k[2] - qT) < 1e-6:
-                return sp[k]
-        return np.nan
+    pointmode = PointIndex.from_pointspec(POINTMODE)
 
     gnu = {k: v for k, v in GNU.items() if k != "np_model_nu"}
     eff = {k: v for k, v in EFF.items() if k != "np_model"}
@@ -66,18 +61,13 @@ def main():
         gNP = fz_tf.gamma_nu_NP_tf(b_bar, gnu, np_model_nu=GNU["np_model_nu"]).numpy()
         Feff = fz_tf.F_eff_tf(Y, b_bar, eff, np_model=EFF["np_model"]).numpy()
         wS = fz_tf.simpson_weights(bT)
-        bT_fine = np.linspace(bT.min(), bT.max(), 400000)
-        for j, q in enumerate(qT):
-            if round(q) not in QT_SHOW:
-                continue
-            W = Ip[j] * np.exp(Cn[j] * gNP) * Feff
-            s_ours = q * np.sum(wS * (bT * j0(q * bT)) * W)
-            W_fine = CubicSpline(bT, W)(bT_fine)
-            s_hi = q * _simpson(bT_fine * j0(q * bT_fine) * W_fine, x=bT_fine)
-            pm = pm_at(q)
-            print(
-                f"{tag:>14} {q:5.0f} {s_ours/pm:9.4f} {s_hi/pm:9.4f} {s_ours/s_hi:9.4f}"
-            )
+        show = np.flatnonzero(np.isin(np.round(qT), QT_SHOW))
+        W = Ip[show] * np.exp(Cn[show] * gNP) * Feff
+        s_ours = qT[show] * np.sum(wS * (bT * j0(qT[show, None] * bT)) * W, axis=1)
+        s_hi, _ = hankel(bT, W, qT[show])
+        pms = pointmode.get(Q, Y, qT[show])
+        for q, o, hi, pm in zip(qT[show], s_ours, s_hi, pms):
+            print(f"{tag:>14} {q:5.0f} {o/pm:9.4f} {hi/pm:9.4f} {o/hi:9.4f}")
         print()
 
 
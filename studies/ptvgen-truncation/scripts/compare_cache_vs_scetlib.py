@@ -3,7 +3,7 @@
 Inputs:
   - hankel_integrator_test.npz : SCETlib W_full/W_pert/C_nu on cache bT nodes at qT=90,100
     (b_bar == bs == bT confirmed there, so NP argument is not the issue).
-  - btgrid cache via btgrid_cache.load : our stored I_pert, C_nu, b_bar, bT.
+  - btgrid cache via btgrid_mmap      : our stored I_pert, C_nu, b_bar, bT.
 
 Checks at (Q=91,Y=0), qT in {90,100}:
   1. I_pert_cache  vs  W_pert_scetlib     (NP-off perturbative integrand)  -> ratio vs bT
@@ -44,20 +44,20 @@ def main():
     from scipy.interpolate import CubicSpline
     from scipy.integrate import simpson
     from scipy.special import j0
-    from wremnants.postprocessing.scetlib_np import btgrid_cache
+    from point_index import PointIndex
+    import btgrid_mmap
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
     s = np.load(SCET)
     cbT = s["cbT"]
     bs = s["bs_cache"]
 
-    grid = btgrid_cache.load(BTGRID)
-    for k in ("I_pert", "C_nu"):
-        np.nan_to_num(grid[k], copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    grid = btgrid_mmap.open_btgrid(BTGRID)  # memmaps, NaN-free
     bT = np.asarray(grid["bT"], np.float64)
     b_bar = np.asarray(grid["b_bar"], np.float64)
-    Ipert = np.asarray(grid["I_pert"][0], np.float64)
-    Cnu = np.asarray(grid["C_nu"][0], np.float64)
+    # only the bins used below are read from disk
+    Ipert = grid["I_pert"][0]
+    Cnu = grid["C_nu"][0]
     bins = grid["bins"]
 
     assert np.max(np.abs(bT - cbT)) < 1e-9, "cache bT grid mismatch vs dumped cbT"
@@ -68,13 +68,8 @@ def main():
     gNP = fz_tf.gamma_nu_NP_tf(b_bar, gnu, np_model_nu=GNU["np_model_nu"]).numpy()
     Feff = fz_tf.F_eff_tf(Y, b_bar, eff, np_model=EFF["np_model"]).numpy()
 
-    for qt in [90.0, 100.0]:
-        ibin = min(
-            range(len(bins)),
-            key=lambda i: abs(bins[i][0] - Q)
-            + abs(bins[i][1] - Y)
-            + abs(bins[i][2] - qt),
-        )
+    qts = [90.0, 100.0]
+    for qt, ibin in zip(qts, PointIndex.from_bins(bins).nearest(Q, Y, qts)):
         Ip = Ipert[ibin]
         Cn = Cnu[ibin]
         Wfull_scet = s[f"Wfull_scet_cache_{qt:.0f}"]
@@ -0,0 +1,225 @@
+"""Batched Hankel transforms of bT-space integrands:
+
+    H(qT) = qT * int_0^inf bT J0(qT bT) W(bT) dbT
+
+for a whole (bins, bT) array at once (e.g. grid["I_pert"] * NP), every row at
+its own qT -- or at several qT -- in one call, with a per-point error estimate.
+
+  method="ogata"   Ogata's double-exponential quadrature on the zeros of J0
+                   (H. Ogata, Publ. RIMS 41 (2005) 949), W from a cubic spline
+                   in ln bT through the nodes. Error = |H(h) - H(h/2)|.
+  method="fftlog"  Hamilton's FFTLog (MNRAS 312 (2000) 257): one FFT per row
+                   over log-uniform bT nodes gives H on a log-uniform qT grid
+                   (qT ~ 1/bT_max .. 1/bT_min), interpolated to the requested
+                   qT. Error = |H - H(every other node)|.
+
+W is taken as 0 outside [bT_min, bT_max] in both, i.e. the same finite-range
+transform the spline -> fine-linear-Simpson reconstructions here compute, but
+without resolving J0 by brute force. See LOGBOOK.md (2026-07-03) for why the
+lower edge matters at high qT.
+
+Shapes: W is (..., nbT); qT must broadcast against W.shape[:-1]. To transform
+every row at many qT, pass qT[None, :] with W[:, None, :] -- W rows are never
+copied, the broadcast only indexes them.
+
+    from hankel import hankel
+    H, err = hankel(grid["bT"], W, qT_of_bin)
+
+ogata_bT gives the Ogata nodes and weights in bT for integrands that can be
+evaluated anywhere, which removes the spline entirely.
+"""
+
+import functools
+
+import numpy as np
+
+# --- Ogata -------------------------------------------------------------------
+
+
+# beyond t = h xi_k = 3.5, psi(t) == t and psi'(t) == 1 to double precision and
+# the nodes sit on the zeros of J0: those terms vanish
+_T_MAX = 3.5
+
+
+@functools.lru_cache(maxsize=16)
+def ogata_nodes(h):
+    """Nodes x_k and weights w_k with
+    int_0^inf f(x) J0(x) dx ~= sum_k w_k f(x_k)."""
+    from scipy.special import j0, j1, jn_zeros, y0
+
+    zeros = jn_zeros(0, int(np.ceil(_T_MAX * np.pi / h)) + 1)
+    zeros = zeros[h * zeros / np.pi <= _T_MAX]
+    t = h * zeros / np.pi
+    a = 0.5 * np.pi * np.sinh(t)
+    psi = t * np.tanh(a)
+    dpsi = np.tanh(a) + 0.5 * np.pi * t * np.cosh(t) / np.cosh(a) ** 2
+    x = np.pi * psi / h
+    w = np.pi * y0(zeros) / j1(zeros) * j0(x) * dpsi
+    x.flags.writeable = w.flags.writeable = False
+    return x, w
+
+
+def ogata_bT(qT, h=1e-3):
+    """bT nodes and weights with H(qT) ~= sum_k weights_k W(bT_k), for
+    integrands that can be evaluated directly (no spline through cached nodes),
+    e.g. SCETlib's resummed_bT_integrand."""
+    x, w = ogata_nodes(h)
+    return x / qT, x * w / qT
+
+
+def _spline_coefficients(lnb, W):
+    """Cubic-spline coefficients in ln bT, shape (4, nbT - 1, rows)."""
+    from scipy.interpolate import CubicSpline
+
+    return CubicSpline(lnb, W, axis=1).c
+
+
+def _ogata(lnb, W, rows, qT, h, chunk_elems):
+    x, w = ogata_nodes(h)
+    out = np.empty(len(rows))
+    for s in range(0, len(rows), chunk_elems):
+        r = rows[s : s + chunk_elems]
+        q = qT[s : s + chunk_elems]
+        urows, inv = np.unique(r, return_inverse=True)
+        c = _spline_coefficients(lnb, W[urows].astype(np.float64))
+        lb = np.log(x)[None, :] - np.log(q)[:, None]  # ln(x_k / qT)
+        seg = np.clip(np.searchsorted(lnb, lb) - 1, 0, len(lnb) - 2)
+        dx = lb - lnb[seg]
+        col = inv[:, None]
+        Wk = ((c[0, seg, col] * dx + c[1, seg, col]) * dx + c[2, seg, col]) * dx
+        Wk += c[3, seg, col]
+        Wk[(lb < lnb[0]) | (lb > lnb[-1])] = 0.0
+        # qT int b J0(qT b) W(b) db = 1/qT int x J0(x) W(x/qT) dx
+        out[s : s + chunk_elems] = (Wk * (x * w)[None, :]).sum(axis=1) / q
+    return out
+
+
+# --- FFTLog ------------------------------------------------------------------
+
+
+def _mellin_j0(s):
+    """ln of M(s) = int_0^inf x^(s-1) J0(x) dx = 2^(s-1) Gamma(s/2) / Gamma(1 - s/2),
+    defined for 0 < Re s < 3/2."""
+    from scipy.special import loggamma
+
+    return (s - 1.0) * np.log(2.0) + loggamma(s / 2.0) - loggamma(1.0 - s / 2.0)
+
+
+def _low_ringing(dlnb, ln_qb, bias):
+    """Shift ln(q0 b0) slightly so the Nyquist term of the kernel is real
+    (Hamilton's low-ringing condition)."""
+    y = np.pi / dlnb
+    arg = np.imag(_mellin_j0(bias + 1j * y))
+    k = np.round((arg - y * ln_qb) / np.pi)
+    return (arg - k * np.pi) / y
+
+
+def fftlog_grid(bT, W, kr=1.0, bias=1.25, low_ringing=True):
+    """H on the log-uniform qT grid conjugate to the (log-uniform) bT nodes.
+
+    Returns (qT_grid, H) with H of shape W.shape. The qT grid runs from
+    ~kr/bT_max to ~kr/bT_min. bias (0 < bias < 3/2) is the power of bT moved
+    into the J0 kernel: larger values suppress the small-bT edge, which is what
+    rings at high qT."""
+    lnb = np.log(np.asarray(bT, np.float64))
+    n = len(lnb)
+    dlnb = (lnb[-1] - lnb[0]) / (n - 1)
+    if not np.allclose(np.diff(lnb), dlnb, rtol=1e-6, atol=0.0):
+        raise ValueError("FFTLog needs log-uniform bT nodes")
+    # output qT_j = q0 exp(j dlnb) with q0 = kr / bT_max
+    ln_qb = np.log(kr) - (lnb[-1] - lnb[0])
+    if low_ringing:
+        ln_qb = _low_ringing(dlnb, ln_qb, bias)
+    lnq = ln_qb - lnb[0] + dlnb * np.arange(n)
+
+    # int b J0(q b) W db = int [b^(2-bias) W] b^bias J0(q b) db/b: expand the
+    # bracket in powers (b/b0)^(i eta_m), each of which transforms to
+    # q^(-bias - i eta_m) M(bias + i eta_m)
+    eta = 2.0 * np.pi * np.arange(n // 2 + 1) / (n * dlnb)
+    u = np.exp(_mellin_j0(bias + 1j * eta) - 1j * eta * ln_qb)
+    from scipy import fft
+
+    c = fft.rfft(np.exp((2.0 - bias) * lnb) * W, axis=-1, workers=-1)
+    H = fft.irfft(np.conj(c * u), n=n, axis=-1, workers=-1)
+    return np.exp(lnq), H * np.exp((1.0 - bias) * lnq)
+
+
+def _interp_rows(lnq_grid, F, rows, qT):
+    """Four-point Lagrange interpolation of F[rows] in ln qT."""
+    lq = np.log(qT)
+    i = np.clip(np.searchsorted(lnq_grid, lq) - 2, 0, len(lnq_grid) - 4)
+    xs = lnq_grid[i[:, None] + np.arange(4)]
+    ys = F[rows[:, None], i[:, None] + np.arange(4)]
+    out = np.zeros(len(rows))
+    for a in range(4):
+        la = np.ones(len(rows))
+        for b in range(4):
+            if a != b:
+                la *= (lq - xs[:, b]) / (xs[:, a] - xs[:, b])
+        out += la * ys[:, a]
+    return out
+
+
+def _fftlog(bT, W, rows, qT, kr, bias, chunk_rows):
+    urows, inv = np.unique(rows, return_inverse=True)
+    out = np.empty(len(rows))
+    err = np.empty(len(rows))
+    for s in range(0, len(urows), chunk_rows):
+        sel = (inv >= s) & (inv < s + chunk_rows)
+        block = W[urows[s : s + chunk_rows]].astype(np.float64)
+        q, H = fftlog_grid(bT, block, kr, bias)
+        # cross-checks: half the nodes (resolution), another bias (edge ringing)
+        q2, H2 = fftlog_grid(bT[::2], block[:, ::2], kr, bias)
+        q3, H3 = fftlog_grid(bT, block, kr, 1.0 if bias != 1.0 else 1.25)
+        if qT[sel].min() < q[0] or qT[sel].max() > q[-1]:
+            raise ValueError(
+                f"qT outside the FFTLog output range [{q[0]:.3g}, {q[-1]:.3g}]"
+            )
+        r = inv[sel] - s
+        out[sel] = _interp_rows(np.log(q), H, r, qT[sel])
+        err[sel] = np.maximum(
+            np.abs(out[sel] - _interp_rows(np.log(q2), H2, r, qT[sel])),
+            np.abs(out[sel] - _interp_rows(np.log(q3), H3, r, qT[sel])),
+        )
+    return out, err
+
+
+# --- front end ---------------------------------------------------------------
+
+
+def hankel(bT, W, qT, method="ogata", h=1e-3, kr=1.0, bias=1.25, chunk_mb=256):
+    """qT * int bT J0(qT bT) W(bT) dbT for every row of W; returns (H, err),
+    both of shape broadcast(W.shape[:-1], qT.shape).
+
+    ogata: step h; the value is computed at h/2 and err is its change from h.
+    fftlog: bT must be log-uniform; kr sets the output qT window
+    ~[kr/bT_max, kr/bT_min] and bias the power of bT moved into the kernel
+    (see fftlog_grid); err is the larger change from dropping every other node
+    or from switching the bias.
+
+    W is read in row chunks of ~chunk_mb (in float64) and never copied as a
+    whole, so a float32 or memory-mapped grid stays as it is.
+    """
+    bT = np.asarray(bT, np.float64)
+    W = np.asarray(W)
+    qT = np.asarray(qT, np.float64)
+    shape = np.broadcast_shapes(W.shape[:-1], qT.shape)
+    nbT = W.shape[-1]
+    W2 = W.reshape(-1, nbT)
+    rows = np.broadcast_to(np.arange(len(W2)).reshape(W.shape[:-1]), shape).ravel()
+    q = np.broadcast_to(qT, shape).ravel()
+    if np.any(q <= 0):
+        raise ValueError("qT must be > 0")
+
+    if method == "ogata":
+        lnb = np.log(bT)
+        # bytes per output point: a (nodes,) float64 work array, ~6 alive
+        chunk = max(1, int(chunk_mb * 2**20 / (6 * 8 * len(ogata_nodes(h / 2.0)[0]))))
+        H = _ogata(lnb, W2, rows, q, h / 2.0, chunk)
+        err = np.abs(H - _ogata(lnb, W2, rows, q, h, chunk))
+    elif method == "fftlog":
+        chunk = max(1, int(chunk_mb * 2**20 / (4 * 8 * nbT)))
+        H, err = _fftlog(bT, W2, rows, q, kr, bias, chunk)
+    else:
+        raise ValueError(f"Unknown method {method!r}, use 'ogata' or 'fftlog'")
+    return H.reshape(shape), err.reshape(shape)
@@ -32,16 +32,16 @@ def main():
     from scipy.interpolate import CubicSpline
     from scipy.integrate import cumulative_trapezoid
     from scipy.special import j0
-    from wremnants.postprocessing.scetlib_np import btgrid_cache
+    from point_index import PointIndex
+    import btgrid_mmap
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
-    grid = btgrid_cache.load(BTGRID)
-    for k in ("I_pert", "C_nu"):
-        np.nan_to_num(grid[k], copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    grid = btgrid_mmap.open_btgrid(BTGRID)  # memmaps, NaN-free
     bT = np.asarray(grid["bT"], np.float64)
     b_bar = np.asarray(grid["b_bar"], np.float64)
-    Ipert = np.asarray(grid["I_pert"][0], np.float64)
-    Cnu = np.asarray(grid["C_nu"][0], np.float64)
+    # only the bins used below are read from disk
+    Ipert = grid["I_pert"][0]
+    Cnu = grid["C_nu"][0]
     bins = grid["bins"]
     gnu = {k: v for k, v in GNU.items() if k != "np_model_nu"}
     eff = {k: v for k, v in EFF.items() if k != "np_model"}
@@ -53,13 +53,8 @@ def main():
     print(
         f"{'qT':>6} {'result':>12} {'|C|_max':>12} {'cancel=|C|max/|res|':>20} {'bT* (peak |g|)':>14}"
     )
-    for qT in QT:
-        ibin = min(
-            range(len(bins)),
-            key=lambda i: (
-                abs(bins[i][0] - Q) + abs(bins[i][1] - Y) + abs(bins[i][2] - qT)
-            ),
-        )
+    nearest = PointIndex.from_bins(bins).nearest(Q, Y, QT)
+    for qT, ibin in zip(QT, nearest):
         W = Ipert[ibin] * np.exp(Cnu[ibin] * gNP) * Feff
         Wf = CubicSpline(bT, W)(bfine)
         g = bfine * j0(qT * bfine) * Wf
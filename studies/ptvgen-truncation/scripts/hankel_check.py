@@ -13,7 +13,6 @@ with W(bT) = I_pert · exp(C_nu·γ_ν^NP(b_bar)) · F_eff(Y,b_bar).
 """
 
 import argparse
-import pickle
 import numpy as np
 
 BTGRID = "/scratch/submit/cms/wmass/scetlib_np/Z_COM13_CT18Z_N3p0LL_btgrid_fineall/"
@@ -44,22 +43,26 @@ def main():
     ap.add_argument("--Q", type=float, default=91.0)
     ap.add_argument("--Y", type=float, default=0.0)
     ap.add_argument("--nfine", type=int, default=400000)
+    ap.add_argument(
+        "--float32", action="store_true", help="Read the float32 I_pert/C_nu copy"
+    )
     args = ap.parse_args()
 
     from scipy.interpolate import CubicSpline
     from scipy.integrate import simpson as _simpson
     from scipy.special import j0
-    from wremnants.postprocessing.scetlib_np import btgrid_cache
+    from point_index import PointIndex
+    import btgrid_mmap
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
     print(f"[load] {args.btgrid}", flush=True)
-    grid = btgrid_cache.load(args.btgrid)
-    for k in ("I_pert", "C_nu"):
-        np.nan_to_num(grid[k], copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    # memmaps, NaN-free
+    grid = btgrid_mmap.open_btgrid(args.btgrid, float32=args.float32)
     bT = np.asarray(grid["bT"], np.float64)
     b_bar = np.asarray(grid["b_bar"], np.float64)
-    Ipert = np.asarray(grid["I_pert"][0], np.float64)
-    Cnu = np.asarray(grid["C_nu"][0], np.float64)
+    # only the bins used below are read from disk
+    Ipert = grid["I_pert"][0]
+    Cnu = grid["C_nu"][0]
     bins = grid["bins"]
     wS = fz_tf.simpson_weights(bT)
     print(
@@ -73,25 +76,11 @@ def main():
     gNP = fz_tf.gamma_nu_NP_tf(b_bar, gnu, np_model_nu=GNU["np_model_nu"]).numpy()
     Feff = fz_tf.F_eff_tf(args.Y, b_bar, eff, np_model=EFF["np_model"]).numpy()
 
-    sel = [
-        (i, b[2])
-        for i, b in enumerate(bins)
-        if abs(b[0] - args.Q) < 1e-6 and abs(b[1] - args.Y) < 1e-6
-    ]
-    sel.sort(key=lambda t: t[1])
+    rows = PointIndex.from_bins(bins).select(Q=args.Q, Y=args.Y)
+    sel = [(i, bins[i][2]) for i in rows]
     print(f"  (Q={args.Q}, Y={args.Y}): {len(sel)} qT bins", flush=True)
 
-    sp = pickle.load(open(args.pointmode, "rb"))["spectra"][0]
-
-    def pm_at(qT):
-        for k in sp:
-            if (
-                abs(k[0] - args.Q) < 1e-6
-                and abs(k[1] - args.Y) < 1e-6
-                and abs(k[2] - qT) < 1e-6
-            ):
-                return sp[k]
-        return np.nan
+    pointmode = PointIndex.from_pointspec(args.pointmode)
 
     bT_fine = np.linspace(bT.min(), bT.max(), args.nfine)
     print(
@@ -104,7 +93,7 @@ def main():
         s_ours = qT * np.sum(wS * (bT * j0(qT * bT)) * W)
         W_fine = CubicSpline(bT, W)(bT_fine)
         s_hi = qT * _simpson(bT_fine * j0(qT * bT_fine) * W_fine, x=bT_fine)
-        pm = pm_at(qT)
+        pm = float(pointmode.get(args.Q, args.Y, qT))
         r_op = s_ours / pm if pm else np.nan
         r_hp = s_hi / pm if pm else np.nan
         r_oh = s_ours / s_hi if s_hi else np.nan
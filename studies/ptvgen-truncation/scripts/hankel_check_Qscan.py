@@ -10,7 +10,6 @@ around qT/Q ~ 0.9-1.0. At Q=120 (transition at qT=120 > qT_max=100) there should
 little/no deficit; at Q=60 it should start ~qT 55-60.
 """
 
-import pickle
 import numpy as np
 
 BTGRID = "/scratch/submit/cms/wmass/scetlib_np/Z_COM13_CT18Z_N3p0LL_btgrid_fineall/"
@@ -40,41 +39,29 @@ def main():
     from scipy.interpolate import CubicSpline
     from scipy.integrate import simpson as _simpson
     from scipy.special import j0
-    from wremnants.postprocessing.scetlib_np import btgrid_cache
+    from point_index import PointIndex
+    import btgrid_mmap
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
-    grid = btgrid_cache.load(BTGRID)
-    for k in ("I_pert", "C_nu"):
-        np.nan_to_num(grid[k], copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    grid = btgrid_mmap.open_btgrid(BTGRID)  # memmaps, NaN-free
     bT = np.asarray(grid["bT"], np.float64)
     b_bar = np.asarray(grid["b_bar"], np.float64)
-    Ipert = np.asarray(grid["I_pert"][0], np.float64)
-    Cnu = np.asarray(grid["C_nu"][0], np.float64)
+    # only the bins used below are read from disk
+    Ipert = grid["I_pert"][0]
+    Cnu = grid["C_nu"][0]
     bins = grid["bins"]
     wS = fz_tf.simpson_weights(bT)
     bT_fine = np.linspace(bT.min(), bT.max(), 400000)
-    sp = pickle.load(open(POINTMODE, "rb"))["spectra"][0]
+    pointmode = PointIndex.from_pointspec(POINTMODE)
+    idx = PointIndex.from_bins(bins)
 
     gnu = {k: v for k, v in GNU.items() if k != "np_model_nu"}
     eff = {k: v for k, v in EFF.items() if k != "np_model"}
     gNP = fz_tf.gamma_nu_NP_tf(b_bar, gnu, np_model_nu=GNU["np_model_nu"]).numpy()
 
-    def pm_at(Q, qT):
-        for k in sp:
-            if abs(k[0] - Q) < 1e-6 and abs(k[1] - Y) < 1e-6 and abs(k[2] - qT) < 1e-6:
-                return sp[k]
-        return np.nan
-
     for Q in QS:
         Feff = fz_tf.F_eff_tf(Y, b_bar, eff, np_model=EFF["np_model"]).numpy()
-        sel = sorted(
-            [
-                (i, b[2])
-                for i, b in enumerate(bins)
-                if abs(b[0] - Q) < 1e-6 and abs(b[1] - Y) < 1e-6
-            ],
-            key=lambda t: t[1],
-        )
+        sel = [(i, bins[i][2]) for i in idx.select(Q=Q, Y=Y)]
         print(f"\n===== Q={Q} (transition qT≈Q={Q:.0f}); {len(sel)} qT bins =====")
         print(f"{'qT':>6} {'qT/Q':>6} {'ours/pm':>9} {'hi/pm':>9} {'ours/hi':>9}")
         for ibin, qT in sel:
@@ -85,7 +72,7 @@ def main():
             s_hi = qT * _simpson(
                 bT_fine * j0(qT * bT_fine) * CubicSpline(bT, W)(bT_fine), x=bT_fine
             )
-            pm = pm_at(Q, qT)
+            pm = float(pointmode.get(Q, Y, qT))
             print(
                 f"{qT:6.1f} {qT/Q:6.3f} {s_ours/pm:9.4f} {s_hi/pm:9.4f} {s_ours/s_hi:9.4f}"
             )
@@ -2,12 +2,16 @@
 integrand, or is 400k linear points not enough (=> more points WOULD help)?
 
 For Q=91, qT in {90,95,100}: reconstruct the real-b Hankel of the cached W(bT)
-with increasing fine-linear-grid N, plus scipy adaptive quad, and print result/pm.
- - plateaus (N-independent) != pm  => converged; genuine real-b-Hankel vs SCETlib gap.
- - drifts toward pm with N          => my integration under-resolved; more points help.
+with the batched Ogata quadrature at decreasing step h, plus FFTLog as an
+independent method, and print result/pm with the per-point error estimates.
+ - plateaus (h-independent) != pm  => converged; genuine real-b-Hankel vs SCETlib gap.
+ - drifts toward pm as h shrinks    => my integration under-resolved; more points help.
+The same transforms are then done for every (Y, qT) bin at Q in one call each
+(was: spline -> simpson on up to 6.4M linear nodes + scipy.quad, per qT point).
 """
 
-import pickle
+import time
+
 import numpy as np
 
 BTGRID = "/scratch/submit/cms/wmass/scetlib_np/Z_COM13_CT18Z_N3p0LL_btgrid_fineall/"
@@ -31,63 +35,74 @@ GNU = {
 }
 Q, Y = 91.0, 0.0
 QT = [90.0, 95.0, 100.0]
-NS = [200_000, 400_000, 800_000, 1_600_000, 3_200_000, 6_400_000]
+HS = [0.02, 0.01, 4e-3, 2e-3, 1e-3, 5e-4]
 
 
 def main():
-    from scipy.interpolate import CubicSpline
-    from scipy.integrate import simpson as _simpson, quad
-    from scipy.special import j0
-    from wremnants.postprocessing.scetlib_np import btgrid_cache
+    from hankel import hankel
+    from point_index import PointIndex
+    import btgrid_mmap
     from wremnants.postprocessing.scetlib_np import btgrid_tf as fz_tf
 
-    grid = btgrid_cache.load(BTGRID)
-    for k in ("I_pert", "C_nu"):
-        np.nan_to_num(grid[k], copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    grid = btgrid_mmap.open_btgrid(BTGRID)  # memmaps, NaN-free
     bT = np.asarray(grid["bT"], np.float64)
     b_bar = np.asarray(grid["b_bar"], np.float64)
-    Ipert = np.asarray(grid["I_pert"][0], np.float64)
-    Cnu = np.asarray(grid["C_nu"][0], np.float64)
-    bins = grid["bins"]
+    idx = PointIndex.from_bins(grid["bins"])
     gnu = {k: v for k, v in GNU.items() if k != "np_model_nu"}
     eff = {k: v for k, v in EFF.items() if k != "np_model"}
     gNP = fz_tf.gamma_nu_NP_tf(b_bar, gnu, np_model_nu=GNU["np_model_nu"]).numpy()
-    Feff = fz_tf.F_eff_tf(Y, b_bar, eff, np_model=EFF["np_model"]).numpy()
-    sp = pickle.load(open(POINTMODE, "rb"))["spectra"][0]
+    pointmode = PointIndex.from_pointspec(POINTMODE)
+
+    # every (Y, qT) bin at the grid Q nearest to Q (Y and qT play no part)
+    bins = np.asarray(grid["bins"], np.float64)
+    Qs = idx.axes["Q"] * idx.tol
+    Qn = float(Qs[np.argmin(np.abs(Qs - Q))])
+    sel = idx.select(Q=Qn)
+    Ys, qTs = bins[sel, 1], bins[sel, 2]
+    Feff = {
+        y: fz_tf.F_eff_tf(y, b_bar, eff, np_model=EFF["np_model"]).numpy()
+        for y in np.unique(Ys)
+    }
+    W = btgrid_mmap.rows(grid, "I_pert", sel)
+    W *= np.exp(btgrid_mmap.rows(grid, "C_nu", sel) * gNP)
+    W *= np.stack([Feff[y] for y in Ys])
+    print(f"{len(sel)} bins at Q={Qn:g}")
 
-    def pm_at(qT):
-        for k in sp:
-            if abs(k[0] - Q) < 1e-6 and abs(k[1] - Y) < 1e-6 and abs(k[2] - qT) < 1e-6:
-                return sp[k]
-        return np.nan
+    res = {}
+    for h in HS:
+        t0 = time.time()
+        res[h] = hankel(bT, W, qTs, method="ogata", h=h)
+        print(f"  ogata h={h:g}: {time.time() - t0:.1f}s")
+    try:
+        t0 = time.time()
+        res["fftlog"] = hankel(bT, W, qTs, method="fftlog")
+        print(f"  fftlog: {time.time() - t0:.1f}s")
+    except ValueError as e:
+        print(f"  fftlog skipped: {e}")
 
     for qT in QT:
-        ibin = min(
-            range(len(bins)),
-            key=lambda i: abs(bins[i][0] - Q)
-            + abs(bins[i][1] - Y)
-            + abs(bins[i][2] - qT),
-        )
-        W = Ipert[ibin] * np.exp(Cnu[ibin] * gNP) * Feff
-        spl = CubicSpline(bT, W)
-        pm = pm_at(qT)
+        i = int(np.argmin(np.abs(Ys - Y) + np.abs(qTs - qT)))
+        pm = float(pointmode.get(Q, Y, qT))
         print(f"\n=== Q={Q} qT={qT}  point-mode={pm:.6g} ===")
-        for N in NS:
-            bf = np.linspace(bT.min(), bT.max(), N)
-            s = qT * _simpson(bf * j0(qT * bf) * spl(bf), x=bf)
-            print(f"  N={N:>9,}  result={s:12.6g}  result/pm={s/pm:8.4f}")
-        # adaptive quad as an independent cross-check (limit high for oscillation)
-        val, err = quad(
-            lambda b: b * j0(qT * b) * float(spl(b)),
-            bT.min(),
-            bT.max(),
-            limit=20000,
-            epsabs=1e-12,
-            epsrel=1e-10,
-        )
-        s = qT * val
+        for key, (H, err) in res.items():
+            label = f"h={key:g}" if key != "fftlog" else "fftlog"
+            print(
+                f"  {label:>10}  result={H[i]:12.6g}  result/pm={H[i]/pm:8.4f}"
+                f"  (err~{err[i]:.2g})"
+            )
+
+    H, err = res[HS[-1]]
+    rel = err / np.maximum(np.abs(H), 1e-300)
+    worst = np.argsort(rel)[::-1][:5]
+    print(
+        f"\nall {len(sel)} bins, ogata h={HS[-1]:g}: median rel err {np.median(rel):.2g}"
+    )
+    for i in worst:
+        print(f"  worst: Y={Ys[i]:g} qT={qTs[i]:g}  H={H[i]:.6g}  rel err {rel[i]:.2g}")
+    if "fftlog" in res:
+        d = np.abs(res["fftlog"][0] - H) / np.maximum(np.abs(H), 1e-300)
         print(
-            f"  scipy.quad result={s:12.6g}  result/pm={s/pm:8.4f}  (err~{qT*err:.2g})"
+            f"  |fftlog - ogata| / |ogata|: median {np.median(d):.2g}, max {d.max():.2g}"
         )
 
 
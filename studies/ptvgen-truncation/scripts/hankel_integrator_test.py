@@ -4,7 +4,7 @@ np_factorization_clincher.py PROVED our NP factorization == SCETlib's internal N
 point-by-point in bT. So the tail gap (recon 0.00207 vs point-mode 0.00466 at qT=100, ratio
 0.444) is NOT the NP. It is one of:
   (I)  our cached I_pert (btgrid) differs from SCETlib's true perturbative integrand, or
-  (II) the Hankel numerics: our finite-range simpson/quad != SCETlib's DE oscillatory
+  (II) the Hankel numerics: our finite-range Ogata/FFTLog != SCETlib's DE oscillatory
        integrator on the ~486x deep-tail cancellation.
 
 Three numbers at each qT (full NP on, singular/resummed piece = card default 'sing'):
@@ -99,26 +99,13 @@ def set_np_off(qT_mod, sigma):
 
 
 def my_hankel(qt, bT_nodes, W_nodes):
-    """qT * int_0^inf bT J0(qT bT) W(bT) dbT via dense-simpson + scipy.quad(spline)."""
-    from scipy.special import j0
-    from scipy.integrate import simpson, quad
-    from scipy.interpolate import CubicSpline
+    """qT * int_0^inf bT J0(qT bT) W(bT) dbT via batched Ogata + FFTLog (hankel.py):
+    two independent methods, each with its own error estimate."""
+    from hankel import hankel
 
-    spl = CubicSpline(bT_nodes, W_nodes, extrapolate=False)
-    bmax = bT_nodes.max()
-    # dense simpson
-    xf = np.linspace(bT_nodes.min(), bmax, 4_000_000)
-    Wf = spl(xf)
-    Wf[np.isnan(Wf)] = 0.0
-    simp = qt * simpson(xf * j0(qt * xf) * Wf, x=xf)
-
-    # scipy.quad adaptive (independent method)
-    def integrand(b):
-        w = spl(b)
-        return 0.0 if np.isnan(w) else b * j0(qt * b) * w
-
-    q, qerr = quad(integrand, bT_nodes.min(), bmax, limit=400)
-    return simp, qt * q, qt * qerr
+    ogata, ogata_err = hankel(bT_nodes, W_nodes, qt, method="ogata")
+    fftlog, fftlog_err = hankel(bT_nodes, W_nodes, qt, method="fftlog")
+    return float(ogata), float(ogata_err), float(fftlog), float(fftlog_err)
 
 
 def main():
@@ -151,19 +138,23 @@ def main():
             sigma.resummed_bT_integrand(Q, Y, qt, bT.tolist()), dtype=float
         )
         sval = sigma(Q, Y, qt).val
-        simp, quadv, quaderr = my_hankel(qt, bT, W_full)
+        ogata, ogata_err, fftlog, fftlog_err = my_hankel(qt, bT, W_full)
 
         print(f"\n=== Q={Q} Y={Y} qT={qt} ===")
         print(f"  sval (SCETlib DE)          = {sval:.8g}")
-        print(f"  myH_scetlib (simpson)      = {simp:.8g}   /sval = {simp/sval:.4f}")
         print(
-            f"  myH_scetlib (scipy.quad)   = {quadv:.8g}   /sval = {quadv/sval:.4f}  (err~{quaderr:.1e})"
+            f"  myH_scetlib (ogata)        = {ogata:.8g}   /sval = {ogata/sval:.4f}  (err~{ogata_err:.1e})"
+        )
+        print(
+            f"  myH_scetlib (fftlog)       = {fftlog:.8g}   /sval = {fftlog/sval:.4f}  (err~{fftlog_err:.1e})"
         )
 
         results[f"W_full_{qt:.0f}"] = W_full
         results[f"sval_{qt:.0f}"] = sval
-        results[f"myH_scetlib_simp_{qt:.0f}"] = simp
-        results[f"myH_scetlib_quad_{qt:.0f}"] = quadv
+        results[f"myH_scetlib_ogata_{qt:.0f}"] = ogata
+        results[f"myH_scetlib_ogata_err_{qt:.0f}"] = ogata_err
+        results[f"myH_scetlib_fftlog_{qt:.0f}"] = fftlog
+        results[f"myH_scetlib_fftlog_err_{qt:.0f}"] = fftlog_err
 
         # cross-check tail damping: how much integrand is beyond bT=40?
         print(
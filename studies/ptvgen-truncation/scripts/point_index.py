@@ -0,0 +1,166 @@
+"""Vectorized (Q, Y, qT) lookups into SCETlib point-mode spectra and btgrid bins.
+
+Point-mode pkls hold {(Q, Y, qT): value} dicts ("spectra", one per variation)
+with ~558k float keys, and btgrid_cache grids a list of (Q, Y, qT) bins; both
+used to be searched with a linear scan and a float tolerance per query.
+PointIndex sorts the points into a structured array and quantizes each axis
+(to `tol`) onto its unique values, so a point is one int64 code
+iQ * nY * nqT + iY * nqT + iqT -- the layout of the btgrid npz's flat_idx --
+and exact lookups of thousands of triples are one searchsorted. Nearest-node
+queries go through a KD-tree with the L1 metric the scans used.
+
+    from point_index import PointIndex
+    pm = PointIndex.from_pointspec(POINTMODE)   # .npy-cached conversion
+    pm.get(Q, Y, qT)                            # values, NaN where missing
+    idx = PointIndex.from_bins(grid["bins"])
+    idx.nearest(Q, Y, qT)                       # row in grid["I_pert"][ivar]
+    idx.select(Q=91.0, Y=0.0)                   # rows of that cell, by qT
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+POINT_DTYPE = np.dtype(
+    [("Q", np.float64), ("Y", np.float64), ("qT", np.float64), ("value", np.float64)]
+)
+AXES = ("Q", "Y", "qT")
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".cache", "ptvgen_point_index")
+
+
+def _cache_path(path, ivar, cache_dir):
+    # keyed by the source's size and mtime: a rewritten pkl gets a new file
+    st = os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(
+        cache_dir, f"{stem}.var{ivar}.{st.st_size}_{st.st_mtime_ns}.npy"
+    )
+
+
+def pointspec_array(spectrum):
+    """{(Q, Y, qT): value} -> structured POINT_DTYPE array (unsorted)."""
+    out = np.empty(len(spectrum), POINT_DTYPE)
+    keys = np.array(list(spectrum.keys()), np.float64).reshape(-1, 3)
+    for i, ax in enumerate(AXES):
+        out[ax] = keys[:, i]
+    out["value"] = np.fromiter(
+        (float(v) for v in spectrum.values()), np.float64, len(spectrum)
+    )
+    return out
+
+
+def load_pointspec(path, ivar=0, cache_dir=None):
+    """Spectrum `ivar` of a point-mode pkl as a POINT_DTYPE array, converted
+    once and cached as .npy (default ~/.cache/ptvgen_point_index)."""
+    cache_dir = cache_dir or default_cache_dir()
+    cache = _cache_path(path, ivar, cache_dir)
+    if os.path.exists(cache):
+        return np.load(cache)
+    with open(path, "rb") as f:
+        arr = pointspec_array(pickle.load(f)["spectra"][ivar])
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{cache}.tmp{os.getpid()}.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, cache)
+    return arr
+
+
+class PointIndex:
+    """Exact (quantized) and nearest lookups of (Q, Y, qT) triples.
+
+    Row numbers returned by lookup/nearest/select refer to the order the
+    points were given in (i.e. the btgrid bin index, or the pointspec array
+    row); `points` is the same data sorted by (Q, Y, qT).
+    """
+
+    def __init__(self, Q, Y, qT, values=None, tol=1e-6):
+        Q, Y, qT = (np.asarray(a, np.float64).ravel() for a in (Q, Y, qT))
+        self.tol = tol
+        self.axes = {}
+        codes = np.zeros(len(Q), np.int64)
+        for ax, a in zip(AXES, (Q, Y, qT)):
+            q = self._quantize(a)
+            uniq = np.unique(q)
+            self.axes[ax] = uniq
+            codes = codes * len(uniq) + np.searchsorted(uniq, q)
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        if np.any(np.diff(self.codes) == 0):
+            raise ValueError(f"Duplicate (Q, Y, qT) points at tolerance {tol}")
+        self.rows = order
+        self.points = np.empty(len(order), POINT_DTYPE)
+        for ax, a in zip(AXES, (Q, Y, qT)):
+            self.points[ax] = a[order]
+        self.points["value"] = (
+            np.nan if values is None else np.asarray(values, np.float64)[order]
+        )
+        self._tree = None
+
+    @classmethod
+    def from_pointspec(cls, path, ivar=0, tol=1e-6, cache_dir=None):
+        arr = load_pointspec(path, ivar, cache_dir)
+        return cls(arr["Q"], arr["Y"], arr["qT"], arr["value"], tol=tol)
+
+    @classmethod
+    def from_bins(cls, bins, tol=1e-6):
+        """From a btgrid_cache bin list [(Q, Y, qT), ...]; rows are bin indices."""
+        b = np.asarray(bins, np.float64).reshape(-1, 3)
+        return cls(b[:, 0], b[:, 1], b[:, 2], tol=tol)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _quantize(self, x):
+        return np.rint(np.asarray(x, np.float64) / self.tol).astype(np.int64)
+
+    def _codes(self, Q, Y, qT):
+        Q, Y, qT = np.broadcast_arrays(*(np.asarray(a, np.float64) for a in (Q, Y, qT)))
+        codes = np.zeros(Q.shape, np.int64)
+        found = np.ones(Q.shape, bool)
+        for ax, a in zip(AXES, (Q, Y, qT)):
+            uniq = self.axes[ax]
+            q = self._quantize(a)
+            i = np.clip(np.searchsorted(uniq, q), 0, len(uniq) - 1)
+            found &= uniq[i] == q
+            codes = codes * len(uniq) + i
+        return codes, found
+
+    def _sorted_positions(self, Q, Y, qT):
+        codes, found = self._codes(Q, Y, qT)
+        pos = np.clip(np.searchsorted(self.codes, codes), 0, len(self.codes) - 1)
+        found &= self.codes[pos] == codes
+        return pos, found
+
+    def lookup(self, Q, Y, qT):
+        """Row of each (Q, Y, qT) triple (broadcast), -1 where there is none."""
+        pos, found = self._sorted_positions(Q, Y, qT)
+        return np.where(found, self.rows[pos], -1)
+
+    def get(self, Q, Y, qT, default=np.nan):
+        """Value at each (Q, Y, qT) triple (broadcast), `default` if missing."""
+        pos, found = self._sorted_positions(Q, Y, qT)
+        return np.where(found, self.points["value"][pos], default)
+
+    def nearest(self, Q, Y, qT, p=1):
+        """Row of the nearest point to each triple, in the L_p metric over the
+        raw (Q, Y, qT) values (default L1, as the linear scans did)."""
+        from scipy.spatial import cKDTree
+
+        if self._tree is None:
+            self._tree = cKDTree(np.column_stack([self.points[ax] for ax in AXES]))
+        Q, Y, qT = np.broadcast_arrays(*(np.asarray(a, np.float64) for a in (Q, Y, qT)))
+        _, pos = self._tree.query(np.stack([Q, Y, qT], axis=-1), p=p)
+        return self.rows[pos]
+
+    def select(self, Q=None, Y=None, qT=None):
+        """Rows whose given coordinates match (within tol), sorted by
+        (Q, Y, qT); e.g. select(Q=91, Y=0) is that cell's qT spectrum."""
+        mask = np.ones(len(self.points), bool)
+        for ax, v in zip(AXES, (Q, Y, qT)):
+            if v is not None:
+                mask &= self._quantize(self.points[ax]) == self._quantize(v)
+        return self.rows[mask]
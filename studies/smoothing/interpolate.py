@@ -14,20 +14,12 @@ import itertools
 
 sys.path.append("../../WRemnants/")
 
-from wums import ioutils
+from scripts.narf_io import load_results_h5py
 from wums import output_tools
 from wums import plot_tools
 from wums import boostHistHelpers as hh
 from utilities import parsing
 
-
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
 parser = argparse.ArgumentParser(description="Read in a hdf5 file.")
 parser.add_argument(
     "infile",
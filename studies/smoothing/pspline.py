@@ -2,11 +2,11 @@
 # First, let's implement the core N-dimensional tensor product structure
 
 import numpy as np
+import scipy.linalg
 import scipy.sparse as sp
-from scipy.sparse.linalg import spsolve
+from scipy.sparse.linalg import LinearOperator, cg, spsolve
 from scipy.interpolate import BSpline
 import warnings
-from itertools import product
 from functools import reduce
 
 """
@@ -25,113 +25,114 @@ import itertools
 
 sys.path.append("../../WRemnants/")
 
-from wums import ioutils
+from scripts.narf_io import load_results_h5py
 from wums import output_tools
 from wums import plot_tools
 from wums import boostHistHelpers as hh
 from utilities import parsing
 
 
-def load_results_h5py(h5file):
-    if "results" in h5file.keys():
-        return ioutils.pickle_load_h5py(h5file["results"])
-    else:
-        return {k: ioutils.pickle_load_h5py(v) for k, v in h5file.items()}
-
-
-parser = argparse.ArgumentParser(description="Read in a hdf5 file.")
-parser.add_argument(
-    "infile",
-    type=str,
-    help="hdf5 file.",
-)
-parser.add_argument(
-    "--checkpoint",
-    type=str,
-    default=None,
-    help="Directory containing checkpoint.pkl from which to initialize a regressor."
-    "Will start training from this checkpoint, inheriting regressor parameters,"
-    "but will impose this script's arguments to the regressor."
-    "Will overwrite the existing checkpoint.pkl.",
-)
-parser.add_argument(
-    "--select",
-    nargs="+",
-    dest="selection",
-    type=str,
-    default=None,
-    help="Apply a selection to the histograms, if the axis exists."
-    "This option can be applied to any of the axis, not necessarily one of the fitaxes, unlike --axlim."
-    "Use complex numbers for axis value, integers for bin number."
-    "e.g. --select 'ptll 0 10"
-    "e.g. --select 'ptll 0j 10j",
-)
-parser.add_argument(
-    "--refHistSelect",
-    nargs="+",
-    dest="refHistSelection",
-    type=str,
-    default=None,
-    help="Apply a selection to the reference histogram, if the axis exists."
-    "If left empty, the --select will apply to the reference hist.",
-)
-parser.add_argument("--hist", type=str, default="nominal", help="Histogram to fit.")
-parser.add_argument(
-    "--refHist", type=str, default=None, help="Fit the ratio of --hist to --refHist."
-)
-parser.add_argument(
-    "--axes", nargs="+", type=str, default=["ptll"], help="Axes to fit."
-)
-parser.add_argument(
-    "--plotAxes", nargs="+", type=str, default=None, help="Axes to plot."
-)
-parser.add_argument("--sample", type=str, default="ZmumuPostVFP", help="Sample to fit.")
-parser.add_argument("-l", "--lam", default=1000, help="Lambda value.")
-parser.add_argument(
-    "-k", "--knots-per-axis", nargs="+", default=None, help="Knots per axis value."
-)
-parser.add_argument("-d", "--degree", default=3, help="Degree value.")
-parser.add_argument(
-    "--rrange",
-    default=(0.5, 1.5),
-    type=float,
-    nargs=2,
-    help="Range for the ratio plot (default: 0.5, 1.5).",
-)
-parser.add_argument("--ylim", nargs=2, type=float, default=None, help="y limits.")
-parser.add_argument(
-    "-o",
-    "--outdir",
-    type=str,
-    default="./",
-    required=False,
-    help="Output directory for the plots. Default is current directory.",
-)
-parser.add_argument(
-    "-p",
-    "--postfix",
-    type=str,
-    default=None,
-    help="Postfix to add to the output file names.",
-)
-parser.add_argument(
-    "--forceName",
-    action="store_true",
-    help="Force output name.",
-)
-args = parser.parse_args()
-
-
-with h5py.File(args.infile, "r") as h5file:
-    results = load_results_h5py(h5file)
-    print(f"Samples in file: {results.keys()}\n")
-    h = results[args.sample]["output"][args.hist].get()
-    if args.refHist:
-        h_ref = results[args.sample]["output"][args.refHist].get()
+def add_input_args(parser):
+    """Arguments selecting and preparing the histogram to smooth; shared with
+    pspline_search.py."""
+    parser.add_argument(
+        "infile",
+        type=str,
+        help="hdf5 file.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Directory containing checkpoint.pkl from which to initialize a regressor."
+        "Will start training from this checkpoint, inheriting regressor parameters,"
+        "but will impose this script's arguments to the regressor."
+        "Will overwrite the existing checkpoint.pkl.",
+    )
+    parser.add_argument(
+        "--select",
+        nargs="+",
+        dest="selection",
+        type=str,
+        default=None,
+        help="Apply a selection to the histograms, if the axis exists."
+        "This option can be applied to any of the axis, not necessarily one of the fitaxes, unlike --axlim."
+        "Use complex numbers for axis value, integers for bin number."
+        "e.g. --select 'ptll 0 10"
+        "e.g. --select 'ptll 0j 10j",
+    )
+    parser.add_argument(
+        "--refHistSelect",
+        nargs="+",
+        dest="refHistSelection",
+        type=str,
+        default=None,
+        help="Apply a selection to the reference histogram, if the axis exists."
+        "If left empty, the --select will apply to the reference hist.",
+    )
+    parser.add_argument("--hist", type=str, default="nominal", help="Histogram to fit.")
+    parser.add_argument(
+        "--refHist",
+        type=str,
+        default=None,
+        help="Fit the ratio of --hist to --refHist.",
+    )
+    parser.add_argument(
+        "--axes", nargs="+", type=str, default=["ptll"], help="Axes to fit."
+    )
+    parser.add_argument(
+        "--sample", type=str, default="ZmumuPostVFP", help="Sample to fit."
+    )
+    return parser
 
-# needed for the weights
-if h.storage_type != hist.storage.Weight and h.storage_type != hist.storage.Double:
-    raise Exception()
+
+def make_parser():
+    parser = argparse.ArgumentParser(description="Read in a hdf5 file.")
+    add_input_args(parser)
+    parser.add_argument(
+        "--plotAxes", nargs="+", type=str, default=None, help="Axes to plot."
+    )
+    parser.add_argument("-l", "--lam", default=1000, help="Lambda value.")
+    parser.add_argument(
+        "-k", "--knots-per-axis", nargs="+", default=None, help="Knots per axis value."
+    )
+    parser.add_argument("-d", "--degree", default=3, help="Degree value.")
+    parser.add_argument(
+        "--solver",
+        choices=["sparse", "kron"],
+        default="sparse",
+        help="P-spline solver: exact sparse solve of the full tensor system (default), "
+        "or conjugate gradients using only the per-axis matrices (for 4D+ histograms).",
+    )
+    parser.add_argument(
+        "--rrange",
+        default=(0.5, 1.5),
+        type=float,
+        nargs=2,
+        help="Range for the ratio plot (default: 0.5, 1.5).",
+    )
+    parser.add_argument("--ylim", nargs=2, type=float, default=None, help="y limits.")
+    parser.add_argument(
+        "-o",
+        "--outdir",
+        type=str,
+        default="./",
+        required=False,
+        help="Output directory for the plots. Default is current directory.",
+    )
+    parser.add_argument(
+        "-p",
+        "--postfix",
+        type=str,
+        default=None,
+        help="Postfix to add to the output file names.",
+    )
+    parser.add_argument(
+        "--forceName",
+        action="store_true",
+        help="Force output name.",
+    )
+    return parser
 
 
 # prepare the histogram
@@ -159,18 +160,33 @@ def prepare_hist(_h, axes, selection):
     return _h, _h_unroll
 
 
-h, h_unroll = prepare_hist(h, args.axes, args.selection)
-if args.refHist:
-    h_ref, _ = prepare_hist(
-        h_ref,
-        args.axes,
-        args.refHistSelection if args.refHistSelection else args.selection,
-    )
-    h = hh.divideHists(h, h_ref)
+def load_input_hist(args):
+    """Read --hist (and --refHist) of --sample, apply the selections and
+    projections, and return the histogram to smooth (the ratio if --refHist)."""
+    with h5py.File(args.infile, "r") as h5file:
+        results = load_results_h5py(h5file)
+        print(f"Samples in file: {results.keys()}\n")
+        h = results[args.sample]["output"][args.hist].get()
+        if args.refHist:
+            h_ref = results[args.sample]["output"][args.refHist].get()
+
+    # needed for the weights
+    if h.storage_type != hist.storage.Weight and h.storage_type != hist.storage.Double:
+        raise Exception()
+
+    h, h_unroll = prepare_hist(h, args.axes, args.selection)
+    if args.refHist:
+        h_ref, _ = prepare_hist(
+            h_ref,
+            args.axes,
+            args.refHistSelection if args.refHistSelection else args.selection,
+        )
+        h = hh.divideHists(h, h_ref)
+    return h
 
 
 def smooth_boost_histogram_nd_psplines(
-    hist, lambda_smoothing=1000.0, degree=3, knots_per_axis=None
+    hist, lambda_smoothing=1000.0, degree=3, knots_per_axis=None, solver="sparse"
 ):
     """
     Smooth an N-dimensional boost histogram using penalized B-splines (P-splines).
@@ -196,6 +212,11 @@ def smooth_boost_histogram_nd_psplines(
     knots_per_axis : int or list, optional
         Number of interior knots per axis. If None, automatically determined as
         min(n_bins//3, 15) for each axis, with minimum of 4 knots.
+    solver : {"sparse", "kron"}, default="sparse"
+        "sparse" builds the tensor design and system matrices and solves them
+        exactly with spsolve (reference). "kron" solves the same normal
+        equations by conjugate gradients applying only the 1D matrices per
+        axis, so memory scales with the number of coefficients, not its square.
 
     Returns:
     --------
@@ -317,10 +338,11 @@ def smooth_boost_histogram_nd_psplines(
         1024**3
     )  # 8 bytes per float64
 
-    if estimated_memory_gb > 100.0:
+    if solver == "sparse" and estimated_memory_gb > 100.0:
         warnings.warn(
             f"Estimated memory requirement: {estimated_memory_gb:.1f} GB. "
-            f"Consider reducing knots_per_axis for dimensions with many knots."
+            f"Consider reducing knots_per_axis for dimensions with many knots, "
+            f"or using solver='kron'."
         )
 
     print(f"Using knots per axis: {knots_per_axis}")
@@ -333,7 +355,7 @@ def smooth_boost_histogram_nd_psplines(
 
     try:
         return _smooth_nd_psplines_tensor(
-            values, centers, lambdas, degrees, knots_per_axis
+            values, centers, lambdas, degrees, knots_per_axis, solver=solver
         )
     except (np.linalg.LinAlgError, MemoryError) as e:
         raise RuntimeError(
@@ -366,25 +388,33 @@ def _create_nd_knot_vectors(centers_list, knots_per_axis, degrees):
     return knot_vectors
 
 
-def _build_nd_design_matrices(centers_list, knot_vectors, degrees):
-    """Build 1D design matrices for each dimension."""
+def _build_nd_design_matrices(centers_list, knot_vectors, degrees, extrapolate=False):
+    """Build sparse 1D B-spline design matrices for each dimension."""
     design_matrices = []
 
     for centers, knots, degree in zip(centers_list, knot_vectors, degrees):
-        n_basis = len(knots) - degree - 1
-        B = np.zeros((len(centers), n_basis))
+        B = BSpline.design_matrix(
+            np.asarray(centers, dtype=float), knots, degree, extrapolate=extrapolate
+        )
+        design_matrices.append(B.tocsr())
 
-        for i, x in enumerate(centers):
-            for j in range(n_basis):
-                try:
-                    basis_spline = BSpline.basis_element(knots[j : j + degree + 2])
-                    B[i, j] = basis_spline(x)
-                except:
-                    B[i, j] = 0.0
+    return design_matrices
 
-        design_matrices.append(B)
 
-    return design_matrices
+def _mode_product(tensor, M, axis):
+    """Contract axis `axis` of tensor with the columns of M (the n-mode product
+    M x_axis tensor), so that axis gets length M.shape[0]."""
+    M = M.toarray() if sp.issparse(M) else np.asarray(M)
+    return np.moveaxis(np.tensordot(M, tensor, axes=(1, axis)), 0, axis)
+
+
+def _tensor_apply(coeff_tensor, matrices):
+    """Apply one matrix per axis to a coefficient tensor, i.e.
+    (B_0 ⊗ ... ⊗ B_{n-1}) c without forming the Kronecker product."""
+    result = coeff_tensor
+    for axis, M in enumerate(matrices):
+        result = _mode_product(result, M, axis)
+    return result
 
 
 def _build_nd_penalty_matrices(n_basis_list):
@@ -418,7 +448,65 @@ def _kronecker_chain(matrices):
         return result
 
 
-def _smooth_nd_psplines_tensor(values, centers_list, lambdas, degrees, knots_per_axis):
+def _solve_kron_cg(values, design_matrices, penalty_matrices, lambdas, tol, maxiter):
+    """Solve (B^T B + P_total) c = B^T y by conjugate gradients using only the
+    1D matrices.
+
+    For gridded data B = B_0 ⊗ ... ⊗ B_{n-1}, so B^T B = ⊗ G_d with
+    G_d = B_d^T B_d, and every term of the normal equations is applied to the
+    coefficient tensor as one small matrix per axis (n-mode products). Neither
+    the tensor design matrix nor the system matrix is formed, memory stays at
+    a few coefficient-sized tensors. Jacobi preconditioned.
+    """
+    n_basis_list = [B.shape[1] for B in design_matrices]
+    n_coef = int(np.prod(n_basis_list))
+    grams = [(B.T @ B).toarray() for B in design_matrices]
+
+    def matvec(c):
+        c = c.reshape(n_basis_list)
+        out = _tensor_apply(c, grams)
+        for dim, (lam, P) in enumerate(zip(lambdas, penalty_matrices)):
+            if lam > 0:
+                out = out + lam * _mode_product(c, P, dim)
+        return out.ravel()
+
+    # diag(A) = ⊗ diag(G_d) + sum_d lambda_d (1 ⊗ ... ⊗ diag(P_d) ⊗ ... ⊗ 1)
+    diag = reduce(np.multiply.outer, [np.diag(G) for G in grams])
+    for dim, (lam, P) in enumerate(zip(lambdas, penalty_matrices)):
+        shape = [1] * len(n_basis_list)
+        shape[dim] = n_basis_list[dim]
+        diag = diag + lam * np.diag(P).reshape(shape)
+    inv_diag = 1.0 / diag.ravel()
+
+    A = LinearOperator((n_coef, n_coef), matvec=matvec, dtype=float)
+    M = LinearOperator((n_coef, n_coef), matvec=lambda r: inv_diag * r, dtype=float)
+    b = _tensor_apply(values, [B.T for B in design_matrices]).ravel()
+
+    n_iter = 0
+
+    def count(_):
+        nonlocal n_iter
+        n_iter += 1
+
+    coefficients, info = cg(A, b, rtol=tol, maxiter=maxiter, M=M, callback=count)
+    if info > 0:
+        raise np.linalg.LinAlgError(
+            f"Conjugate gradients did not converge to rtol={tol} in {info} iterations"
+        )
+    print(f"Conjugate gradients converged in {n_iter} iterations")
+    return coefficients
+
+
+def _smooth_nd_psplines_tensor(
+    values,
+    centers_list,
+    lambdas,
+    degrees,
+    knots_per_axis,
+    solver="sparse",
+    tol=1e-10,
+    maxiter=None,
+):
     """Core N-dimensional P-splines smoothing using tensor products."""
 
     ndim = len(centers_list)
@@ -435,69 +523,79 @@ def _smooth_nd_psplines_tensor(values, centers_list, lambdas, degrees, knots_per
     # Build penalty matrices
     penalty_matrices = _build_nd_penalty_matrices(n_basis_list)
 
-    print(f"Building {ndim}D tensor system...")
-
-    # Vectorize the data (flatten in a way consistent with Kronecker structure)
-    # For N-D tensor products, we need to be careful about axis ordering
-    y_vec = values.flatten("C")  # C-order (row-major) flattening
-
-    # Build tensor product design matrix using Kronecker products
-    # B_total = B_0 ⊗ B_1 ⊗ ... ⊗ B_{n-1}
-    print("Building tensor design matrix...")
-    B_matrices_sparse = [sp.csr_matrix(B) for B in design_matrices]
-    B_tensor = _kronecker_chain(B_matrices_sparse)
-
-    print(f"Design matrix shape: {B_tensor.shape}")
-
-    # Build penalty matrix using Kronecker products
-    # For each dimension i, we add lambda_i * (I ⊗ ... ⊗ I ⊗ P_i ⊗ I ⊗ ... ⊗ I)
-    print("Building penalty matrices...")
-
-    # Start with zero penalty matrix
-    total_penalty = sp.csr_matrix((np.prod(n_basis_list), np.prod(n_basis_list)))
-
-    for dim, (lam, P) in enumerate(zip(lambdas, penalty_matrices)):
-        if lam > 0:
-            # Build Kronecker product for this dimension's penalty
-            identity_matrices = []
-            for d in range(ndim):
-                if d == dim:
-                    identity_matrices.append(sp.csr_matrix(P))
-                else:
-                    identity_matrices.append(sp.eye(n_basis_list[d]))
-
-            P_tensor = _kronecker_chain(identity_matrices)
-            total_penalty += lam * P_tensor
-
-    print("Solving penalized system...")
-
-    # Solve the penalized least squares system
-    # (B^T B + P_total) c = B^T y
-    A = B_tensor.T @ B_tensor + total_penalty
-    b = B_tensor.T @ y_vec
-
-    # Ensure A is in proper sparse format for solver
-    A = A.tocsr()
-
-    # Solve the system
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", sp.SparseEfficiencyWarning)
-        coefficients = spsolve(A, b)
+    if solver == "kron":
+        print(f"Solving {ndim}D system with Kronecker-structured CG...")
+        coefficients = _solve_kron_cg(
+            values, design_matrices, penalty_matrices, lambdas, tol, maxiter
+        )
+    elif solver == "sparse":
+        print(f"Building {ndim}D tensor system...")
+
+        # Vectorize the data (flatten in a way consistent with Kronecker structure)
+        # For N-D tensor products, we need to be careful about axis ordering
+        y_vec = values.flatten("C")  # C-order (row-major) flattening
+
+        # Build tensor product design matrix using Kronecker products
+        # B_total = B_0 ⊗ B_1 ⊗ ... ⊗ B_{n-1}
+        print("Building tensor design matrix...")
+        B_matrices_sparse = [sp.csr_matrix(B) for B in design_matrices]
+        B_tensor = _kronecker_chain(B_matrices_sparse)
+
+        print(f"Design matrix shape: {B_tensor.shape}")
+
+        # Build penalty matrix using Kronecker products
+        # For each dimension i, we add lambda_i * (I ⊗ ... ⊗ I ⊗ P_i ⊗ I ⊗ ... ⊗ I)
+        print("Building penalty matrices...")
+
+        # Start with zero penalty matrix
+        total_penalty = sp.csr_matrix((np.prod(n_basis_list), np.prod(n_basis_list)))
+
+        for dim, (lam, P) in enumerate(zip(lambdas, penalty_matrices)):
+            if lam > 0:
+                # Build Kronecker product for this dimension's penalty
+                identity_matrices = []
+                for d in range(ndim):
+                    if d == dim:
+                        identity_matrices.append(sp.csr_matrix(P))
+                    else:
+                        identity_matrices.append(sp.eye(n_basis_list[d]))
+
+                P_tensor = _kronecker_chain(identity_matrices)
+                total_penalty += lam * P_tensor
+
+        print("Solving penalized system...")
+
+        # Solve the penalized least squares system
+        # (B^T B + P_total) c = B^T y
+        A = B_tensor.T @ B_tensor + total_penalty
+        b = B_tensor.T @ y_vec
+
+        # Ensure A is in proper sparse format for solver
+        A = A.tocsr()
+
+        # Solve the system
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", sp.SparseEfficiencyWarning)
+            coefficients = spsolve(A, b)
+    else:
+        raise ValueError(f"Unknown solver '{solver}', expected 'sparse' or 'kron'")
 
     # Compute smoothed values
     print("Computing smoothed values...")
-    smoothed_vec = B_tensor @ coefficients
-    # smoothed_values = smoothed_vec.reshape(values.shape, order='C')
-    smoothed_values = smoothed_vec.reshape(values.shape)
+    coeff_tensor = coefficients.reshape(n_basis_list, order="C")
+    smoothed_values = _tensor_apply(coeff_tensor, design_matrices)
 
     # Create N-dimensional evaluation function
-    def spline_nd_func(*args):
+    def spline_nd_func(*args, grid=False):
         """
         Evaluate N-D spline at given points.
 
         Args can be:
         - spline_nd_func(x1, x2, ..., xN) for individual coordinates
         - spline_nd_func([x1, x2, ..., xN]) for array of coordinates
+        With grid=True the xi are per-axis grids and the result has shape
+        (len(x1), ..., len(xN)), evaluated as one mode product per axis.
+        Points outside the fitted range are extrapolated.
         """
         if len(args) == 1 and hasattr(args[0], "__len__") and len(args[0]) == ndim:
             # Single point as array
@@ -510,48 +608,25 @@ def _smooth_nd_psplines_tensor(values, centers_list, lambdas, degrees, knots_per
                 f"Expected {ndim} coordinates or single {ndim}-element array"
             )
 
+        # Evaluate each 1D basis at the given points
+        basis_values = _build_nd_design_matrices(
+            eval_points, knot_vectors, degrees, extrapolate=True
+        )
+
+        if grid:
+            return _tensor_apply(coeff_tensor, basis_values)
+
         # Check that all coordinate arrays have the same length
         n_points = len(eval_points[0])
         if not all(len(pts) == n_points for pts in eval_points):
             raise ValueError("All coordinate arrays must have the same length")
 
-        # Evaluate each 1D basis at the given points
-        basis_values = []
-        for dim, (points, knots, degree) in enumerate(
-            zip(eval_points, knot_vectors, degrees)
-        ):
-            basis_vals = np.zeros((n_points, n_basis_list[dim]))
-            for i, x in enumerate(points):
-                for j in range(n_basis_list[dim]):
-                    try:
-                        basis_spline = BSpline.basis_element(knots[j : j + degree + 2])
-                        basis_vals[i, j] = basis_spline(x)
-                    except:
-                        basis_vals[i, j] = 0.0
-            basis_values.append(basis_vals)
-
-        # Compute tensor product evaluation
-        # For each point, compute the product of all 1D basis values
-        result = np.zeros(n_points)
-
-        # Reshape coefficients for tensor evaluation
-        coeff_tensor = coefficients.reshape(n_basis_list, order="C")
-
-        for pt_idx in range(n_points):
-            # Get basis values for this point in all dimensions
-            pt_basis = [basis_vals[pt_idx, :] for basis_vals in basis_values]
-
-            # Compute tensor contraction: sum over all basis indices
-            val = 0.0
-            for indices in product(*[range(n) for n in n_basis_list]):
-                # Product of basis values for these indices
-                basis_prod = np.prod(
-                    [pt_basis[dim][idx] for dim, idx in enumerate(indices)]
-                )
-                # Add contribution from this basis combination
-                val += coeff_tensor[indices] * basis_prod
-
-            result[pt_idx] = val
+        # Contract the first axis to (points, n_1, ..., n_{N-1}), then each
+        # further axis point by point with its own basis row.
+        result = _mode_product(coeff_tensor, basis_values[0], 0)
+        for B in basis_values[1:]:
+            B = B.toarray()
+            result = np.einsum("pj...,pj->p...", result, B)
 
         return result[0] if n_points == 1 else result
 
@@ -560,63 +635,163 @@ def _smooth_nd_psplines_tensor(values, centers_list, lambdas, degrees, knots_per
     return smoothed_values, spline_nd_func
 
 
-smoothed_values, spline_nd_func = smooth_boost_histogram_nd_psplines(
-    h, lambda_smoothing=args.lam, degree=args.degree, knots_per_axis=args.knots_per_axis
-)
-h_pred = copy.deepcopy(h)
-h_pred.values()[...] = smoothed_values
-
-if args.plotAxes:
-    h_pred = h_pred.project(*args.plotAxes)
-    h_pred = hh.normalize(h_pred, scale=np.prod(h_pred.values().shape))
-    h = h.project(*args.plotAxes)
-    h = hh.normalize(h, scale=np.prod(h_pred.values().shape))
-
-h_pred_unroll = hh.unrolledHist(h_pred)
-h_unroll = hh.unrolledHist(h)
-
-label = f"p-spline smoothed\n$\\lambda$={args.lam}, knots per axis={args.knots_per_axis}, degree={args.degree}"
-fig = plot_tools.makePlotWithRatioToRef(
-    [h_unroll, h_pred_unroll],
-    ["Data", label],
-    ["black", "red"],
-    xlabel="Bin",
-    ylim=args.ylim,
-    yerr=False,
-    base_size=10,
-    rrange=[args.rrange],
-)
-if not os.path.isdir(args.outdir):
-    os.makedirs(args.outdir)
-plot_tools.save_pdf_and_png(
-    args.outdir,
-    f"results_pspline_{args.postfix}" if args.postfix else f"results_pspline",
-    fig,
-)
-
-# unique identifier to store run results, input histogram
-run_id = datetime.now().strftime("%y%m%d_%H%M")
-if args.forceName:
-    run_id = f"{args.postfix}"
-elif args.postfix:
-    run_id += f"_{args.postfix}"
-
-odir = os.path.join("pspline", f"{run_id}")
-if not os.path.isdir(odir):
-    os.makedirs(odir)
-output_tools.write_lz4_pkl_output(
-    os.path.join(odir, "hist"),
-    "output",
-    {
-        "h_pred": h_pred,
-        "h_pred_unroll": h_pred_unroll,
-        "isratio": True if args.refHist else False,
-        "h": h,
-        "h_unroll": h_unroll,
-        "lambda": args.lam,
-        "knots": args.knots_per_axis,
-        "degree": args.degree,
-    },
-    "./",
-    args,
-)
+def _gram_well_conditioned(B, rcond=1e-10):
+    """Whether B^T B of one axis is safely positive definite. It is singular
+    when the axis has more basis functions than bins, or a basis function
+    with no bin centre in its support."""
+    w = np.linalg.eigvalsh((B.T @ B).toarray())
+    return w[0] > rcond * w[-1]
+
+
+def pspline_lambda_path(values, centers_list, knots_per_axis, degrees, max_coef=8000):
+    """Precompute the P-spline system of one knot configuration so that fits
+    for any common lambda are cheap.
+
+    With G = B^T B and P = sum_d (I ⊗ ... ⊗ P_d ⊗ ... ⊗ I), the generalized
+    eigendecomposition P V = G V diag(s), V^T G V = I (Demmler-Reinsch) gives
+    (G + lambda P)^-1 = V diag(1 / (1 + lambda s)) V^T. It is computed once
+    (dense, so limited to max_coef coefficients). It needs G positive
+    definite; when any axis' B^T B is singular (more basis functions than
+    bins), each lambda is instead a Cholesky solve of G + lambda P, as in
+    the sparse solve.
+
+    Returns fit(lam) -> (smoothed values, effective degrees of freedom), the
+    latter being trace of the hat matrix, trace((G + lambda P)^-1 G), i.e.
+    sum_i 1 / (1 + lambda s_i).
+    """
+    knot_vectors = _create_nd_knot_vectors(centers_list, knots_per_axis, degrees)
+    design_matrices = _build_nd_design_matrices(centers_list, knot_vectors, degrees)
+    n_basis_list = [B.shape[1] for B in design_matrices]
+    n_coef = int(np.prod(n_basis_list))
+    if n_coef > max_coef:
+        raise ValueError(
+            f"{n_coef} coefficients exceed max_coef={max_coef} for the dense "
+            f"lambda path, use smooth_boost_histogram_nd_psplines instead"
+        )
+    penalty_matrices = _build_nd_penalty_matrices(n_basis_list)
+
+    G = reduce(np.kron, [(B.T @ B).toarray() for B in design_matrices])
+    P = np.zeros((n_coef, n_coef))
+    for dim, P_d in enumerate(penalty_matrices):
+        P += reduce(
+            np.kron,
+            [P_d if d == dim else np.eye(n) for d, n in enumerate(n_basis_list)],
+        )
+    Bty = _tensor_apply(values, [B.T for B in design_matrices]).ravel()
+
+    if not all(_gram_well_conditioned(B) for B in design_matrices):
+
+        def fit(lam):
+            factor = scipy.linalg.cho_factor(G + float(lam) * P)
+            coeff_tensor = scipy.linalg.cho_solve(factor, Bty).reshape(n_basis_list)
+            edf = np.trace(scipy.linalg.cho_solve(factor, G))
+            return _tensor_apply(coeff_tensor, design_matrices), float(edf)
+
+        return fit
+
+    s, V = scipy.linalg.eigh(P, G)
+    s = np.clip(s, 0.0, None)
+    Vb = V.T @ Bty
+
+    def fit(lam):
+        shrink = 1.0 / (1.0 + float(lam) * s)
+        coeff_tensor = (V @ (shrink * Vb)).reshape(n_basis_list)
+        return _tensor_apply(coeff_tensor, design_matrices), float(np.sum(shrink))
+
+    return fit
+
+
+def plot_smoothed(
+    h, h_pred, label, outdir, postfix=None, plot_axes=None, ylim=None, rrange=(0.5, 1.5)
+):
+    """Plot the unrolled input and smoothed histograms with their ratio.
+
+    Returns (h, h_pred, h_unroll, h_pred_unroll) after the optional projection
+    on plot_axes, as stored in the output pkl.
+    """
+    if plot_axes:
+        h_pred = h_pred.project(*plot_axes)
+        h_pred = hh.normalize(h_pred, scale=np.prod(h_pred.values().shape))
+        h = h.project(*plot_axes)
+        h = hh.normalize(h, scale=np.prod(h_pred.values().shape))
+
+    h_pred_unroll = hh.unrolledHist(h_pred)
+    h_unroll = hh.unrolledHist(h)
+
+    fig = plot_tools.makePlotWithRatioToRef(
+        [h_unroll, h_pred_unroll],
+        ["Data", label],
+        ["black", "red"],
+        xlabel="Bin",
+        ylim=ylim,
+        yerr=False,
+        base_size=10,
+        rrange=[rrange],
+    )
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    plot_tools.save_pdf_and_png(
+        outdir,
+        f"results_pspline_{postfix}" if postfix else f"results_pspline",
+        fig,
+    )
+    plt.close(fig)
+    return h, h_pred, h_unroll, h_pred_unroll
+
+
+def main():
+    args = make_parser().parse_args()
+    h = load_input_hist(args)
+
+    smoothed_values, spline_nd_func = smooth_boost_histogram_nd_psplines(
+        h,
+        lambda_smoothing=args.lam,
+        degree=args.degree,
+        knots_per_axis=args.knots_per_axis,
+        solver=args.solver,
+    )
+    h_pred = copy.deepcopy(h)
+    h_pred.values()[...] = smoothed_values
+
+    label = f"p-spline smoothed\n$\\lambda$={args.lam}, knots per axis={args.knots_per_axis}, degree={args.degree}"
+    h, h_pred, h_unroll, h_pred_unroll = plot_smoothed(
+        h,
+        h_pred,
+        label,
+        args.outdir,
+        postfix=args.postfix,
+        plot_axes=args.plotAxes,
+        ylim=args.ylim,
+        rrange=args.rrange,
+    )
+
+    # unique identifier to store run results, input histogram
+    run_id = datetime.now().strftime("%y%m%d_%H%M")
+    if args.forceName:
+        run_id = f"{args.postfix}"
+    elif args.postfix:
+        run_id += f"_{args.postfix}"
+
+    odir = os.path.join("pspline", f"{run_id}")
+    if not os.path.isdir(odir):
+        os.makedirs(odir)
+    output_tools.write_lz4_pkl_output(
+        os.path.join(odir, "hist"),
+        "output",
+        {
+            "h_pred": h_pred,
+            "h_pred_unroll": h_pred_unroll,
+            "isratio": True if args.refHist else False,
+            "h": h,
+            "h_unroll": h_unroll,
+            "lambda": args.lam,
+            "knots": args.knots_per_axis,
+            "degree": args.degree,
+        },
+        "./",
+        args,
+    )
+
+
+if __name__ == "__main__":
+    main()
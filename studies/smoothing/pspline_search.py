@@ -1,88 +1,210 @@
-import os
+"""
+In-process hyperparameter search for the P-spline smoothing of pspline.py.
+
+The histogram is read and prepared once. Each (knots per axis, degree)
+configuration gets its design and penalty matrices built and its system
+factorized once (pspline.pspline_lambda_path), after which every lambda costs a
+matrix-vector product. Configurations are spread over a process pool. Each
+point is scored by RMS, effective degrees of freedom, GCV and AIC. A summary
+table is written, along with the usual pspline_search_<date>.pkl of
+[((lam, knots, degree), rms)] read by pspline_plot.py. Plots are made only
+for the Pareto front in (RMS, edf).
+
+e.g.
+python studies/smoothing/pspline_search.py $WREM_BASE/wremnants-data/data/angularCoefficients/w_z_gen_dists_maxFiles_m1_pdfsByHelicity.hdf5 \
+    --select 'pdfVar pdf0CT18Z' --hist nominal_gen_pdfCT18Z --refHist nominal_gen_pdf_uncorr --refHistSelect '' \
+    --axes ptVgen absYVgen -o $MY_PLOT_DIR/250829_debug/ --ylim 0.9 1.1 --rrange 0.9 1.1
+"""
+
+import argparse
+import copy
 import itertools
-import lz4.frame
+import os
 import pickle
-import numpy as np
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-
-lambda_values = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000, 10000]
-knots_per_axis = itertools.product(
-    [3, 5, 7, 10, 15, 20, 25, 30], [3, 5, 7, 10, 15]  # ptVgen knots  # absYVgen knots
-)
-degrees = [3]
 
-# hyperparameter permutations
-hp_perms = itertools.product(lambda_values, knots_per_axis, degrees)
-hp_perms = list(hp_perms)
-
-print(len(hp_perms))
-
-# Thread-safe printing
-print_lock = threading.Lock()
+import numpy as np
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def safe_print(*args, **kwargs):
-    with print_lock:
-        print(*args, **kwargs)
+from pspline import add_input_args, load_input_hist, plot_smoothed, pspline_lambda_path
 
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+add_input_args(parser)
+parser.add_argument(
+    "--lambdas",
+    nargs="+",
+    type=float,
+    default=[0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000, 10000],
+    help="Lambda values to scan.",
+)
+parser.add_argument(
+    "--knotsGrid",
+    nargs="+",
+    type=str,
+    default=["3,5,7,10,15,20,25,30", "3,5,7,10,15"],
+    help="Comma-separated knot counts to scan, one entry per axis in --axes.",
+)
+parser.add_argument(
+    "--degrees", nargs="+", type=int, default=[3], help="Degrees to scan."
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=min(20, os.cpu_count() or 1),
+    help="Number of worker processes (one knot configuration per task).",
+)
+parser.add_argument(
+    "--plotAxes", nargs="+", type=str, default=None, help="Axes to plot."
+)
+parser.add_argument(
+    "--rrange",
+    default=(0.5, 1.5),
+    type=float,
+    nargs=2,
+    help="Range for the ratio plot (default: 0.5, 1.5).",
+)
+parser.add_argument("--ylim", nargs=2, type=float, default=None, help="y limits.")
+parser.add_argument(
+    "-o",
+    "--outdir",
+    type=str,
+    default="./",
+    help="Output directory for the Pareto-front plots.",
+)
 
-def process_hp_perm(hp_perm):
-    """Process a single hyperparameter permutation"""
-    safe_print(hp_perm)
 
-    lam = hp_perm[0]
-    knots = " ".join([str(x) for x in hp_perm[1]])
-    _knots = "_".join([str(x) for x in hp_perm[1]])
+def postfix_of(lam, knots, degree):
+    _knots = "_".join([str(x) for x in knots])
     postfix = f"lam_{lam}_knots_{_knots}"
+    return postfix if degree == 3 else f"{postfix}_deg_{degree}"
 
-    command = f"python scripts/smoothing/pspline.py $WREM_BASE/wremnants-data/data/angularCoefficients/w_z_gen_dists_maxFiles_m1_pdfsByHelicity.hdf5  --select 'pdfVar pdf0CT18Z'  --hist nominal_gen_pdfCT18Z --refHist nominal_gen_pdf_uncorr --refHistSelect ''  --axes ptVgen absYVgen -o $MY_PLOT_DIR/250829_debug/ --ylim 0.9 1.1 -l {lam} -k {knots} --rrange 0.9 1.1 --postfix {postfix} --forceName"
-
-    safe_print(command)
-
-    # Execute the command
-    os.system(command)
 
+def scan_config(values, centers, knots, degree, lambdas):
+    """Score every lambda of one knot configuration; -> list of row dicts."""
+    degrees = [degree] * len(centers)
     try:
-        # Read the output
-        with lz4.frame.open(f"pspline/{postfix}/hist.pkl.lz4") as f:
-            input_data = pickle.load(f)
-            h_unroll = input_data["output"]["h_unroll"]
-            h_pred_unroll = input_data["output"]["h_pred_unroll"]
-            rms = (
-                np.sum((h_unroll.values() - h_pred_unroll.values()) ** 2)
-                / len(h_pred_unroll.values())
-            ) ** 0.5
-
-        return (hp_perm, rms)
-
-    except Exception as e:
-        safe_print(f"Error processing {hp_perm}: {e}")
-        return (hp_perm, None)
-
-
-# Main execution with multithreading
-results = []
-max_workers = 20  # Adjust based on your system capabilities
-
-with ThreadPoolExecutor(max_workers=max_workers) as executor:
-    # Submit all tasks
-    future_to_hp_perm = {
-        executor.submit(process_hp_perm, hp_perm): hp_perm for hp_perm in hp_perms
-    }
-
-    # Collect results as they complete
-    for future in as_completed(future_to_hp_perm):
-        hp_perm = future_to_hp_perm[future]
+        fit = pspline_lambda_path(values, centers, list(knots), degrees)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        print(f"Skipping knots={knots}, degree={degree}: {e}", flush=True)
+        return []
+    n = values.size
+    rows = []
+    for lam in lambdas:
         try:
-            result = future.result()
-            if result[1] is not None:  # Only append successful results
-                results.append(result)
-        except Exception as exc:
-            safe_print(f"HP permutation {hp_perm} generated an exception: {exc}")
-
-
-now = datetime.now().strftime("%y%m%d_%H%M")
-with open(f"pspline_search_{now}.pkl", "wb") as f:
-    pickle.dump(results, f)
+            smoothed, edf = fit(lam)
+        except np.linalg.LinAlgError as e:
+            print(
+                f"Skipping lam={lam}, knots={knots}, degree={degree}: {e}", flush=True
+            )
+            continue
+        rss = float(np.sum((values - smoothed) ** 2))
+        rows.append(
+            {
+                "lam": lam,
+                "knots": tuple(knots),
+                "degree": degree,
+                "rms": (rss / n) ** 0.5,
+                "edf": edf,
+                "gcv": n * rss / (n - edf) ** 2 if edf < n else np.inf,
+                "aic": n * np.log(rss / n) + 2 * edf if rss > 0 else -np.inf,
+            }
+        )
+    return rows
+
+
+def pareto_front(rows):
+    """Rows not dominated in (rms, edf), both minimized."""
+    front = []
+    for r in rows:
+        dominated = any(
+            o["rms"] <= r["rms"]
+            and o["edf"] <= r["edf"]
+            and (o["rms"] < r["rms"] or o["edf"] < r["edf"])
+            for o in rows
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: r["edf"])
+
+
+def main():
+    args = parser.parse_args()
+
+    knots_grid = [[int(k) for k in axis.split(",")] for axis in args.knotsGrid]
+    if len(knots_grid) != len(args.axes):
+        raise ValueError(
+            f"--knotsGrid has {len(knots_grid)} entries for {len(args.axes)} axes"
+        )
+    configs = list(itertools.product(itertools.product(*knots_grid), args.degrees))
+    print(f"{len(args.lambdas) * len(configs)} hyperparameter points")
+
+    h = load_input_hist(args)
+    values = h.values()
+    centers = [ax.centers for ax in h.axes]
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(scan_config, values, centers, knots, degree, args.lambdas)
+            for knots, degree in configs
+        ]
+        for future in futures:
+            rows.extend(future.result())
+
+    front = pareto_front(rows)
+    on_front = {id(r) for r in front}
+    best = {s: min(rows, key=lambda r: r[s]) for s in ("gcv", "aic")}
+
+    now = datetime.now().strftime("%y%m%d_%H%M")
+    header = f"{'lambda':>10} {'knots':>14} {'deg':>4} {'rms':>12} {'edf':>9} {'gcv':>12} {'aic':>12}  pareto"
+    lines = [header]
+    for r in sorted(rows, key=lambda r: r["gcv"]):
+        knots = ",".join(str(k) for k in r["knots"])
+        lines.append(
+            f"{r['lam']:>10g} {knots:>14} {r['degree']:>4} {r['rms']:>12.5g} "
+            f"{r['edf']:>9.2f} {r['gcv']:>12.5g} {r['aic']:>12.5g}  "
+            f"{'*' if id(r) in on_front else ''}"
+        )
+    table = "\n".join(lines)
+    print(table)
+    for score, r in best.items():
+        print(
+            f"Best {score}: lambda={r['lam']}, knots={r['knots']}, degree={r['degree']}"
+        )
+    with open(f"pspline_search_{now}.txt", "w") as f:
+        f.write(table + "\n")
+    with open(f"pspline_search_{now}.pkl", "wb") as f:
+        pickle.dump([((r["lam"], r["knots"], r["degree"]), r["rms"]) for r in rows], f)
+    print(f"Wrote pspline_search_{now}.txt and pspline_search_{now}.pkl")
+
+    # plots only for the Pareto front, refitting its knot configurations
+    paths = {}
+    for r in front:
+        key = (r["knots"], r["degree"])
+        if key not in paths:
+            paths[key] = pspline_lambda_path(
+                values, centers, list(r["knots"]), [r["degree"]] * len(centers)
+            )
+        smoothed, _ = paths[key](r["lam"])
+        h_pred = copy.deepcopy(h)
+        h_pred.values()[...] = smoothed
+        label = f"p-spline smoothed\n$\\lambda$={r['lam']}, knots per axis={list(r['knots'])}, degree={r['degree']}"
+        plot_smoothed(
+            h,
+            h_pred,
+            label,
+            args.outdir,
+            postfix=postfix_of(r["lam"], r["knots"], r["degree"]),
+            plot_axes=args.plotAxes,
+            ylim=args.ylim,
+            rrange=args.rrange,
+        )
+    print(f"Plotted {len(front)} Pareto-front points in {args.outdir}")
+
+
+if __name__ == "__main__":
+    main()
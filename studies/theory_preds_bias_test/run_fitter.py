@@ -1,8 +1,14 @@
 import argparse
 import os
+import sys
+from pathlib import Path
 
 from wremnants import theory_tools
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+
+import job_matrix
+
 DEFAULT_CENTRAL_PREDS = [
     "scetlib_dyturbo",
     "scetlib_dyturboMSHT20",
@@ -63,14 +69,15 @@ def parse_args():
         action="store_true",
         help="For use with asymmetric uncertainties. Performs a contour scan on predAlphaS.",
     )
+    job_matrix.add_matrix_args(parser, default_jobs=4)
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
 
+    cells = []
     for pred_central in args.central_preds:
-        print(f"Processing {pred_central}")
         input_file = f"{args.input_dir}/mz_dilepton_{pred_central}.hdf5"
         pseudo_data_args = " ".join(
             ["nominal_" + p + "Corr" for p in args.pseudodata_preds]
@@ -94,15 +101,18 @@ def main():
             f"{os.environ['MY_WORK_DIR']}/workflows/fitter.sh "
             f"{input_file} -e '{extra_setup}' -f '{extra_fit}'"
         )
-        try:
-            os.system(fit_command)
-        except Exception as e:
-            print(f"Error running command: {fit_command}\n{e}")
-        print(f"Finished processing {pred_central}\n")
-        print()
+        cells.append(
+            {
+                "id": postfix,
+                "cmd": fit_command,
+                "output": job_matrix.fitter_output(input_file, postfix),
+            }
+        )
 
-    print("All done!")
+    return job_matrix.run_from_args(
+        cells, args, os.path.join(args.input_dir, ".job_matrix")
+    )
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,5 +1,11 @@
 import os
 import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+
+import job_matrix
 
 preds = {
     "scetlib_dyturbo": {
@@ -49,15 +55,30 @@ parser.add_argument(
     default=list(preds.keys()),
     help="Prediction set names to use as central inputs. (default: %(default)s)",
 )
+job_matrix.add_matrix_args(parser, default_jobs=1)
 args = parser.parse_args()
 
-for i, central_pred in enumerate(args.central_preds):
+cells = []
+for central_pred in args.central_preds:
 
     other_preds = [pred for pred in list(preds.keys()) if pred != central_pred]
     pdfs = [preds[central_pred]["pdf"]] + pdfs_for_uncs
 
     command = f"{os.environ['MY_WORK_DIR']}/workflows/histmaker.sh -e ' --filterProcs ZmumuPostVFP dataPostVFP -j 450 --theoryCorr {central_pred} {preds[central_pred]['alphaS']} {preds[central_pred].get('pdf_from_corr', "")} {' '.join(other_preds)} --pdf {" ".join(pdfs)} --postfix {central_pred}' "
-    try:
-        os.system(command)
-    except Exception as e:
-        print(f"Error running command: {command}\n{e}")
+    cells.append(
+        {
+            "id": central_pred,
+            "cmd": command,
+            "output": job_matrix.histmaker_output(central_pred),
+        }
+    )
+
+sys.exit(
+    job_matrix.run_from_args(
+        cells,
+        args,
+        os.path.join(
+            os.environ["MY_OUT_DIR"], ".job_matrix", "theory_preds_bias_test_histmakers"
+        ),
+    )
+)
@@ -26,6 +26,22 @@ Steps (any subset via --steps, always run in this order):
               this step deliberately does not compute). Writes
               <fitdir>/saturated/fitresults.hdf5.
 
+CONCURRENT hessian + saturated: both only read <fitdir>/fitresults.hdf5, so
+with --concurrent they run side by side instead of back to back. The THREADS
+budget (default: all cores) is split between them (--threadSplit = hessian's
+share, default 0.5) via OMP_NUM_THREADS / TF_NUM_INTRAOP_THREADS; both logs
+are streamed with a [hessian] / [saturated] prefix, and if either dies the
+other is terminated and the script exits non-zero.
+
+UP-TO-DATE STEPS ARE SKIPPED: after a step succeeds, <outdir>/fitresults.step.json
+records a hash of its fully resolved rabbit_fit.py command (model tokens,
+freeze list, regularization, data args, extra args) together with a
+fingerprint of the datacard and, for hessian/saturated, of the fit postfit
+they read. A re-invocation skips a step whose output has a results group and
+whose recorded hash matches; a re-run fit (or any other change of the postfit)
+therefore makes hessian and saturated stale, while e.g. changing only -f for
+the saturated step reruns only that step. --force reruns every requested step.
+
 To plot the banded postfit ptll WITH the saturated p-value, merge the two
 outputs (the plotter reads hists and chi2 from ONE file):
     scripts/merge_fitresults_saturated.py <fitdir>/cov/fitresults.hdf5 \\
@@ -71,10 +87,20 @@ inherit from the fit postfit unless DATA_ARGS is set), MAXITER, THREADS.
 """
 
 import argparse
+import hashlib
+import json
 import os
 import shlex
+import signal
 import subprocess
 import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from job_matrix import thread_env
 
 MODEL = "wremnants.postprocessing.scetlib_np.SCETlibNPParamModel"
 # floating lambdas with the default freeze: lambda2, lambda4, delta_lambda2, lambda2_nu
@@ -155,6 +181,24 @@ def parse_args():
         help="extra rabbit_fit.py args as one string, appended to every step "
         "(e.g. '--noEDM' to skip the CG EDM in the fit step)",
     )
+    p.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="run the hessian and saturated steps concurrently, splitting the "
+        "THREADS budget between them (both only read the fit postfit)",
+    )
+    p.add_argument(
+        "--threadSplit",
+        type=float,
+        default=0.5,
+        help="with --concurrent: fraction of THREADS given to the hessian step; "
+        "the saturated step gets the rest (default 0.5)",
+    )
+    p.add_argument(
+        "--force",
+        action="store_true",
+        help="rerun the requested steps even if their outputs are up to date",
+    )
     p.add_argument(
         "--dryRun", action="store_true", help="print the commands without running them"
     )
@@ -166,30 +210,83 @@ def parse_args():
         if step not in STEP_ORDER:
             p.error(f"unknown step '{step}' (known: {','.join(STEP_ORDER)})")
         args.step_set.add(step)
+    if not 0.0 < args.threadSplit < 1.0:
+        p.error("--threadSplit must be in (0, 1)")
     return args
 
 
+STAMP_NAME = "fitresults.step.json"
+
+
+def has_results(path):
+    """Whether a fitresults file has a results group (not an aborted-fit stub)."""
+    import fitresult_io
+
+    return fitresult_io.has_results(path)
+
+
+def file_fingerprint(path, block=1 << 22):
+    """Cheap content identity of a (multi-GB) hdf5: size, mtime and the first
+    and last `block` bytes."""
+    st = os.stat(path)
+    h = hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        h.update(f.read(block))
+        if st.st_size > block:
+            f.seek(max(block, st.st_size - block))
+            h.update(f.read(block))
+    return h.hexdigest()
+
+
+def step_hash(step, cmd, card, postfit=None):
+    """Canonical hash of a step's resolved configuration and inputs."""
+    config = {
+        "step": step,
+        "cmd": cmd,
+        "card": file_fingerprint(card) if os.path.isfile(card) else None,
+        "postfit": (
+            file_fingerprint(postfit) if postfit and os.path.isfile(postfit) else None
+        ),
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def is_up_to_date(outdir, digest):
+    """The step's output exists, is not a meta-only stub, and was produced by
+    the configuration hashed to `digest`."""
+    out = os.path.join(outdir, "fitresults.hdf5")
+    try:
+        with open(os.path.join(outdir, STAMP_NAME)) as f:
+            stamp = json.load(f)
+        return stamp.get("hash") == digest and has_results(out)
+    except (OSError, ValueError):
+        return False
+
+
+def write_stamp(outdir, step, digest, cmd):
+    path = os.path.join(outdir, STAMP_NAME)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump({"step": step, "hash": digest, "cmd": cmd}, f, indent=1)
+    os.replace(tmp, path)
+
+
 def read_inherited(postfit):
     """(model_tokens, freeze, data_args, reg_args) recorded in the postfit's
     meta_info."""
-    import h5py
-    from wums import ioutils
-
-    # read only the meta group directly: io_tools.get_fitresult would also
-    # insist on a results group, whose name varies with the dataset (results,
-    # results_asimov, results_nominal, ...)
-    with h5py.File(postfit, "r") as f:
-        # meta is written at startup, results* only at the very end — an
-        # aborted fit leaves a meta-only stub that --externalPostfit would
-        # later reject with a misleading error (see
-        # knowledge/20_frameworks/nominal_workflow.md)
-        if not any(k.startswith("results") for k in f.keys()):
-            sys.exit(
-                f"{postfit} has no results group (only {list(f.keys())}) — "
-                "stale stub from an aborted fit; rerun the 'fit' step."
-            )
-        meta = ioutils.pickle_load_h5py(f["meta"])
-    fit_args = (meta.get("meta_info", {}) or {}).get("args", {})
+    import fitresult_io
+
+    # only meta_info is needed: io_tools.get_fitresult would also insist on a
+    # results group, whose name varies with the dataset (results,
+    # results_asimov, results_nominal, ...). An aborted fit leaves a
+    # meta-only stub that --externalPostfit would later reject with a
+    # misleading error.
+    if not has_results(postfit):
+        sys.exit(
+            f"{postfit} has no results group — stale stub from an aborted fit; "
+            "rerun the 'fit' step."
+        )
+    _, fit_args = fitresult_io.read_meta_args(postfit)
 
     pm = fit_args.get("paramModel") or []
     tokens = pm[0] if pm and isinstance(pm[0], (list, tuple)) else pm
@@ -236,6 +333,91 @@ def run(cmd, dry_run, cwd=None):
         )
 
 
+def kill_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def run_concurrent(jobs, dry_run, cwd=None):
+    """Run [(name, cmd, env)] side by side, streaming their output with a
+    [name] prefix. If one fails, the others are terminated and we exit."""
+    for name, cmd, env in jobs:
+        print(
+            f"[{name}] (threads={env['OMP_NUM_THREADS']}) "
+            + " ".join(shlex.quote(c) for c in cmd),
+            flush=True,
+        )
+    if dry_run:
+        return
+
+    lock = threading.Lock()
+
+    def stream(name, pipe):
+        for line in pipe:
+            with lock:
+                sys.stdout.write(f"[{name}] {line}")
+                sys.stdout.flush()
+
+    procs, readers = {}, []
+    try:
+        for name, cmd, env in jobs:
+            try:
+                proc = subprocess.Popen(
+                    cmd,
+                    cwd=cwd,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    errors="replace",
+                    bufsize=1,
+                    # own process group, so terminating a step takes its
+                    # children with it
+                    start_new_session=True,
+                )
+            except FileNotFoundError:
+                sys.exit(
+                    f"{cmd[0]} not found on PATH — run inside the wmassdev container "
+                    "with WRemnants/setup.sh sourced."
+                )
+            procs[name] = proc
+            t = threading.Thread(target=stream, args=(name, proc.stdout), daemon=True)
+            t.start()
+            readers.append(t)
+
+        failed = None
+        while failed is None and any(p.poll() is None for p in procs.values()):
+            for name, proc in procs.items():
+                if proc.poll() not in (None, 0):
+                    failed = name
+                    break
+            time.sleep(0.5)
+        if failed is None:
+            failed = next((n for n, p in procs.items() if p.returncode != 0), None)
+    finally:
+        # reached on failure, Ctrl-C or sys.exit: don't leave orphans behind
+        for proc in procs.values():
+            if proc.poll() is None:
+                kill_group(proc, signal.SIGTERM)
+        for proc in procs.values():
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                kill_group(proc, signal.SIGKILL)
+                proc.wait()
+        for t in readers:
+            t.join(timeout=5)
+
+    if failed is not None:
+        others = [n for n in procs if n != failed]
+        sys.exit(
+            f"Step '{failed}' failed (exit {procs[failed].returncode}); "
+            f"terminated {', '.join(others)}."
+        )
+
+
 def main():
     args = parse_args()
 
@@ -295,26 +477,34 @@ def main():
         os.environ["TF_NUM_INTEROP_THREADS"] = "2"
 
     # ---- step: fit (+ Hessian-free CG EDM) -----------------------------------
+    fit_ran = False
     if "fit" in args.step_set:
-        print("\nRunning step 'fit' (--noHessian; EDM via the Hessian-free CG path)...")
         # fmt: off
-        run(
-            [
-                "rabbit_fit.py", card, "-v", "4",
-                "--paramModel", MODEL, *model_args,
-                "--freezeParameters", *freeze,
-                *wall,
-                "--minimizerMaxiter", maxiter,
-                *data,
-                "--noHessian",
-                # store the full NLL (constant terms included) next to the
-                # reduced one; one extra NLL eval, needed by fit_summary_table.py
-                "--fullNll",
-                "-o", fitdir, *extra,
-            ],
-            args.dryRun,
-        )
+        fit_cmd = [
+            "rabbit_fit.py", card, "-v", "4",
+            "--paramModel", MODEL, *model_args,
+            "--freezeParameters", *freeze,
+            *wall,
+            "--minimizerMaxiter", maxiter,
+            *data,
+            "--noHessian",
+            # store the full NLL (constant terms included) next to the
+            # reduced one; one extra NLL eval, needed by fit_summary_table.py
+            "--fullNll",
+            "-o", fitdir, *extra,
+        ]
         # fmt: on
+        fit_hash = step_hash("fit", fit_cmd, card)
+        if not args.force and is_up_to_date(fitdir, fit_hash):
+            print(f"\nSkipping step 'fit': {fitdir}/fitresults.hdf5 is up to date.")
+        else:
+            print(
+                "\nRunning step 'fit' (--noHessian; EDM via the Hessian-free CG path)..."
+            )
+            run(fit_cmd, args.dryRun)
+            if not args.dryRun:
+                write_stamp(fitdir, "fit", fit_hash, fit_cmd)
+            fit_ran = True
 
     postfit = os.path.join(fitdir, "fitresults.hdf5")
     if args.step_set & {"hessian", "saturated"}:
@@ -347,56 +537,99 @@ def main():
     # hessian_straightthrough=1 hessian_gn=1 (GN exact on Asimov) make the
     # Hessian and the hist errors/impacts differentiate through the compact J
     # path instead of the bT-fold slab.
+    hessian_cmd = saturated_cmd = None
     if "hessian" in args.step_set:
-        print(
-            "\nRunning step 'hessian' (straight-through GN cov pass: impacts, postfit hists)..."
-        )
         # fmt: off
-        run(
-            [
-                "rabbit_fit.py", card, "-v", "4",
-                "--paramModel", *in_model, "hessian_straightthrough=1", "hessian_gn=1",
-                "--freezeParameters", *in_freeze,
-                *in_reg,
-                "--externalPostfit", postfit, "--noFit",
-                "--minimizerMaxiter", maxiter,
-                *in_data,
-                "--doImpacts",
-                "-m", "Project", "ch0", "ptll",
-                "--computeVariations", "--computeHistErrors", "--computeHistImpacts",
-                "--saveHists", "--saveHistsPerProcess",
-                "-o", os.path.join(fitdir, "cov"), *extra,
-            ],
-            args.dryRun,
-            cwd=wrem_base,
-        )
+        hessian_cmd = [
+            "rabbit_fit.py", card, "-v", "4",
+            "--paramModel", *in_model, "hessian_straightthrough=1", "hessian_gn=1",
+            "--freezeParameters", *in_freeze,
+            *in_reg,
+            "--externalPostfit", postfit, "--noFit",
+            "--minimizerMaxiter", maxiter,
+            *in_data,
+            "--doImpacts",
+            "-m", "Project", "ch0", "ptll",
+            "--computeVariations", "--computeHistErrors", "--computeHistImpacts",
+            "--saveHists", "--saveHistsPerProcess",
+            "-o", os.path.join(fitdir, "cov"), *extra,
+        ]
         # fmt: on
 
     # ---- step: saturated (ptll projection saturated test) --------------------
     # The saturated refit only minimizes (gradients, like the fit step) and
     # compares NLLs, so no Hessian/EDM/linear-chi2 is computed here.
     if "saturated" in args.step_set:
-        print("\nRunning step 'saturated' (ptll projection saturated test)...")
         # fmt: off
-        run(
+        saturated_cmd = [
+            "rabbit_fit.py", card, "-v", "4",
+            "--paramModel", *in_model,
+            "--freezeParameters", *in_freeze,
+            *in_reg,
+            "--externalPostfit", postfit, "--noFit",
+            "--minimizerMaxiter", maxiter,
+            *in_data,
+            "--noHessian", "--noEDM", "--noChi2",
+            "-m", "Project", "ch0", "ptll",
+            "--computeSaturatedProjectionTests",
+            "--saveHists",
+            "-o", os.path.join(fitdir, "saturated"), *extra,
+        ]
+        # fmt: on
+
+    # which of hessian/saturated are stale; a fit that (would have) rerun in
+    # this invocation makes both stale, and a dry run without a postfit yet
+    # has nothing to hash: both just print their commands
+    todo = {}
+    for step, cmd, outdir in (
+        ("hessian", hessian_cmd, os.path.join(fitdir, "cov")),
+        ("saturated", saturated_cmd, os.path.join(fitdir, "saturated")),
+    ):
+        if step not in args.step_set:
+            continue
+        if args.dryRun and (fit_ran or not os.path.isfile(postfit)):
+            digest = None
+        else:
+            digest = step_hash(step, cmd, card, postfit)
+        if not args.force and digest and is_up_to_date(outdir, digest):
+            print(f"\nSkipping step '{step}': {outdir}/fitresults.hdf5 is up to date.")
+            continue
+        todo[step] = (cmd, outdir, digest)
+
+    def stamp(step):
+        cmd, outdir, digest = todo[step]
+        if not args.dryRun:
+            write_stamp(outdir, step, digest, cmd)
+
+    if args.concurrent and len(todo) == 2:
+        total = int(threads) if threads else (os.cpu_count() or 2)
+        n_hessian = min(max(1, round(total * args.threadSplit)), max(1, total - 1))
+        n_saturated = max(1, total - n_hessian)
+        print(
+            f"\nRunning steps 'hessian' and 'saturated' concurrently "
+            f"({n_hessian} + {n_saturated} of {total} threads)..."
+        )
+        run_concurrent(
             [
-                "rabbit_fit.py", card, "-v", "4",
-                "--paramModel", *in_model,
-                "--freezeParameters", *in_freeze,
-                *in_reg,
-                "--externalPostfit", postfit, "--noFit",
-                "--minimizerMaxiter", maxiter,
-                *in_data,
-                "--noHessian", "--noEDM", "--noChi2",
-                "-m", "Project", "ch0", "ptll",
-                "--computeSaturatedProjectionTests",
-                "--saveHists",
-                "-o", os.path.join(fitdir, "saturated"), *extra,
+                ("hessian", todo["hessian"][0], thread_env(n_hessian)),
+                ("saturated", todo["saturated"][0], thread_env(n_saturated)),
             ],
             args.dryRun,
             cwd=wrem_base,
         )
-        # fmt: on
+        stamp("hessian")
+        stamp("saturated")
+    else:
+        if "hessian" in todo:
+            print(
+                "\nRunning step 'hessian' (straight-through GN cov pass: impacts, postfit hists)..."
+            )
+            run(todo["hessian"][0], args.dryRun, cwd=wrem_base)
+            stamp("hessian")
+        if "saturated" in todo:
+            print("\nRunning step 'saturated' (ptll projection saturated test)...")
+            run(todo["saturated"][0], args.dryRun, cwd=wrem_base)
+            stamp("saturated")
 
     print(f"\nDone. Outputs under {fitdir}:")
     if "fit" in args.step_set:
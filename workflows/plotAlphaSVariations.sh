@@ -46,4 +46,6 @@ echo "Output directory: $output_dir"
 
 command="rabbit_plot_hists.py --config $WREM_BASE'/utilities/styles/styles.py' $input_file --title CMS --subtitle Preliminary --rrange '0.98' '1.02' --legCols 1 -o $output_dir -m Project ch0 ptll --varName pdfAlphaS --varLabel '$\alpha_\mathrm{S}{\pm}1\sigma$' --yscale '1.25' ${extra_args}"
 echo "Executing command: $command"
-eval $command
+# run through the warm worker if one is up (scripts/warm_worker.py serve), else directly
+warm_run="python3 '$(dirname "$0")/../scripts/warm_worker.py' run --"
+eval $warm_run $command
@@ -49,4 +49,6 @@ mkdir -p "$output_dir"
 command="rabbit_plot_hists.py $input_file -m 'Project ch0 yll' --config '${WREM_BASE}/wremnants/utilities/styles/styles.py' --title CMS --titlePos 0 --subtitle Preliminary -o $output_dir --processGrouping 'z_dilepton' --yscale '1.25' --rrange 0.99 1.01 ${extra}"
 
 echo "Executing command: $command"
-eval $command
+# run through the warm worker if one is up (scripts/warm_worker.py serve), else directly
+warm_run="python3 '$(dirname "$0")/../scripts/warm_worker.py' run --"
+eval $warm_run $command